@@ -50,6 +50,13 @@ contract SupplyChain {
         Stage stage;
     }
     
+    // Merkle root over a batch of products recorded off-chain
+    struct Batch {
+        bytes32 root;
+        uint256 size;
+        uint256 timestamp;
+    }
+    
     // State variables
     mapping(uint256 => Product) public products;
     mapping(address => Stakeholder) public stakeholders;
@@ -57,11 +64,14 @@ contract SupplyChain {
     
     uint256 public productCounter;
     address public owner;
+    mapping(uint256 => Batch) public batches;
+    uint256 public batchCounter;
     
     // Events
     event ProductCreated(uint256 indexed productId, string name, address indexed farmer);
     event ProductTransferred(uint256 indexed productId, address indexed from, address indexed to, Stage stage);
     event StakeholderRegistered(address indexed stakeholder, string name, StakeholderType stakeholderType);
+    event BatchAnchored(uint256 indexed batchId, bytes32 root, uint256 size);
     
     // Modifiers
     modifier onlyOwner() {
@@ -169,6 +179,53 @@ contract SupplyChain {
         emit ProductTransferred(_productId, msg.sender, _to, _newStage);
     }
     
+    // Anchor a batch of off-chain products with one transaction (root of a
+    // Merkle tree whose leaves are product hashes, built by the backend)
+    function anchorBatch(bytes32 _root, uint256 _size) public onlyOwner returns (uint256) {
+        require(_root != bytes32(0), "Empty root");
+        require(_size > 0, "Empty batch");
+        
+        batchCounter++;
+        batches[batchCounter] = Batch({
+            root: _root,
+            size: _size,
+            timestamp: block.timestamp
+        });
+        
+        emit BatchAnchored(batchCounter, _root, _size);
+        return batchCounter;
+    }
+    
+    // Check a product's inclusion proof against an anchored root. Nodes are
+    // sha256(0x01 || left || right); a node without a sibling moves up as is.
+    function verifyInclusion(
+        uint256 _batchId,
+        bytes32 _leaf,
+        uint256 _index,
+        bytes32[] memory _proof
+    ) public view returns (bool) {
+        Batch memory batch = batches[_batchId];
+        if (batch.size == 0 || _index >= batch.size) {
+            return false;
+        }
+        
+        bytes32 node = _leaf;
+        uint256 width = batch.size;
+        uint256 used = 0;
+        while (width > 1) {
+            if (_index % 2 == 1) {
+                if (used == _proof.length) return false;
+                node = sha256(abi.encodePacked(bytes1(0x01), _proof[used++], node));
+            } else if (_index + 1 < width) {
+                if (used == _proof.length) return false;
+                node = sha256(abi.encodePacked(bytes1(0x01), node, _proof[used++]));
+            }
+            _index /= 2;
+            width = (width + 1) / 2;
+        }
+        return used == _proof.length && node == batch.root;
+    }
+    
     // Get product details
     function getProduct(uint256 _productId) public view productExists(_productId) 
         returns (
@@ -0,0 +1,157 @@
+"""Admission control for image uploads to /add_product.
+
+Watermarking a photo decodes it to full-size RGBA buffers, so a burst of
+large uploads can exhaust a worker's memory and CPU. Before any pixel is
+decoded, each upload's peak memory is estimated from the dimensions in its
+image header. It then needs a slot from UploadAdmission:
+
+- at most AGROLINK_UPLOAD_CONCURRENCY images are processed at once;
+- their estimated memory stays within AGROLINK_UPLOAD_MEMORY_MB;
+- a farmer has at most AGROLINK_UPLOAD_PER_FARMER uploads running or queued
+  (429 beyond that);
+- uploads that do not fit wait in a FIFO queue of AGROLINK_UPLOAD_QUEUE
+  entries, for up to AGROLINK_UPLOAD_QUEUE_TIMEOUT seconds (503 when the
+  queue is full or the wait runs out).
+
+Rejections carry a Retry-After estimated from recent processing times. All
+limits apply per worker process.
+"""
+import math
+import os
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+# Decoded RGBA, the RGBA overlay, their composite and the RGB copy for encoding
+PIPELINE_BYTES_PER_PIXEL = 4 + 4 + 4 + 3
+
+DEFAULT_MEMORY_MB = 512
+DEFAULT_PER_FARMER = 2
+DEFAULT_QUEUE = 32
+DEFAULT_QUEUE_TIMEOUT = 10.0
+# Starting guess for the processing time behind Retry-After
+INITIAL_SERVICE_SECONDS = 1.0
+SERVICE_TIME_WEIGHT = 0.2
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status, message, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.retry_after = retry_after
+
+
+def estimate_decode_bytes(stream):
+    """Peak watermarking memory for an image, read from its header without decoding it"""
+    from PIL import Image
+    position = stream.tell()
+    try:
+        with Image.open(stream) as img:
+            width, height = img.size
+    finally:
+        stream.seek(position)
+    return width * height * PIPELINE_BYTES_PER_PIXEL
+
+
+class UploadAdmission:
+    def __init__(self, max_active, memory_budget, per_farmer=DEFAULT_PER_FARMER,
+                 max_waiting=DEFAULT_QUEUE, wait_timeout=DEFAULT_QUEUE_TIMEOUT):
+        self.max_active = max_active
+        self.memory_budget = memory_budget
+        self.per_farmer = per_farmer
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self.active = 0
+        self.memory_in_use = 0
+        self.service_seconds = INITIAL_SERVICE_SECONDS
+        self._waiting = deque()        # tickets in arrival order
+        self._by_farmer = Counter()    # running plus queued uploads per farmer
+        self._cond = threading.Condition()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            int(os.environ.get('AGROLINK_UPLOAD_CONCURRENCY') or os.cpu_count() or 1),
+            int(float(os.environ.get('AGROLINK_UPLOAD_MEMORY_MB', DEFAULT_MEMORY_MB)) * 1024 * 1024),
+            int(os.environ.get('AGROLINK_UPLOAD_PER_FARMER', DEFAULT_PER_FARMER)),
+            int(os.environ.get('AGROLINK_UPLOAD_QUEUE', DEFAULT_QUEUE)),
+            float(os.environ.get('AGROLINK_UPLOAD_QUEUE_TIMEOUT', DEFAULT_QUEUE_TIMEOUT)))
+
+    @property
+    def waiting(self):
+        return len(self._waiting)
+
+    def retry_after(self):
+        """Seconds until the uploads ahead of a new one should have drained"""
+        backlog = self.active + len(self._waiting)
+        return max(1, math.ceil(self.service_seconds * backlog / self.max_active))
+
+    def check_capacity(self):
+        """Cheap check before the upload body is parsed: refuse at once if the queue is full"""
+        if len(self._waiting) >= self.max_waiting:
+            raise AdmissionRejected(503, 'Server is busy processing uploads, please retry shortly',
+                                    self.retry_after())
+
+    def _fits(self, cost):
+        return self.active < self.max_active and (self.active == 0 or self.memory_in_use + cost <= self.memory_budget)
+
+    @contextmanager
+    def admit(self, farmer_id, cost):
+        """Hold a processing slot and ``cost`` bytes of the memory budget for the ``with`` block.
+
+        Yields the seconds spent queued for the slot.
+        """
+        if cost > self.memory_budget:
+            raise AdmissionRejected(413, 'Image is too large to process; please upload a smaller photo')
+        with self._cond:
+            if self._by_farmer[farmer_id] >= self.per_farmer:
+                raise AdmissionRejected(429, 'Too many uploads in progress for this farmer, please wait',
+                                        self.retry_after())
+            waited = 0.0
+            if self._waiting or not self._fits(cost):
+                if len(self._waiting) >= self.max_waiting:
+                    raise AdmissionRejected(503, 'Server is busy processing uploads, please retry shortly',
+                                            self.retry_after())
+                queued_at = time.monotonic()
+                self._wait_turn(farmer_id, cost)
+                waited = time.monotonic() - queued_at
+            self.active += 1
+            self.memory_in_use += cost
+            self._by_farmer[farmer_id] += 1
+
+        start = time.monotonic()
+        try:
+            yield waited
+        finally:
+            elapsed = time.monotonic() - start
+            with self._cond:
+                self.active -= 1
+                self.memory_in_use -= cost
+                self._by_farmer[farmer_id] -= 1
+                if not self._by_farmer[farmer_id]:
+                    del self._by_farmer[farmer_id]
+                self.service_seconds += SERVICE_TIME_WEIGHT * (elapsed - self.service_seconds)
+                self._cond.notify_all()
+
+    def _wait_turn(self, farmer_id, cost):
+        # Called with the condition held. First come, first served, so a large
+        # image at the head of the queue is not starved by smaller ones behind it.
+        ticket = object()
+        self._waiting.append(ticket)
+        self._by_farmer[farmer_id] += 1
+        deadline = time.monotonic() + self.wait_timeout
+        try:
+            while not (self._waiting[0] is ticket and self._fits(cost)):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise AdmissionRejected(503, 'Server is busy processing uploads, please retry shortly',
+                                            self.retry_after())
+                self._cond.wait(remaining)
+        finally:
+            self._waiting.remove(ticket)
+            self._by_farmer[farmer_id] -= 1
+            if not self._by_farmer[farmer_id]:
+                del self._by_farmer[farmer_id]
+            self._cond.notify_all()
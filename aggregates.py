@@ -0,0 +1,184 @@
+"""Running product aggregates for dashboards and /api/stats.
+
+Every ``add_product`` folds the product into one ``GroupStats`` per
+combination of the grouping dimensions (category, farmer, unit and the day
+it was added), so any group-by query, optionally filtered on other
+dimensions, is answered from the pre-aggregated groups in O(groups) without
+touching product records.
+
+Only the grouping on all four dimensions is kept from the start. A coarser
+grouping is merged from it the first time a query needs it, and is kept up
+to date from then on, so ``add_many`` (loading a snapshot) folds each
+product into a single group.
+"""
+import threading
+import time
+
+DIMENSIONS = ('category', 'farmer_id', 'unit', 'day')
+
+# Scalar fields of GroupStats.to_dict() that groups can be ordered by
+SORTABLE_STATS = ('product_count', 'total_value', 'min_price_per_unit', 'max_price_per_unit',
+                  'first_harvest_date', 'last_harvest_date')
+
+
+def _day(timestamp):
+    return time.strftime('%Y-%m-%d', time.localtime(timestamp))
+
+
+def to_number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _project(finest, grouping, groups):
+    """Merge groups keyed on every dimension into ``groups``, keyed on ``grouping`` only"""
+    positions = [DIMENSIONS.index(dimension) for dimension in grouping]
+    for finest_key, finest_stats in finest.items():
+        key = tuple(finest_key[i] for i in positions)
+        stats = groups.get(key)
+        if stats is None:
+            stats = groups[key] = GroupStats()
+        stats.merge(finest_stats)
+
+
+class GroupStats:
+    __slots__ = ('count', 'total_value', 'quantity_by_unit', 'min_price', 'max_price',
+                 'first_harvest', 'last_harvest')
+
+    def __init__(self):
+        self.count = 0
+        self.total_value = 0.0
+        self.quantity_by_unit = {}
+        self.min_price = None
+        self.max_price = None
+        self.first_harvest = None
+        self.last_harvest = None
+
+    def add(self, unit, quantity, price, harvest_date):
+        self.count += 1
+        if quantity is not None:
+            self.quantity_by_unit[unit] = self.quantity_by_unit.get(unit, 0.0) + quantity
+            if price is not None:
+                self.total_value += quantity * price
+        if price is not None:
+            if self.min_price is None or price < self.min_price:
+                self.min_price = price
+            if self.max_price is None or price > self.max_price:
+                self.max_price = price
+        # ISO dates (YYYY-MM-DD) order correctly as strings
+        if harvest_date:
+            if self.first_harvest is None or harvest_date < self.first_harvest:
+                self.first_harvest = harvest_date
+            if self.last_harvest is None or harvest_date > self.last_harvest:
+                self.last_harvest = harvest_date
+
+    def merge(self, other):
+        self.count += other.count
+        self.total_value += other.total_value
+        for unit, quantity in other.quantity_by_unit.items():
+            self.quantity_by_unit[unit] = self.quantity_by_unit.get(unit, 0.0) + quantity
+        if other.min_price is not None and (self.min_price is None or other.min_price < self.min_price):
+            self.min_price = other.min_price
+        if other.max_price is not None and (self.max_price is None or other.max_price > self.max_price):
+            self.max_price = other.max_price
+        if other.first_harvest is not None and (self.first_harvest is None
+                                                or other.first_harvest < self.first_harvest):
+            self.first_harvest = other.first_harvest
+        if other.last_harvest is not None and (self.last_harvest is None
+                                               or other.last_harvest > self.last_harvest):
+            self.last_harvest = other.last_harvest
+
+    def to_dict(self):
+        return {
+            'product_count': self.count,
+            'total_value': round(self.total_value, 2),
+            'quantity_by_unit': {unit: round(q, 3) for unit, q in self.quantity_by_unit.items()},
+            'min_price_per_unit': self.min_price,
+            'max_price_per_unit': self.max_price,
+            'first_harvest_date': self.first_harvest,
+            'last_harvest_date': self.last_harvest,
+        }
+
+
+class ProductAggregates:
+    def __init__(self):
+        self.totals = GroupStats()
+        # Coarser groupings are added here the first time they are queried
+        self._groups = {DIMENSIONS: {}}
+        self._lock = threading.Lock()
+
+    def add(self, product):
+        values = {
+            'category': product['category'],
+            'farmer_id': product['farmer_id'],
+            'unit': product['unit'],
+            'day': _day(product['added_at']),
+        }
+        unit = product['unit']
+        quantity = to_number(product['quantity'])
+        price = to_number(product.get('price_per_unit'))
+        harvest_date = product.get('harvest_date')
+
+        with self._lock:
+            self.totals.add(unit, quantity, price, harvest_date)
+            for grouping, groups in self._groups.items():
+                key = tuple(values[dimension] for dimension in grouping)
+                stats = groups.get(key)
+                if stats is None:
+                    stats = groups[key] = GroupStats()
+                stats.add(unit, quantity, price, harvest_date)
+
+    def add_many(self, products):
+        """Fold many products in at once; same result as calling ``add`` for each"""
+        finest = {}
+        totals = GroupStats()
+        for product in products:
+            unit = product['unit']
+            key = (product['category'], product['farmer_id'], unit, _day(product['added_at']))
+            stats = finest.get(key)
+            if stats is None:
+                stats = finest[key] = GroupStats()
+            stats.add(unit, to_number(product['quantity']), to_number(product.get('price_per_unit')),
+                      product.get('harvest_date'))
+        for stats in finest.values():
+            totals.merge(stats)
+
+        with self._lock:
+            self.totals.merge(totals)
+            for grouping, groups in self._groups.items():
+                _project(finest, grouping, groups)
+
+    def _grouping(self, grouping):
+        """Groups for ``grouping``, built from the finest groups on first use; call with the lock held"""
+        groups = self._groups.get(grouping)
+        if groups is None:
+            groups = self._groups[grouping] = {}
+            _project(self._groups[DIMENSIONS], grouping, groups)
+        return groups
+
+    def query(self, group_by, filters=None):
+        """Return [(group values dict, GroupStats)] for ``group_by``, restricted by ``filters``"""
+        filters = {k: v for k, v in (filters or {}).items() if v is not None}
+        unknown = [d for d in list(group_by) + list(filters) if d not in DIMENSIONS]
+        if unknown:
+            raise ValueError(f"Unknown dimension(s): {', '.join(unknown)}")
+
+        # Read the grouping that covers both the requested and the filtered dimensions
+        grouping = tuple(d for d in DIMENSIONS if d in group_by or d in filters)
+        if not grouping:
+            return [({}, self.totals)]
+
+        merged = {}
+        with self._lock:
+            for key, stats in self._grouping(grouping).items():
+                values = dict(zip(grouping, key))
+                if any(str(values[d]) != str(v) for d, v in filters.items()):
+                    continue
+                out_key = tuple(values[d] for d in group_by)
+                target = merged.get(out_key)
+                if target is None:
+                    target = merged[out_key] = GroupStats()
+                target.merge(stats)
+        return [(dict(zip(group_by, key)), stats) for key, stats in merged.items()]
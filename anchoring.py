@@ -0,0 +1,287 @@
+"""Batched on-chain anchoring of products through Merkle roots.
+
+Instead of one SupplyChain.createProduct transaction per product, new products
+are collected for AGROLINK_ANCHOR_INTERVAL seconds and a single
+SupplyChain.anchorBatch transaction stores the Merkle root of the batch. Each
+product's inclusion proof is kept here. Anyone can check a proof offline with
+``verify_proof``, or on-chain with SupplyChain.verifyInclusion.
+
+Leaves are sha256(0x00 || canonical product JSON). Nodes are
+sha256(0x01 || left || right). A node without a sibling moves up a level
+unchanged, exactly as verifyInclusion in the contract expects.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from logging_setup import LOGGER_NAME
+
+logger = logging.getLogger(f"{LOGGER_NAME}.anchoring")
+
+LEAF_PREFIX = b'\x00'
+NODE_PREFIX = b'\x01'
+DEFAULT_MAX_BATCH = 10000
+DEFAULT_ARTIFACT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'build', 'contracts', 'SupplyChain.json')
+
+# Product fields a leaf commits to; status and coordinates can change later
+LEAF_FIELDS = ('id', 'product_name', 'category', 'quantity', 'unit', 'harvest_date', 'price_per_unit',
+               'farmer_id', 'farm_location', 'description', 'added_at')
+
+
+def leaf_content(product):
+    content = {name: getattr(product, name) for name in LEAF_FIELDS}
+    content['hash'] = product.blockchain_hash
+    return content
+
+
+def hash_leaf_content(content):
+    data = json.dumps(content, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(LEAF_PREFIX + data.encode('utf-8')).digest()
+
+
+def leaf_hash(product):
+    return hash_leaf_content(leaf_content(product))
+
+
+def node_hash(left, right):
+    return hashlib.sha256(NODE_PREFIX + left + right).digest()
+
+
+def tree_levels(leaves):
+    """Every level of the tree, leaves first and the root last"""
+    levels = [list(leaves)]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        parents = [node_hash(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            parents.append(level[-1])
+        levels.append(parents)
+    return levels
+
+
+def merkle_root(leaves):
+    return tree_levels(leaves)[-1][0]
+
+
+def inclusion_proof(levels, index):
+    """Sibling hashes from the leaf at ``index`` up to the root"""
+    proof = []
+    for level in levels[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append(level[sibling])
+        index //= 2
+    return proof
+
+
+def verify_proof(leaf, index, size, proof, root):
+    """Offline twin of SupplyChain.verifyInclusion"""
+    if not 0 <= index < size:
+        return False
+    node = leaf
+    width = size
+    proof = iter(proof)
+    try:
+        while width > 1:
+            if index % 2 == 1:
+                node = node_hash(next(proof), node)
+            elif index + 1 < width:
+                node = node_hash(node, next(proof))
+            index //= 2
+            width = (width + 1) // 2
+    except StopIteration:
+        return False
+    return next(proof, None) is None and node == root
+
+
+class AnchorBatch:
+    __slots__ = ('id', 'root', 'product_ids', 'leaves', 'created_at', 'block_number',
+                 'chain_batch_id', 'tx_hash', 'chain_block', '_levels')
+    _state = __slots__[:-1]
+
+    def __init__(self, id, root, product_ids, leaves, created_at, block_number,
+                 chain_batch_id=None, tx_hash=None, chain_block=None):
+        self.id = id
+        self.root = root
+        self.product_ids = product_ids
+        self.leaves = leaves
+        self.created_at = created_at
+        self.block_number = block_number
+        self.chain_batch_id = chain_batch_id
+        self.tx_hash = tx_hash
+        self.chain_block = chain_block
+        self._levels = None
+
+    def proof(self, index):
+        # The tree is rebuilt on the first proof request rather than kept for every batch
+        if self._levels is None:
+            self._levels = tree_levels(self.leaves)
+        return inclusion_proof(self._levels, index)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'root': f"0x{self.root.hex()}",
+            'size': len(self.leaves),
+            'created_at': self.created_at,
+            'block_number': self.block_number,
+            'chain_batch_id': self.chain_batch_id,
+            'tx_hash': self.tx_hash,
+            'chain_block': self.chain_block,
+        }
+
+    def to_state(self):
+        state = {name: getattr(self, name) for name in self._state}
+        state['root'] = self.root.hex()
+        state['leaves'] = [leaf.hex() for leaf in self.leaves]
+        return state
+
+    @classmethod
+    def from_state(cls, state):
+        return cls(**dict(state, root=bytes.fromhex(state['root']),
+                          leaves=[bytes.fromhex(leaf) for leaf in state['leaves']]))
+
+
+class ChainAnchor:
+    """Writes batch roots with SupplyChain.anchorBatch through web3"""
+
+    def __init__(self, web3, contract, account):
+        self.web3 = web3
+        self.contract = contract
+        self.account = account
+
+    @classmethod
+    def from_env(cls):
+        """None unless AGROLINK_CHAIN_URL points at a node, e.g. Ganache on http://127.0.0.1:7545"""
+        url = os.environ.get('AGROLINK_CHAIN_URL')
+        if not url:
+            return None
+        from web3 import Web3
+        web3 = Web3(Web3.HTTPProvider(url))
+        with open(os.environ.get('AGROLINK_CONTRACT_ARTIFACT', DEFAULT_ARTIFACT)) as f:
+            artifact = json.load(f)
+        address = (os.environ.get('AGROLINK_CONTRACT_ADDRESS')
+                   or artifact['networks'][str(web3.eth.chain_id)]['address'])
+        contract = web3.eth.contract(address=Web3.to_checksum_address(address), abi=artifact['abi'])
+        # anchorBatch is onlyOwner, so this must be the deploying account
+        account = os.environ.get('AGROLINK_CHAIN_ACCOUNT') or web3.eth.accounts[0]
+        return cls(web3, contract, account)
+
+    def anchor(self, root, size):
+        """Send the root and return (on-chain batch id, transaction hash, block number)"""
+        tx_hash = self.contract.functions.anchorBatch(root, size).transact({'from': self.account})
+        receipt = self.web3.eth.wait_for_transaction_receipt(tx_hash, timeout=120)
+        event = self.contract.events.BatchAnchored().process_receipt(receipt)[0]
+        return event['args']['batchId'], self.web3.to_hex(receipt['transactionHash']), receipt['blockNumber']
+
+    def verify(self, chain_batch_id, leaf, index, proof):
+        return self.contract.functions.verifyInclusion(chain_batch_id, leaf, index, proof).call()
+
+
+class MerkleAnchor:
+    """Pending products plus every anchored batch, indexed by product id"""
+
+    def __init__(self, interval, max_batch=DEFAULT_MAX_BATCH, chain=None):
+        self.interval = interval
+        self.max_batch = max_batch
+        self.chain = chain
+        self.anchored_count = 0
+        self._pending = {}     # product id -> leaf, in insertion order
+        self._batches = {}     # batch id -> AnchorBatch
+        self._located = {}     # product id -> (batch, leaf index)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def from_env(cls):
+        """None unless AGROLINK_ANCHOR_INTERVAL (seconds) enables anchoring"""
+        interval = float(os.environ.get('AGROLINK_ANCHOR_INTERVAL') or 0)
+        if interval <= 0:
+            return None
+        max_batch = int(os.environ.get('AGROLINK_ANCHOR_MAX_BATCH', DEFAULT_MAX_BATCH))
+        return cls(interval, max_batch, ChainAnchor.from_env())
+
+    @property
+    def pending_count(self):
+        return len(self._pending)
+
+    def add(self, product):
+        """Queue a product for the next batch, waking the anchoring thread early once it is full"""
+        with self._lock:
+            self._pending[product.id] = leaf_hash(product)
+            full = len(self._pending) >= self.max_batch
+        if full:
+            self._wake.set()
+
+    def take(self):
+        """Remove and return up to ``max_batch`` pending (product id, leaf) pairs"""
+        with self._lock:
+            items = []
+            for product_id in list(self._pending)[:self.max_batch]:
+                items.append((product_id, self._pending.pop(product_id)))
+            return items
+
+    def restore(self, items):
+        """Put a batch that failed to anchor back in front of the queue"""
+        with self._lock:
+            restored = dict(items)
+            restored.update(self._pending)
+            self._pending = restored
+
+    def add_batch(self, batch):
+        with self._lock:
+            self._batches[batch.id] = batch
+            for index, product_id in enumerate(batch.product_ids):
+                self._located[product_id] = (batch, index)
+                self._pending.pop(product_id, None)
+            self.anchored_count += len(batch.product_ids)
+
+    def batch(self, batch_id):
+        return self._batches.get(batch_id)
+
+    def batches(self, limit=None, offset=0):
+        """Batches newest first"""
+        ids = sorted(self._batches, reverse=True)
+        stop = offset + limit if limit is not None else None
+        return [self._batches[batch_id] for batch_id in ids[offset:stop]]
+
+    def is_pending(self, product_id):
+        return product_id in self._pending
+
+    def locate(self, product_id):
+        """(batch, leaf index) of an anchored product, or None"""
+        return self._located.get(product_id)
+
+    def proof(self, product_id):
+        located = self._located.get(product_id)
+        if located is None:
+            return None
+        batch, index = located
+        return {
+            'product_id': product_id,
+            'leaf': f"0x{batch.leaves[index].hex()}",
+            'index': index,
+            'proof': [f"0x{node.hex()}" for node in batch.proof(index)],
+            'batch': batch.to_dict(),
+        }
+
+    def start(self, flush):
+        """Call ``flush`` every ``interval`` seconds (or as soon as a batch fills) on a daemon thread"""
+        if self._thread is not None:
+            return
+
+        def run():
+            while True:
+                self._wake.wait(self.interval)
+                self._wake.clear()
+                try:
+                    while flush() is not None and self.pending_count >= self.max_batch:
+                        pass
+                except Exception:
+                    logger.exception("Anchoring failed; the batch will be retried")
+
+        self._thread = threading.Thread(target=run, name='agrolink-anchor', daemon=True)
+        self._thread.start()
@@ -1,125 +1,336 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, send_from_directory
-from datetime import datetime
-import json
+from flask import Flask, Blueprint, current_app, render_template, request, jsonify, send_from_directory, g, Response
+from datetime import date, datetime
+from functools import wraps
 import os
-import hashlib
-from PIL import Image, ImageDraw, ImageFont
+import time
+from werkzeug.local import LocalProxy
 from werkzeug.utils import secure_filename
 import uuid
+from metrics import (REGISTRY, CONTENT_TYPE, REQUEST_LATENCY, REQUEST_COUNT, REQUEST_ERRORS,
+                     REQUESTS_IN_FLIGHT, WATERMARK_STAGE_LATENCY, DB_OPERATION_LATENCY,
+                     WATERMARK_ENCODE_LATENCY, WATERMARK_ENCODED_BYTES, ANCHOR_BATCHES,
+                     ANCHORED_PRODUCTS, IDEMPOTENT_REQUESTS, UPLOAD_ADMISSIONS, UPLOAD_QUEUE_WAIT,
+                     UPLOADS_ACTIVE, DUPLICATE_PHOTOS, LEDGER_AUDITS, timed)
+from profiling import PROFILER, PROFILE_HEADER
+from logging_setup import configure_logging
+from records import FarmerRecord, ProductRecord
+from search import ProductSearchIndex
+from geo import GeoIndex, resolve_location, resolve_region
+from aggregates import DIMENSIONS, SORTABLE_STATS, ProductAggregates
+from rollups import ProductRollups
+from custody import STAGES, CustodyEvent, CustodyLedger, farmer_holder, parse_stage
+from anchoring import AnchorBatch, MerkleAnchor, merkle_root
+from assets import DEFAULT_MIN_BYTES as COMPRESS_MIN_BYTES, build_assets, compress_response
+import idempotency
+from photos import DEFAULT_MATCH_DISTANCE as PHOTO_MATCH_DISTANCE, HASH_BITS, PhotoIndex, perceptual_hash
+from janitor import UploadJanitor
+import snapshot
+from audit import audit_database
+from admission import AdmissionRejected, UploadAdmission, estimate_decode_bytes
+from verification import DEFAULT_MAX_ENTRIES as VERIFY_CACHE_ENTRIES, VerificationCache
+import hmac
+import json
+import math
+import threading
 
-# Create Flask app
-app = Flask(__name__)
+# Routes and request hooks live on a blueprint; create_app() builds the app
+bp = Blueprint('agrolink', __name__)
+logger = configure_logging()
 
 # Configuration for file uploads
-app.config['UPLOAD_FOLDER'] = 'static/uploads/products'
-app.config['WATERMARKED_FOLDER'] = 'static/watermarked'
-app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024  # 5MB max file size
+DEFAULT_CONFIG = {
+    'UPLOAD_FOLDER': 'static/uploads/products',
+    'WATERMARKED_FOLDER': 'static/watermarked',
+    'QR_FOLDER': 'static/qr',
+    'ASSET_FOLDER': 'static/build',
+    'SNAPSHOT_FOLDER': 'snapshots',
+    # Dynamic responses smaller than this go out uncompressed
+    'COMPRESS_MIN_BYTES': int(os.environ.get('AGROLINK_COMPRESS_MIN_BYTES', COMPRESS_MIN_BYTES)),
+    'MAX_CONTENT_LENGTH': 5 * 1024 * 1024  # 5MB max file size
+}
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
-
-# Create upload directories
-os.makedirs(os.path.join(app.root_path, app.config['UPLOAD_FOLDER']), exist_ok=True)
-os.makedirs(os.path.join(app.root_path, app.config['WATERMARKED_FOLDER']), exist_ok=True)
+# Bodies this large almost certainly carry an image, so they are shed while uploads are queued up
+UPLOAD_SHED_BYTES = 64 * 1024
+# Snapshot products indexed per lock hold by the background index build
+INDEX_BUILD_CHUNK = 50000
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+# PIL is imported on first use so that importing the app stays cheap
+def decode_image(image_path):
+    """Open an uploaded image and decode it as RGBA"""
+    from PIL import Image
+    img = Image.open(image_path)
+    img.load()
+    # Convert to RGBA if not already
+    if img.mode != 'RGBA':
+        img = img.convert('RGBA')
+    return img
+
+def composite_watermark(img, farmer_name):
+    """Draw the farmer and timestamp watermarks over an RGBA image, returning RGB"""
+    from PIL import Image, ImageDraw, ImageFont
+    # Create a transparent overlay
+    overlay = Image.new('RGBA', img.size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(overlay)
+    
+    # Try to use a better font, fallback to default
+    try:
+        font = ImageFont.truetype("arial.ttf", 40)
+    except:
+        try:
+            font = ImageFont.truetype("DejaVuSans.ttf", 40)
+        except:
+            font = ImageFont.load_default()
+    
+    # Watermark text
+    watermark_text = f"© {farmer_name} - AgroLink Verified"
+    
+    # Get text dimensions
+    bbox = draw.textbbox((0, 0), watermark_text, font=font)
+    text_width = bbox[2] - bbox[0]
+    text_height = bbox[3] - bbox[1]
+    
+    # Calculate position (bottom right with some padding)
+    x = img.width - text_width - 20
+    y = img.height - text_height - 20
+    
+    # Add semi-transparent background for text
+    bg_padding = 10
+    draw.rectangle([
+        x - bg_padding, 
+        y - bg_padding, 
+        x + text_width + bg_padding, 
+        y + text_height + bg_padding
+    ], fill=(0, 0, 0, 120))
+    
+    # Add the watermark text
+    draw.text((x, y), watermark_text, font=font, fill=(255, 255, 255, 200))
+    
+    # Add timestamp watermark in top left
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M")
+    timestamp_text = f"Captured: {timestamp}"
+    
+    # Get timestamp dimensions
+    bbox_time = draw.textbbox((0, 0), timestamp_text, font=font)
+    time_width = bbox_time[2] - bbox_time[0]
+    time_height = bbox_time[3] - bbox_time[1]
+    
+    # Add timestamp background
+    draw.rectangle([
+        10, 
+        10, 
+        10 + time_width + 20, 
+        10 + time_height + 20
+    ], fill=(0, 0, 0, 120))
+    
+    # Add timestamp text
+    draw.text((20, 20), timestamp_text, font=font, fill=(255, 255, 255, 200))
+    
+    # Combine the images
+    watermarked = Image.alpha_composite(img, overlay)
+    
+    # Convert back to RGB for JPEG
+    if watermarked.mode == 'RGBA':
+        watermarked = watermarked.convert('RGB')
+    return watermarked
+
+# Every watermarked image is a progressive JPEG, plus smaller encodings next
+# to it that /watermarked/ serves to clients which accept them. Best first.
+JPEG_OPTIONS = {'quality': 85, 'optimize': True, 'progressive': True}
+IMAGE_VARIANTS = (
+    ('avif', 'AVIF', 'image/avif', {'quality': 60, 'speed': 8}),
+    ('webp', 'WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+)
+_variant_support = None
+
+def supported_variants():
+    """The IMAGE_VARIANTS enabled by AGROLINK_IMAGE_VARIANTS that this Pillow build can encode
+
+    AVIF needs Pillow 11.3+ or pillow-avif-plugin and is the slowest to encode;
+    set AGROLINK_IMAGE_VARIANTS=webp to skip it, or to an empty string for JPEG only.
+    """
+    global _variant_support
+    if _variant_support is None:
+        enabled = os.environ.get('AGROLINK_IMAGE_VARIANTS', 'avif,webp').split(',')
+        from PIL import Image
+        try:
+            import pillow_avif  # registers the AVIF plugin on older Pillow
+        except ImportError:
+            pass
+        Image.init()
+        _variant_support = tuple(variant for variant in IMAGE_VARIANTS
+                                 if variant[0] in enabled and variant[1] in Image.SAVE)
+    return _variant_support
+
+def variant_filename(filename, extension):
+    return f"{filename.rsplit('.', 1)[0]}.{extension}"
+
+def encode_image(watermarked, output_path):
+    """Save the watermarked image as JPEG plus every supported variant; returns {format: (bytes, seconds)}"""
+    encodings = [('jpeg', output_path, 'JPEG', JPEG_OPTIONS)]
+    for extension, pil_format, _, options in supported_variants():
+        encodings.append((extension, variant_filename(output_path, extension), pil_format, options))
+    
+    report = {}
+    for name, path, pil_format, options in encodings:
+        start = time.perf_counter()
+        watermarked.save(path, pil_format, **options)
+        elapsed = time.perf_counter() - start
+        size = os.path.getsize(path)
+        WATERMARK_ENCODE_LATENCY.labels(name).observe(elapsed)
+        WATERMARK_ENCODED_BYTES.labels(name).inc(size)
+        report[name] = (size, elapsed)
+    return report
+
 def add_watermark(image_path, farmer_name, output_path):
-    """Add farmer name watermark to image"""
+    """Add farmer name watermark to image; returns the original's perceptual hash, or None on failure"""
     try:
-        # Open the image
-        with Image.open(image_path) as img:
-            # Convert to RGBA if not already
-            if img.mode != 'RGBA':
-                img = img.convert('RGBA')
-            
-            # Create a transparent overlay
-            overlay = Image.new('RGBA', img.size, (0, 0, 0, 0))
-            draw = ImageDraw.Draw(overlay)
-            
-            # Try to use a better font, fallback to default
-            try:
-                font = ImageFont.truetype("arial.ttf", 40)
-            except:
-                try:
-                    font = ImageFont.truetype("DejaVuSans.ttf", 40)
-                except:
-                    font = ImageFont.load_default()
-            
-            # Watermark text
-            watermark_text = f"© {farmer_name} - AgroLink Verified"
-            
-            # Get text dimensions
-            bbox = draw.textbbox((0, 0), watermark_text, font=font)
-            text_width = bbox[2] - bbox[0]
-            text_height = bbox[3] - bbox[1]
-            
-            # Calculate position (bottom right with some padding)
-            x = img.width - text_width - 20
-            y = img.height - text_height - 20
-            
-            # Add semi-transparent background for text
-            bg_padding = 10
-            draw.rectangle([
-                x - bg_padding, 
-                y - bg_padding, 
-                x + text_width + bg_padding, 
-                y + text_height + bg_padding
-            ], fill=(0, 0, 0, 120))
-            
-            # Add the watermark text
-            draw.text((x, y), watermark_text, font=font, fill=(255, 255, 255, 200))
-            
-            # Add timestamp watermark in top left
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M")
-            timestamp_text = f"Captured: {timestamp}"
-            
-            # Get timestamp dimensions
-            bbox_time = draw.textbbox((0, 0), timestamp_text, font=font)
-            time_width = bbox_time[2] - bbox_time[0]
-            time_height = bbox_time[3] - bbox_time[1]
-            
-            # Add timestamp background
-            draw.rectangle([
-                10, 
-                10, 
-                10 + time_width + 20, 
-                10 + time_height + 20
-            ], fill=(0, 0, 0, 120))
-            
-            # Add timestamp text
-            draw.text((20, 20), timestamp_text, font=font, fill=(255, 255, 255, 200))
-            
-            # Combine the images
-            watermarked = Image.alpha_composite(img, overlay)
-            
-            # Convert back to RGB for JPEG
-            if watermarked.mode == 'RGBA':
-                watermarked = watermarked.convert('RGB')
-            
-            # Save the watermarked image
-            watermarked.save(output_path, 'JPEG', quality=90)
-            
-            return True
+        with WATERMARK_STAGE_LATENCY.labels('decode').time():
+            img = decode_image(image_path)
+        
+        # Hashed before the overlay, so the same photo matches whoever uploaded it
+        with WATERMARK_STAGE_LATENCY.labels('phash').time():
+            fingerprint = perceptual_hash(img)
+        
+        with WATERMARK_STAGE_LATENCY.labels('composite').time():
+            watermarked = composite_watermark(img, farmer_name)
+        
+        with WATERMARK_STAGE_LATENCY.labels('encode').time():
+            encode_image(watermarked, output_path)
+        
+        return fingerprint
             
-    except Exception as e:
-        print(f"Error adding watermark: {str(e)}")
-        return False
+    except Exception:
+        logger.exception("Error adding watermark", extra={'image_path': image_path})
+        return None
+
+# Compress dynamic responses; registered first so it runs after every other hook
+@bp.after_app_request
+def compress_dynamic_response(response):
+    return compress_response(request, response, current_app.config['COMPRESS_MIN_BYTES'])
 
 # Fix CSP issue by adding security headers
-@app.after_request
+@bp.after_app_request
 def after_request(response):
     response.headers['Content-Security-Policy'] = "script-src 'self' 'unsafe-eval' 'unsafe-inline' https://cdn.tailwindcss.com https://unpkg.com; style-src 'self' 'unsafe-inline' https://cdn.tailwindcss.com; font-src 'self' data:; img-src 'self' data: blob:;"
     return response
 
+# Request instrumentation for the /metrics endpoint
+def _metrics_route():
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+@bp.before_app_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    REQUESTS_IN_FLIGHT.labels(_metrics_route()).inc()
+
+@bp.after_app_request
+def record_request_metrics(response):
+    start = g.get('request_start')
+    if start is not None:
+        route = _metrics_route()
+        status = str(response.status_code)
+        REQUEST_LATENCY.labels(request.method, route, status).observe(time.perf_counter() - start)
+        REQUEST_COUNT.labels(request.method, route, status).inc()
+        if response.status_code >= 500:
+            REQUEST_ERRORS.labels(request.method, route).inc()
+            g.error_counted = True
+    return response
+
+@bp.teardown_app_request
+def finish_request_metrics(exc):
+    # Unhandled exceptions normally reach record_request_metrics as a 500; count the
+    # ones propagated without a response (PROPAGATE_EXCEPTIONS) here instead
+    if exc is not None and not g.get('error_counted'):
+        REQUEST_ERRORS.labels(request.method, _metrics_route()).inc()
+    REQUESTS_IN_FLIGHT.labels(_metrics_route()).dec()
+
+# Request ids and structured access logging
+@bp.before_app_request
+def assign_request_id():
+    g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+
+@bp.after_app_request
+def log_request(response):
+    response.headers['X-Request-ID'] = g.get('request_id', '')
+    start = g.get('request_start')
+    logger.info("Request completed", extra={
+        'method': request.method,
+        'status': response.status_code,
+        'duration_ms': round((time.perf_counter() - start) * 1000, 3) if start is not None else None
+    })
+    return response
+
+# Admin access is enabled by setting AGROLINK_ADMIN_TOKEN
+def is_admin_request():
+    admin_token = os.environ.get('AGROLINK_ADMIN_TOKEN', '')
+    supplied = request.headers.get('X-Admin-Token', '')
+    return bool(admin_token) and hmac.compare_digest(supplied, admin_token)
+
+# Opt-in sampling profiler (AGROLINK_PROFILE env var or admin header)
+@bp.before_app_request
+def start_profiling():
+    if (request.headers.get(PROFILE_HEADER) and is_admin_request()) or PROFILER.should_sample():
+        PROFILER.start(_metrics_route())
+        g.profiling = True
+
+@bp.teardown_app_request
+def stop_profiling(exc):
+    if g.pop('profiling', False):
+        PROFILER.stop()
+
 # Database simulation (same as before)
 class AgroLinkDatabase:
     def __init__(self):
         self.farmers = []
         self.products = []
+        self.farmers_by_id = {}
+        self.products_by_id = {}
+        self.products_by_hash = {}
+        self.search_index = ProductSearchIndex()
+        self.farmer_locations = GeoIndex()
+        self.product_locations = GeoIndex()
+        self.aggregates = ProductAggregates()
+        self.rollups = ProductRollups.from_env()
+        self.custody = CustodyLedger()
+        self.photos = PhotoIndex()
+        # Watermarked file names without extension, so every format variant matches
+        self.image_stems = set()
+        # With AGROLINK_ANCHOR_INTERVAL set, products are anchored on-chain in Merkle batches
+        self.anchor = MerkleAnchor.from_env()
+        self.verification = VerificationCache(
+            self.get_verification_payload,
+            int(os.environ.get('AGROLINK_VERIFY_CACHE_ENTRIES', VERIFY_CACHE_ENTRIES)))
         self.farmer_counter = 0
         self.product_counter = 0
+        self.batch_counter = 0
         self.blockchain_block = 12847
-        self.add_sample_data()
+        # With AGROLINK_SHARED_STATE set, workers share one change log
+        self.store = None
+        if os.environ.get('AGROLINK_SHARED_STATE'):
+            from shared_state import SharedStore
+            self.store = SharedStore.from_env()
+        self.store_seq = 0
+        # Guards the indexes; local writes also allocate ids and blocks under it, so list order is block order
+        self._sync_lock = threading.Lock()
+        # Cleared while a loaded snapshot's search, geo and statistics indexes are built in the background
+        self._indexes_ready = threading.Event()
+        self._indexes_ready.set()
+        snapshot_path = os.environ.get('AGROLINK_SNAPSHOT')
+        if self.store is not None:
+            if snapshot_path:
+                logger.warning("AGROLINK_SNAPSHOT is ignored with AGROLINK_SHARED_STATE")
+            self.sync()
+            if self.store.claim('sample_data'):
+                self.add_sample_data()
+        elif snapshot_path:
+            self.load_snapshot(snapshot_path)
+        else:
+            self.add_sample_data()
+        if self.anchor is not None:
+            self.anchor.start(self.anchor_pending)
     
     def add_sample_data(self):
         sample_farmer = {
@@ -132,37 +343,241 @@ class AgroLinkDatabase:
         }
         self.add_farmer(sample_farmer)
     
+    @timed(DB_OPERATION_LATENCY, 'add_farmer')
     def add_farmer(self, farmer_data):
-        self.farmer_counter += 1
-        self.blockchain_block += 1
-        
-        farmer_data['id'] = self.farmer_counter
-        farmer_data['registration_date'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        farmer_data['blockchain_hash'] = f"0x{self.farmer_counter:08x}ABC123"
-        farmer_data['status'] = 'active'
-        farmer_data['block_number'] = self.blockchain_block
+        if self.store is not None:
+            farmer = self.store.append('farmer', lambda id, block: FarmerRecord.from_form(
+                farmer_data, id, block, time.time()))
+            self.sync()
+            farmer = self.farmers_by_id[farmer.id]
+        else:
+            with self._sync_lock:
+                self.farmer_counter += 1
+                self.blockchain_block += 1
+                farmer = FarmerRecord.from_form(farmer_data, self.farmer_counter, self.blockchain_block, time.time())
+                self._index_farmer(farmer)
+        logger.info("Farmer registered", extra={'farmer_id': farmer.id, 'block_number': farmer.block_number})
+        return farmer
+    
+    def export_snapshot(self, path, format=None):
+        """Write farmers and products to a columnar snapshot (see snapshot.py); returns the format used"""
+        with self._sync_lock:
+            farmers, products = list(self.farmers), list(self.products)
+            state = {'blockchain_block': self.blockchain_block}
+        return snapshot.write_snapshot(path, farmers, products, state, format)
+    
+    @timed(DB_OPERATION_LATENCY, 'load_snapshot')
+    def load_snapshot(self, path):
+        """Fill an empty database from a snapshot; custody starts at Produced for every product"""
+        if self.farmers or self.products:
+            raise ValueError("Snapshots can only be loaded into an empty database")
+        farmers, products, state = snapshot.read_snapshot(path)
+        for farmer in farmers:
+            self._index_farmer(farmer)
+        for product in products:
+            self._index_product(product, deferred=True)
+        if products:
+            # Lookups by id, QR code and hash work now; searches and statistics wait for the bulk build
+            self._indexes_ready.clear()
+            threading.Thread(target=self._build_indexes, args=(products,), name='agrolink-index',
+                             daemon=True).start()
+        self.farmer_counter = max((farmer.id for farmer in farmers), default=0)
+        self.product_counter = max((product.id for product in products), default=0)
+        self.blockchain_block = max(state.get('blockchain_block', 0), self.blockchain_block)
+        logger.info("Snapshot loaded", extra={'farmers': len(farmers), 'products': len(products), 'path': path})
+    
+    def _build_indexes(self, products):
+        """Bulk-build the search, geo and statistics indexes for snapshot products"""
+        start = time.perf_counter()
+        try:
+            # Chunks keep each index lock short, so products added meanwhile are not held up for long
+            for offset in range(0, len(products), INDEX_BUILD_CHUNK):
+                chunk = products[offset:offset + INDEX_BUILD_CHUNK]
+                self.search_index.add_many(chunk)
+                self.product_locations.add_many([
+                    (product.id, product.latitude, product.longitude, product.category)
+                    for product in chunk if product.latitude is not None])
+                self.aggregates.add_many(chunk)
+                self.rollups.add_many([(product, self._product_region(product)) for product in chunk])
+        except Exception:
+            logger.exception("Building the snapshot indexes failed")
+        finally:
+            self._indexes_ready.set()
+        logger.info("Snapshot indexes built", extra={
+            'products': len(products), 'took_ms': round((time.perf_counter() - start) * 1000, 1)})
+    
+    def wait_for_indexes(self, timeout=None):
+        """Block until a loaded snapshot is searchable; False if ``timeout`` ran out first"""
+        return self._indexes_ready.wait(timeout)
+    
+    def _index_farmer(self, farmer):
+        location = resolve_location(farmer.address)
+        if location:
+            farmer.latitude, farmer.longitude = location[:2]
+            self.farmer_locations.add(farmer.id, farmer.latitude, farmer.longitude)
         
-        self.farmers.append(farmer_data)
-        print(f"Farmer registered: {farmer_data['name']} (ID: {farmer_data['id']})")
-        return farmer_data
+        self.farmers.append(farmer)
+        self.farmers_by_id[farmer.id] = farmer
     
+    @timed(DB_OPERATION_LATENCY, 'add_product')
     def add_product(self, product_data):
-        self.product_counter += 1
-        self.blockchain_block += 1
+        # The record hash covers the product name, farmer and insertion time
+        if self.store is not None:
+            product = self.store.append('product', lambda id, block: ProductRecord.from_form(
+                product_data, id, block, time.time()))
+            self.sync()
+            product = self.products_by_id[product.id]
+        else:
+            with self._sync_lock:
+                self.product_counter += 1
+                self.blockchain_block += 1
+                product = ProductRecord.from_form(product_data, self.product_counter, self.blockchain_block,
+                                                  time.time())
+                self._index_product(product)
+        if self.anchor is not None:
+            # Each worker anchors the products it added
+            self.anchor.add(product)
+        logger.info("Product added", extra={
+            'product_id': product.id,
+            'farmer_id': product.farmer_id,
+            'block_number': product.block_number
+        })
+        return product
+    
+    def _product_region(self, product):
+        farmer = self.farmers_by_id.get(product.farmer_id)
+        return resolve_region(product.farm_location) or (resolve_region(farmer.address) if farmer else None)
+    
+    def _index_product(self, product, deferred=False):
+        """Index a product; ``deferred`` leaves search, geo and statistics to ``_build_indexes``"""
+        # Locate the farm, falling back to the farmer's registered address
+        farmer = self.farmers_by_id.get(product.farmer_id)
+        location = resolve_location(product.farm_location)
+        if location:
+            product.latitude, product.longitude = location[:2]
+        elif farmer is not None and farmer.latitude is not None:
+            product.latitude, product.longitude = farmer.latitude, farmer.longitude
+        
+        self.products.append(product)
+        self.products_by_id[product.id] = product
+        self.products_by_hash.setdefault(product.hash_digest, product)
+        if product.image_filename:
+            self.image_stems.add(product.image_filename.rsplit('.', 1)[0])
+        if product.image_phash is not None:
+            self.photos.add(product.id, product.image_phash)
+        # Like SupplyChain.createProduct, the farmer holds every new product at Produced
+        self.custody.add(CustodyEvent(product.id, None, farmer_holder(product.farmer_id), 0,
+                                      product.price_per_unit, product.added_at, product.block_number))
+        if deferred:
+            return
+        if product.latitude is not None:
+            self.product_locations.add(product.id, product.latitude, product.longitude, product.category)
+        self.search_index.add(product)
+        self.aggregates.add(product)
+        self.rollups.add(product, self._product_region(product))
+        self.verification.invalidate(product.qr_code)
+    
+    @timed(DB_OPERATION_LATENCY, 'transfer_product')
+    def transfer_product(self, product_id, from_holder, to_holder, stage, price=None):
+        """Hand a product to a new holder, optionally advancing its stage (SupplyChain.transferProduct)"""
+        def build(block_number):
+            self.custody.validate(product_id, from_holder, to_holder, stage)
+            return CustodyEvent(product_id, from_holder, to_holder, stage, price, time.time(), block_number)
         
-        hash_input = f"{product_data['product_name']}{product_data['farmer_id']}{datetime.now().isoformat()}"
-        blockchain_hash = hashlib.sha256(hash_input.encode()).hexdigest()[:16]
+        if self.store is not None:
+            def build_shared(id, block_number):
+                # Validate against every transfer committed before this one
+                self.sync()
+                return build(block_number)
+            event = self.store.append('transfer', build_shared)
+            self.sync()
+        else:
+            with self._sync_lock:
+                event = build(self.blockchain_block + 1)
+                self.blockchain_block += 1
+                self._index_transfer(event)
+        logger.info("Product transferred", extra={
+            'product_id': product_id,
+            'stage': STAGES[stage],
+            'block_number': event.block_number
+        })
+        return event
+    
+    def _index_transfer(self, event):
+        self.custody.add(event)
+        product = self.products_by_id.get(event.product_id)
+        if product is not None:
+            self.verification.invalidate(product.qr_code)
+    
+    def anchor_pending(self):
+        """Anchor queued products under one Merkle root; returns the batch, or None if none were queued"""
+        items = self.anchor.take()
+        if not items:
+            return None
+        product_ids = [product_id for product_id, _ in items]
+        leaves = [leaf for _, leaf in items]
+        root = merkle_root(leaves)
+        receipt = (None, None, None)
+        if self.anchor.chain is not None:
+            try:
+                receipt = self.anchor.chain.anchor(root, len(leaves))
+            except Exception:
+                self.anchor.restore(items)
+                ANCHOR_BATCHES.labels('failed').inc()
+                raise
         
-        product_data['id'] = self.product_counter
-        product_data['added_date'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        product_data['blockchain_hash'] = f"0x{blockchain_hash}"
-        product_data['block_number'] = self.blockchain_block
-        product_data['status'] = 'active'
-        product_data['qr_code'] = f"QR{self.product_counter:06d}"
+        def build(batch_id, block_number):
+            return AnchorBatch(batch_id, root, product_ids, leaves, time.time(), block_number, *receipt)
         
-        self.products.append(product_data)
-        print(f"Product added: {product_data['product_name']} (ID: {product_data['id']})")
-        return product_data
+        if self.store is not None:
+            batch = self.store.append('batch', build)
+            self.sync()
+        else:
+            with self._sync_lock:
+                self.batch_counter += 1
+                self.blockchain_block += 1
+                batch = build(self.batch_counter, self.blockchain_block)
+                self._index_batch(batch)
+        ANCHOR_BATCHES.labels('anchored').inc()
+        ANCHORED_PRODUCTS.inc(len(leaves))
+        logger.info("Batch anchored", extra={
+            'batch_id': batch.id,
+            'size': len(leaves),
+            'root': f"0x{root.hex()}",
+            'tx_hash': batch.tx_hash
+        })
+        return batch
+    
+    def _index_batch(self, batch):
+        if self.anchor is None:
+            return
+        self.anchor.add_batch(batch)
+        for product_id in batch.product_ids:
+            product = self.products_by_id.get(product_id)
+            if product is not None:
+                self.verification.invalidate(product.qr_code)
+    
+    def sync(self):
+        """Apply changes other workers wrote to the shared store since the last sync"""
+        with self._sync_lock:
+            for seq, kind, state in self.store.changes_since(self.store_seq):
+                if kind == 'farmer':
+                    record = FarmerRecord.from_state(state)
+                    self._index_farmer(record)
+                    self.farmer_counter = max(self.farmer_counter, record.id)
+                elif kind == 'product':
+                    record = ProductRecord.from_state(state)
+                    self._index_product(record)
+                    self.product_counter = max(self.product_counter, record.id)
+                elif kind == 'transfer':
+                    record = CustodyEvent.from_state(state)
+                    self._index_transfer(record)
+                else:
+                    record = AnchorBatch.from_state(state)
+                    self._index_batch(record)
+                    self.batch_counter = max(self.batch_counter, record.id)
+                self.blockchain_block = max(self.blockchain_block, record.block_number)
+                self.store_seq = seq
     
     def get_farmer_count(self):
         return len(self.farmers)
@@ -176,18 +591,100 @@ class AgroLinkDatabase:
     def get_all_products(self):
         return self.products
     
+    @timed(DB_OPERATION_LATENCY, 'get_farmer_by_id')
     def get_farmer_by_id(self, farmer_id):
-        for farmer in self.farmers:
-            if farmer['id'] == farmer_id:
-                return farmer
-        return None
+        return self.farmers_by_id.get(farmer_id)
     
+    @timed(DB_OPERATION_LATENCY, 'get_product_by_id')
     def get_product_by_id(self, product_id):
-        for product in self.products:
-            if product['id'] == product_id:
+        return self.products_by_id.get(product_id)
+    
+    def get_product_by_qr(self, qr_code):
+        # QR codes are the product id zero-padded after a "QR" prefix
+        if qr_code.startswith('QR') and qr_code[2:].isdigit():
+            product = self.products_by_id.get(int(qr_code[2:]))
+            if product is not None and product.qr_code == qr_code:
                 return product
         return None
     
+    def get_product_by_hash(self, blockchain_hash):
+        try:
+            digest = bytes.fromhex(blockchain_hash[2:] if blockchain_hash.lower().startswith('0x') else blockchain_hash)
+        except ValueError:
+            return None
+        return self.products_by_hash.get(digest)
+    
+    def get_verification_payload(self, qr_code):
+        """Everything a QR scan shows, or None for an unknown code"""
+        product = self.get_product_by_qr(qr_code)
+        if product is None:
+            return None
+        farmer = self.farmers_by_id.get(product.farmer_id)
+        custody = self.custody.current(product.id)
+        blockchain = {'hash': product.blockchain_hash, 'block_number': product.block_number}
+        located = self.anchor.locate(product.id) if self.anchor is not None else None
+        if located is not None:
+            blockchain['anchor'] = {'batch_id': located[0].id, 'root': f"0x{located[0].root.hex()}",
+                                    'tx_hash': located[0].tx_hash}
+        return {
+            'success': True,
+            'verified': product.status == 'active' and farmer is not None,
+            'qr_code': product.qr_code,
+            'product': product.to_dict(),
+            'farmer': {'id': farmer.id, 'name': farmer.name, 'status': farmer.status} if farmer else None,
+            'custody': {'stage': STAGES[custody.stage], 'holder': custody.to_holder} if custody else None,
+            'blockchain': blockchain
+        }
+    
+    def search_products(self, query, category=None, unit=None, limit=20, offset=0):
+        self.wait_for_indexes()
+        ranked, total, facets, corrections = self.search_index.search(query, category, unit, limit, offset)
+        results = []
+        for product_id, score in ranked:
+            product = self.products_by_id[product_id].to_dict()
+            product['score'] = round(score, 4)
+            results.append(product)
+        return {'total': total, 'results': results, 'facets': facets, 'corrections': corrections}
+    
+    def find_nearby(self, kind, lat, lon, radius_km=None, bbox=None, category=None, limit=50):
+        """Farmers or products within a radius (nearest first) or a bounding box"""
+        if kind == 'farmers':
+            index, records = self.farmer_locations, self.farmers_by_id
+        else:
+            self.wait_for_indexes()
+            index, records = self.product_locations, self.products_by_id
+        
+        results = []
+        if bbox is not None:
+            for item_id, _, _ in index.within_bbox(*bbox, category=category, limit=limit):
+                results.append(records[item_id].to_dict())
+        else:
+            for distance, item_id, _, _ in index.within_radius(lat, lon, radius_km, category=category, limit=limit):
+                record = records[item_id].to_dict()
+                record['distance_km'] = round(distance, 2)
+                results.append(record)
+        return results
+    
+    def get_grouped_stats(self, group_by, filters=None, sort='product_count', limit=None):
+        """Pre-aggregated product statistics grouped by category, farmer_id, unit and/or day"""
+        self.wait_for_indexes()
+        groups = []
+        for values, stats in self.aggregates.query(group_by, filters):
+            group = dict(values)
+            if 'farmer_id' in group:
+                farmer = self.farmers_by_id.get(group['farmer_id'])
+                group['farmer_name'] = farmer.name if farmer else None
+            group.update(stats.to_dict())
+            groups.append(group)
+        if sort not in SORTABLE_STATS and sort not in group_by:
+            raise ValueError(f"Cannot sort by {sort}")
+        # Dimensions sort ascending, measures largest first; missing values go last
+        descending = sort in SORTABLE_STATS
+        present = [g for g in groups if g.get(sort) is not None]
+        present.sort(key=lambda g: g[sort], reverse=descending)
+        groups = present + [g for g in groups if g.get(sort) is None]
+        return groups[:limit] if limit else groups
+    
     def get_blockchain_stats(self):
         return {
             'blockchain_status': 'Connected',
@@ -197,23 +694,171 @@ class AgroLinkDatabase:
             'product_count': self.get_product_count()
         }
 
-# Initialize database
-db = AgroLinkDatabase()
+# The database is created on first use, once per app
+_db_lock = threading.Lock()
+
+def get_db():
+    database = current_app.extensions.get('agrolink_db')
+    if database is None:
+        with _db_lock:
+            database = current_app.extensions.get('agrolink_db')
+            if database is None:
+                database = current_app.extensions['agrolink_db'] = AgroLinkDatabase()
+    return database
+
+db = LocalProxy(get_db)
+
+# Pick up records other workers added before serving each request
+@bp.before_app_request
+def sync_shared_state():
+    if db.store is not None and db.store.changed():
+        db.sync()
+
+# Rendered QR codes are cached in memory and under static/qr; qrcodes pulls in
+# qrcode and PIL, so it is imported with the first QR request
+def get_qr_service():
+    service = current_app.extensions.get('agrolink_qr')
+    if service is None:
+        from qrcodes import QRCodeService
+        service = current_app.extensions['agrolink_qr'] = QRCodeService.from_env(
+            os.path.join(current_app.root_path, current_app.config['QR_FOLDER']))
+    return service
+
+# Retried form submissions carrying the same Idempotency-Key replay the first response
+def get_idempotency_store():
+    store = current_app.extensions.get('agrolink_idempotency')
+    if store is None:
+        store = current_app.extensions['agrolink_idempotency'] = idempotency.create_store(db.store)
+    return store
+
+def idempotent(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key') if request.method == 'POST' else None
+        if request.method == 'POST' and not key:
+            key = request.form.get('idempotency_key')
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > idempotency.MAX_KEY_LENGTH:
+            return jsonify({'success': False, 'message': 'Idempotency key is too long'}), 400
+        
+        scoped_key = f"{request.path}:{key}"
+        state, stored = get_idempotency_store().begin(
+            scoped_key, idempotency.request_fingerprint(request.form, request.files))
+        IDEMPOTENT_REQUESTS.labels(state).inc()
+        if state == idempotency.REPLAY:
+            response = Response(stored.body, status=stored.status, headers=stored.headers)
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+        if state == idempotency.MISMATCH:
+            return jsonify({'success': False, 'message': 'Idempotency key was already used with different data'}), 422
+        if state == idempotency.IN_PROGRESS:
+            response = jsonify({'success': False, 'message': 'The original request is still being processed'})
+            response.headers['Retry-After'] = '1'
+            return response, 409
+        
+        try:
+            response = current_app.make_response(view(*args, **kwargs))
+        except BaseException:
+            get_idempotency_store().abandon(scoped_key)
+            raise
+        # Overload responses (429 and 5xx) are not the request's outcome, so a retry runs it again
+        if response.status_code >= 500 or response.status_code == 429 or response.is_streamed:
+            get_idempotency_store().abandon(scoped_key)
+        else:
+            get_idempotency_store().complete(scoped_key, idempotency.StoredResponse(
+                response.status_code, [('Content-Type', response.content_type)], response.get_data()))
+        return response
+    return wrapper
+
+# Orphaned uploads and watermarked files are swept in the background, by one janitor per app
+_janitor_lock = threading.Lock()
+
+def get_janitor():
+    janitor = current_app.extensions.get('agrolink_janitor')
+    if janitor is None:
+        database = get_db()
+        with _janitor_lock:
+            janitor = current_app.extensions.get('agrolink_janitor')
+            if janitor is None:
+                directories = {
+                    # Originals are deleted once watermarked, so anything left is orphaned
+                    'uploads': (os.path.join(current_app.root_path, current_app.config['UPLOAD_FOLDER']),
+                                lambda name: False),
+                    'watermarked': (os.path.join(current_app.root_path, current_app.config['WATERMARKED_FOLDER']),
+                                    lambda name: name.rsplit('.', 1)[0] in database.image_stems),
+                }
+                janitor = current_app.extensions['agrolink_janitor'] = UploadJanitor.from_env(
+                    directories, database.sync if database.store is not None else None)
+    return janitor
+
+@bp.before_app_request
+def start_janitor():
+    get_janitor().start()
+
+# Image uploads are admitted against concurrency and memory limits before decoding
+def get_upload_admission():
+    admission = current_app.extensions.get('agrolink_upload_admission')
+    if admission is None:
+        admission = current_app.extensions['agrolink_upload_admission'] = UploadAdmission.from_env()
+    return admission
+
+def upload_rejected(error):
+    response = jsonify({'success': False, 'message': error.message})
+    if error.retry_after is not None:
+        response.headers['Retry-After'] = str(error.retry_after)
+    return response, error.status
+
+def shed_uploads(view):
+    """Refuse large POST bodies while the upload queue is full, before the body is parsed"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method == 'POST' and (request.content_length or 0) >= UPLOAD_SHED_BYTES:
+            try:
+                get_upload_admission().check_capacity()
+            except AdmissionRejected as e:
+                UPLOAD_ADMISSIONS.labels('busy').inc()
+                return upload_rejected(e)
+        return view(*args, **kwargs)
+    return wrapper
+
+# Pages and their CSS/JS are fingerprinted and precompressed by create_app()
+def asset_url(name):
+    return current_app.extensions['agrolink_assets'].url(name)
+
+def render_page(template, **context):
+    """Serve a page precompressed when it has no template markup, else render it"""
+    page = current_app.extensions['agrolink_assets'].pages.get(template)
+    if page is not None:
+        return page.response(request, Response, 'no-cache')
+    return render_template(template, **context)
+
+@bp.route('/assets/<name>')
+def static_asset(name):
+    asset = current_app.extensions['agrolink_assets'].assets.get(name)
+    if asset is None:
+        return jsonify({'success': False, 'message': f'Unknown asset {name}'}), 404
+    return asset.response(request, Response, 'public, max-age=31536000, immutable')
+
+def verification_url(qr_code):
+    base_url = os.environ.get('AGROLINK_PUBLIC_URL') or request.url_root
+    return f"{base_url.rstrip('/')}/verify/{qr_code}"
 
 # Homepage route
-@app.route('/')
+@bp.route('/')
 def index():
     stats = db.get_blockchain_stats()
-    return render_template('index.html', 
-                         blockchain_status=stats['blockchain_status'],
-                         latest_block=stats['latest_block'], 
-                         account_count=stats['account_count'])
+    return render_page('index.html', 
+                     blockchain_status=stats['blockchain_status'],
+                     latest_block=stats['latest_block'], 
+                     account_count=stats['account_count'])
 
 # Farmer registration route
-@app.route('/register', methods=['GET', 'POST'])
+@bp.route('/register', methods=['GET', 'POST'])
+@idempotent
 def register():
     if request.method == 'GET':
-        return render_template('register.html')
+        return render_page('register.html')
     
     elif request.method == 'POST':
         try:
@@ -232,7 +877,7 @@ def register():
                     return jsonify({
                         'success': False,
                         'message': f'{field.replace("_", " ").title()} is required'
-                    })
+                    }), 400
             
             registered_farmer = db.add_farmer(farmer_data)
             
@@ -245,20 +890,24 @@ def register():
             })
             
         except Exception as e:
+            # A 5xx releases the idempotency key, so a retry registers again instead of replaying this
+            logger.exception("Farmer registration error")
             return jsonify({
                 'success': False,
                 'message': f'Registration failed: {str(e)}'
-            })
+            }), 500
 
 # Add product route with image processing
-@app.route('/add_product', methods=['GET', 'POST'])  
+@bp.route('/add_product', methods=['GET', 'POST'])  
+@shed_uploads
+@idempotent
 def add_product():
     if request.method == 'GET':
         stats = db.get_blockchain_stats()
-        return render_template('add_product.html',
-                             farmer_count=stats['farmer_count'],
-                             product_count=stats['product_count'],
-                             blockchain_block=stats['latest_block'])
+        return render_page('add_product.html',
+                         farmer_count=stats['farmer_count'],
+                         product_count=stats['product_count'],
+                         blockchain_block=stats['latest_block'])
     
     elif request.method == 'POST':
         try:
@@ -281,14 +930,14 @@ def add_product():
                     return jsonify({
                         'success': False,
                         'message': f'{field.replace("_", " ").title()} is required'
-                    })
+                    }), 400
             
             # Convert and validate farmer_id
             try:
                 farmer_id = int(product_data['farmer_id'])
                 product_data['farmer_id'] = farmer_id
             except ValueError:
-                return jsonify({'success': False, 'message': 'Invalid farmer ID'})
+                return jsonify({'success': False, 'message': 'Invalid farmer ID'}), 400
             
             # Check if farmer exists
             farmer = db.get_farmer_by_id(farmer_id)
@@ -296,12 +945,13 @@ def add_product():
                 return jsonify({
                     'success': False,
                     'message': f'Farmer with ID {farmer_id} not found. Please register as a farmer first.'
-                })
+                }), 404
             
             product_data['farmer_name'] = farmer['name']
             
             # Handle image upload and watermarking
             watermarked_filename = None
+            duplicate_photos = []
             if 'product_image' in request.files:
                 file = request.files['product_image']
                 if file and file.filename != '' and allowed_file(file.filename):
@@ -310,23 +960,62 @@ def add_product():
                     file_extension = original_filename.rsplit('.', 1)[1].lower()
                     unique_filename = f"{uuid.uuid4().hex}.{file_extension}"
                     
-                    # Save original image temporarily
-                    temp_path = os.path.join(app.root_path, app.config['UPLOAD_FOLDER'], unique_filename)
-                    file.save(temp_path)
+                    # Create upload directories on the first upload
+                    upload_folder = os.path.join(current_app.root_path, current_app.config['UPLOAD_FOLDER'])
+                    watermarked_folder = os.path.join(current_app.root_path, current_app.config['WATERMARKED_FOLDER'])
+                    os.makedirs(upload_folder, exist_ok=True)
+                    os.makedirs(watermarked_folder, exist_ok=True)
+                    
+                    # Size the decode from the image header before committing memory to it
+                    try:
+                        cost = estimate_decode_bytes(file.stream)
+                    except Exception:
+                        UPLOAD_ADMISSIONS.labels('invalid').inc()
+                        return jsonify({'success': False, 'message': 'Failed to process image'}), 400
+                    
+                    try:
+                        with get_upload_admission().admit(farmer_id, cost) as waited:
+                            UPLOAD_ADMISSIONS.labels('queued' if waited else 'admitted').inc()
+                            UPLOAD_QUEUE_WAIT.observe(waited)
+                            UPLOADS_ACTIVE.inc()
+                            try:
+                                # Save original image temporarily
+                                temp_path = os.path.join(upload_folder, unique_filename)
+                                file.save(temp_path)
+                                
+                                # Create watermarked version
+                                watermarked_filename = f"watermarked_{unique_filename}"
+                                watermarked_path = os.path.join(watermarked_folder, watermarked_filename)
+                                fingerprint = add_watermark(temp_path, farmer['name'], watermarked_path)
+                            finally:
+                                UPLOADS_ACTIVE.dec()
+                    except AdmissionRejected as e:
+                        UPLOAD_ADMISSIONS.labels({413: 'too_large', 429: 'per_farmer'}.get(e.status, 'busy')).inc()
+                        return upload_rejected(e)
                     
-                    # Create watermarked version
-                    watermarked_filename = f"watermarked_{unique_filename}"
-                    watermarked_path = os.path.join(app.root_path, app.config['WATERMARKED_FOLDER'], watermarked_filename)
+                    # Remove temporary file
+                    os.remove(temp_path)
+                    if fingerprint is None:
+                        # Drop any partially written outputs
+                        for path in [watermarked_path] + [variant_filename(watermarked_path, variant[0])
+                                                          for variant in IMAGE_VARIANTS]:
+                            if os.path.exists(path):
+                                os.remove(path)
+                        return jsonify({'success': False, 'message': 'Failed to process image'}), 400
+                    product_data['image_filename'] = watermarked_filename
+                    product_data['image_phash'] = fingerprint
                     
-                    # Add watermark
-                    if add_watermark(temp_path, farmer['name'], watermarked_path):
-                        product_data['image_filename'] = watermarked_filename
-                        # Remove temporary file
-                        os.remove(temp_path)
-                    else:
-                        return jsonify({'success': False, 'message': 'Failed to process image'})
+                    # Flag photos that look like another farmer's upload; the product is still added
+                    duplicate_photos = [match for match in similar_photos(fingerprint)
+                                        if match['farmer_id'] != farmer_id]
+                    if duplicate_photos:
+                        DUPLICATE_PHOTOS.inc()
+                        logger.warning("Uploaded photo resembles another farmer's", extra={
+                            'farmer_id': farmer_id,
+                            'matches': [match['product_id'] for match in duplicate_photos]
+                        })
                 elif file and file.filename != '':
-                    return jsonify({'success': False, 'message': 'Invalid file type. Please upload JPG, JPEG, or PNG files only.'})
+                    return jsonify({'success': False, 'message': 'Invalid file type. Please upload JPG, JPEG, or PNG files only.'}), 400
             
             # Add product to blockchain
             added_product = db.add_product(product_data)
@@ -339,18 +1028,19 @@ def add_product():
                 'block_number': added_product['block_number'],
                 'qr_code': added_product['qr_code'],
                 'product_count': db.get_product_count(),
-                'watermarked_image': watermarked_filename
+                'watermarked_image': watermarked_filename,
+                'duplicate_photos': duplicate_photos
             })
             
         except Exception as e:
-            print(f"Product addition error: {str(e)}")
+            logger.exception("Product addition error")
             return jsonify({
                 'success': False,
                 'message': f'Failed to add product: {str(e)}'
-            })
+            }), 500
 
 # View products route with watermarked images
-@app.route('/products')
+@bp.route('/products')
 def products():
     products_list = db.get_all_products()
     stats = db.get_blockchain_stats()
@@ -430,118 +1120,7 @@ def products():
         <meta charset="UTF-8">
         <meta name="viewport" content="width=device-width, initial-scale=1.0">
         <title>Products - AgroLink</title>
-        <style>
-            body {{
-                background: linear-gradient(-45deg, #0f0c29, #302b63, #24243e, #3a1c71);
-                background-size: 400% 400%;
-                animation: gradientBG 15s ease infinite;
-                font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-                color: white;
-                min-height: 100vh;
-                margin: 0;
-                padding: 20px;
-            }}
-            
-            @keyframes gradientBG {{
-                0% {{ background-position: 0% 50%; }}
-                50% {{ background-position: 100% 50%; }}
-                100% {{ background-position: 0% 50%; }}
-            }}
-            
-            .container {{
-                max-width: 1000px;
-                margin: 0 auto;
-            }}
-            
-            .header {{
-                text-align: center;
-                margin-bottom: 40px;
-                padding: 20px 0;
-            }}
-            
-            .header h1 {{
-                font-size: 3rem;
-                font-weight: bold;
-                margin-bottom: 10px;
-                background: linear-gradient(45deg, #8a2be2, #64d9ff);
-                -webkit-background-clip: text;
-                -webkit-text-fill-color: transparent;
-                background-clip: text;
-            }}
-            
-            .stats {{
-                display: grid;
-                grid-template-columns: repeat(auto-fit, minmax(250px, 1fr));
-                gap: 20px;
-                margin-bottom: 40px;
-            }}
-            
-            .stat-card {{
-                background: rgba(15,15,35,0.25);
-                backdrop-filter: blur(10px);
-                border-radius: 16px;
-                border: 1px solid rgba(138,43,226,0.3);
-                padding: 25px;
-                text-align: center;
-                transition: all 0.3s ease;
-            }}
-            
-            .nav-buttons {{
-                text-align: center;
-                margin-bottom: 40px;
-            }}
-            
-            .nav-btn {{
-                background: linear-gradient(45deg, rgba(138,43,226,0.8), rgba(100,217,255,0.8));
-                border: none;
-                border-radius: 10px;
-                padding: 12px 24px;
-                color: white;
-                text-decoration: none;
-                margin: 0 10px 10px;
-                display: inline-block;
-                transition: all 0.3s ease;
-                font-weight: 600;
-            }}
-            
-            .nav-btn:hover {{
-                background: linear-gradient(45deg, rgba(138,43,226,1), rgba(100,217,255,1));
-                transform: translateY(-2px);
-                color: white;
-                text-decoration: none;
-            }}
-            
-            .modal {{
-                display: none;
-                position: fixed;
-                z-index: 1000;
-                left: 0;
-                top: 0;
-                width: 100%;
-                height: 100%;
-                background-color: rgba(0,0,0,0.8);
-            }}
-            
-            .modal-content {{
-                background: rgba(15,15,35,0.9);
-                margin: 5% auto;
-                padding: 20px;
-                border-radius: 16px;
-                width: 80%;
-                max-width: 600px;
-                text-align: center;
-            }}
-            
-            .close {{
-                color: #aaa;
-                float: right;
-                font-size: 28px;
-                font-weight: bold;
-                cursor: pointer;
-            }}
-            
-            .close:hover {{ color: white; }}
-        </style>
+        <link rel="stylesheet" href="{asset_url('products_view.css')}">
     </head>
     <body>
         <div class="container">
@@ -588,712 +1167,529 @@ def products():
             </div>
         </div>
         
-        <script>
-            function viewFullImage(filename) {{
-                if (!filename) return;
-                
-                const modal = document.getElementById('imageModal');
-                const modalImg = document.getElementById('modalImage');
-                
-                modalImg.src = '/watermarked/' + filename;
-                modal.style.display = 'block';
-            }}
-            
-            function closeModal() {{
-                document.getElementById('imageModal').style.display = 'none';
-            }}
-            
-            // Close modal when clicking outside
-            window.onclick = function(event) {{
-                const modal = document.getElementById('imageModal');
-                if (event.target == modal) {{
-                    modal.style.display = 'none';
-                }}
-            }}
-        </script>
+        <script src="{asset_url('products_view.js')}"></script>
     </body>
     </html>
     """
 
-# Serve watermarked images
-@app.route('/watermarked/<filename>')
+# Serve watermarked images, picking the smallest encoding the client lists in Accept
+@bp.route('/watermarked/<filename>')
 def watermarked_file(filename):
-    return send_from_directory(
-        os.path.join(app.root_path, app.config['WATERMARKED_FOLDER']),
-        filename
-    )
+    folder = os.path.join(current_app.root_path, current_app.config['WATERMARKED_FOLDER'])
+    # Only explicit types count; */* would hand AVIF to clients that cannot decode it
+    accepted = {mimetype for mimetype, quality in request.accept_mimetypes if quality > 0}
+    served = filename
+    for extension, _, mimetype, _ in IMAGE_VARIANTS:
+        if mimetype in accepted:
+            candidate = variant_filename(secure_filename(filename), extension)
+            if candidate != filename and os.path.isfile(os.path.join(folder, candidate)):
+                served = candidate
+                break
+    
+    response = send_from_directory(folder, served)
+    response.vary.add('Accept')
+    return response
+
+# Product verification, the target of every printed QR code. Browsers get
+# an HTML page, everything else JSON; both come prebuilt from db.verification
+def verification_response(entry):
+    if request.accept_mimetypes.best_match(['application/json', 'text/html']) == 'text/html':
+        response = Response(entry.html_body, content_type='text/html; charset=utf-8')
+    else:
+        response = Response(entry.json_body, content_type='application/json')
+    response.set_etag(entry.etag)
+    response.headers['Cache-Control'] = 'public, max-age=60'
+    response.vary.add('Accept')
+    return response.make_conditional(request)
+
+@bp.route('/verify/<qr_code>')
+def verify_product(qr_code):
+    entry = db.verification.get(qr_code)
+    if entry is None:
+        return jsonify({'success': False, 'verified': False, 'message': f'Unknown QR code {qr_code}'}), 404
+    return verification_response(entry)
+
+@bp.route('/verify/hash/<blockchain_hash>')
+def verify_product_hash(blockchain_hash):
+    product = db.get_product_by_hash(blockchain_hash)
+    if product is None:
+        return jsonify({'success': False, 'verified': False, 'message': f'Unknown hash {blockchain_hash}'}), 404
+    return verification_response(db.verification.get(product.qr_code))
+
+# QR code image for a product (?format=png|svg&size=64..2048)
+@bp.route('/qr/<qr_code>')
+def product_qr(qr_code):
+    if db.get_product_by_qr(qr_code) is None:
+        return jsonify({'success': False, 'message': f'Unknown QR code {qr_code}'}), 404
+    
+    from qrcodes import FORMATS, DEFAULT_SIZE
+    fmt = request.args.get('format', 'png')
+    try:
+        size = int(request.args.get('size', DEFAULT_SIZE))
+        body, etag = get_qr_service().get(verification_url(qr_code), fmt, size)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    # The image for a given code, format and size never changes
+    response = Response(body, content_type=FORMATS[fmt])
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response.make_conditional(request)
+
+# Printable PDF label sheet (?ids=1,2,3 or ?farmer_id=N)
+@bp.route('/qr/labels')
+def qr_labels():
+    try:
+        if request.args.get('ids'):
+            ids = [int(v) for v in request.args['ids'].split(',') if v.strip()]
+            products = [db.get_product_by_id(product_id) for product_id in ids]
+            products = [product for product in products if product is not None]
+        elif request.args.get('farmer_id'):
+            farmer_id = int(request.args['farmer_id'])
+            products = [product for product in db.get_all_products() if product['farmer_id'] == farmer_id]
+        else:
+            return jsonify({'success': False, 'message': 'Provide ids or farmer_id'}), 400
+    except ValueError:
+        return jsonify({'success': False, 'message': 'ids and farmer_id must be integers'}), 400
+    
+    if not products:
+        return jsonify({'success': False, 'message': 'No matching products'}), 404
+    if len(products) > 1000:
+        return jsonify({'success': False, 'message': 'At most 1000 labels per sheet'}), 400
+    
+    pdf = get_qr_service().label_sheet([{
+        'url': verification_url(product['qr_code']),
+        'title': product['product_name'],
+        'lines': [product['qr_code'], product['farmer_name'], f"Harvest {product['harvest_date']}"]
+    } for product in products])
+    return Response(pdf, content_type='application/pdf',
+                    headers={'Content-Disposition': 'inline; filename="agrolink-labels.pdf"'})
 
 # API Routes (same as before)
-@app.route('/api/farmers')
+@bp.route('/api/farmers')
 def api_farmers():
     return jsonify({
         'total_farmers': db.get_farmer_count(),
-        'farmers': db.get_all_farmers(),
+        'farmers': [farmer.to_dict() for farmer in db.get_all_farmers()],
         'blockchain_status': 'Connected',
         'last_updated': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     })
 
-@app.route('/api/products')
+@bp.route('/api/products')
 def api_products():
     return jsonify({
         'total_products': db.get_product_count(),
-        'products': db.get_all_products(),
+        'products': [product.to_dict() for product in db.get_all_products()],
         'blockchain_status': 'Connected',
         'last_updated': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     })
 
-@app.route('/api/stats')
-def api_stats():
-    return jsonify(db.get_blockchain_stats())
+@bp.route('/api/search')
+def api_search():
+    start = time.perf_counter()
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), 100)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'limit and offset must be integers'}), 400
+    
+    result = db.search_products(
+        request.args.get('q', '').strip(),
+        category=request.args.get('category') or None,
+        unit=request.args.get('unit') or None,
+        limit=limit,
+        offset=offset
+    )
+    result['query'] = request.args.get('q', '')
+    result['took_ms'] = round((time.perf_counter() - start) * 1000, 3)
+    return jsonify(result)
 
-# Run the app
-from flask import Flask, render_template, request, jsonify, redirect, url_for, send_from_directory
-from datetime import datetime
-import json
-import os
-import hashlib
-from PIL import Image, ImageDraw, ImageFont
-from werkzeug.utils import secure_filename
-import uuid
+@bp.route('/api/nearby')
+def api_nearby():
+    start = time.perf_counter()
+    kind = request.args.get('type', 'products')
+    if kind not in ('products', 'farmers'):
+        return jsonify({'success': False, 'message': 'type must be products or farmers'}), 400
+    
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), 500)
+        bbox = None
+        lat = lon = radius_km = None
+        if request.args.get('bbox'):
+            bbox = tuple(float(v) for v in request.args['bbox'].split(','))
+            if len(bbox) != 4:
+                raise ValueError
+        else:
+            radius_km = float(request.args.get('radius_km', 25))
+            if not math.isfinite(radius_km):
+                raise ValueError
+            radius_km = min(radius_km, 2000.0)
+            if request.args.get('near'):
+                location = resolve_location(request.args['near'])
+                if location is None:
+                    return jsonify({'success': False, 'message': f"Unknown place: {request.args['near']}"}), 404
+                lat, lon = location[:2]
+            else:
+                lat, lon = float(request.args['lat']), float(request.args['lon'])
+    except (KeyError, ValueError):
+        return jsonify({
+            'success': False,
+            'message': 'Provide lat and lon, near, or bbox=min_lat,min_lon,max_lat,max_lon'
+        }), 400
+    
+    try:
+        results = db.find_nearby(kind, lat, lon, radius_km=radius_km, bbox=bbox,
+                                 category=request.args.get('category') or None, limit=limit)
+    except ValueError as e:
+        # Out-of-range or non-finite coordinates, an inverted box or a non-positive radius
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({
+        'type': kind,
+        'center': None if bbox else {'latitude': lat, 'longitude': lon, 'radius_km': radius_km},
+        'bbox': bbox,
+        'count': len(results),
+        'results': results,
+        'took_ms': round((time.perf_counter() - start) * 1000, 3)
+    })
 
-# Create Flask app
-app = Flask(__name__)
+@bp.route('/api/rollups')
+def api_rollups():
+    try:
+        start = date.fromisoformat(request.args['start']) if request.args.get('start') else None
+        end = date.fromisoformat(request.args['end']) if request.args.get('end') else None
+        group_by = tuple(d for d in request.args.get('group_by', '').split(',') if d)
+        db.wait_for_indexes()
+        buckets = db.rollups.query(
+            granularity=request.args.get('granularity', 'day'),
+            axis=request.args.get('axis', 'added'),
+            start=start,
+            end=end,
+            category=request.args.get('category') or None,
+            region=request.args.get('region') or None,
+            group_by=group_by
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    return jsonify({
+        'granularity': request.args.get('granularity', 'day'),
+        'axis': request.args.get('axis', 'added'),
+        'group_by': list(group_by),
+        'buckets': buckets
+    })
 
-# Configuration for file uploads
-app.config['UPLOAD_FOLDER'] = 'static/uploads/products'
-app.config['WATERMARKED_FOLDER'] = 'static/watermarked'
-app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024  # 5MB max file size
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
+@bp.route('/api/stats')
+def api_stats():
+    stats = db.get_blockchain_stats()
+    if 'group_by' not in request.args:
+        return jsonify(stats)
+    
+    group_by = [d for d in request.args['group_by'].split(',') if d]
+    filters = {d: request.args[d] for d in DIMENSIONS if d in request.args}
+    sort = request.args.get('sort', 'product_count')
+    try:
+        limit = int(request.args['limit']) if 'limit' in request.args else None
+        stats['group_by'] = group_by
+        stats['filters'] = filters
+        stats['groups'] = db.get_grouped_stats(group_by, filters, sort, limit)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify(stats)
 
-# Create upload directories
-os.makedirs(os.path.join(app.root_path, app.config['UPLOAD_FOLDER']), exist_ok=True)
-os.makedirs(os.path.join(app.root_path, app.config['WATERMARKED_FOLDER']), exist_ok=True)
+# Custody chain, mirroring SupplyChain.sol's transferProduct and history
+def page_args(default_limit=50, max_limit=500):
+    limit = min(max(int(request.args.get('limit', default_limit)), 1), max_limit)
+    offset = max(int(request.args.get('offset', 0)), 0)
+    return limit, offset
 
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+def photo_match_distance():
+    return min(max(int(os.environ.get('AGROLINK_PHOTO_MATCH_DISTANCE', PHOTO_MATCH_DISTANCE)), 0), HASH_BITS)
 
-def add_watermark(image_path, farmer_name, output_path):
-    """Add farmer name watermark to image"""
-    try:
-        # Open the image
-        with Image.open(image_path) as img:
-            # Convert to RGBA if not already
-            if img.mode != 'RGBA':
-                img = img.convert('RGBA')
-            
-            # Create a transparent overlay
-            overlay = Image.new('RGBA', img.size, (0, 0, 0, 0))
-            draw = ImageDraw.Draw(overlay)
-            
-            # Try to use a better font, fallback to default
-            try:
-                font = ImageFont.truetype("arial.ttf", 40)
-            except:
-                try:
-                    font = ImageFont.truetype("DejaVuSans.ttf", 40)
-                except:
-                    font = ImageFont.load_default()
-            
-            # Watermark text
-            watermark_text = f"© {farmer_name} - AgroLink Verified"
-            
-            # Get text dimensions
-            bbox = draw.textbbox((0, 0), watermark_text, font=font)
-            text_width = bbox[2] - bbox[0]
-            text_height = bbox[3] - bbox[1]
-            
-            # Calculate position (bottom right with some padding)
-            x = img.width - text_width - 20
-            y = img.height - text_height - 20
-            
-            # Add semi-transparent background for text
-            bg_padding = 10
-            draw.rectangle([
-                x - bg_padding, 
-                y - bg_padding, 
-                x + text_width + bg_padding, 
-                y + text_height + bg_padding
-            ], fill=(0, 0, 0, 120))
-            
-            # Add the watermark text
-            draw.text((x, y), watermark_text, font=font, fill=(255, 255, 255, 200))
-            
-            # Add timestamp watermark in top left
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M")
-            timestamp_text = f"Captured: {timestamp}"
-            
-            # Get timestamp dimensions
-            bbox_time = draw.textbbox((0, 0), timestamp_text, font=font)
-            time_width = bbox_time[2] - bbox_time[0]
-            time_height = bbox_time[3] - bbox_time[1]
-            
-            # Add timestamp background
-            draw.rectangle([
-                10, 
-                10, 
-                10 + time_width + 20, 
-                10 + time_height + 20
-            ], fill=(0, 0, 0, 120))
-            
-            # Add timestamp text
-            draw.text((20, 20), timestamp_text, font=font, fill=(255, 255, 255, 200))
-            
-            # Combine the images
-            watermarked = Image.alpha_composite(img, overlay)
-            
-            # Convert back to RGB for JPEG
-            if watermarked.mode == 'RGBA':
-                watermarked = watermarked.convert('RGB')
-            
-            # Save the watermarked image
-            watermarked.save(output_path, 'JPEG', quality=90)
-            
-            return True
-            
-    except Exception as e:
-        print(f"Error adding watermark: {str(e)}")
-        return False
+def similar_photos(fingerprint, max_distance=None, exclude=None):
+    """Stored photos within ``max_distance`` bits of ``fingerprint``, closest first"""
+    if max_distance is None:
+        max_distance = photo_match_distance()
+    matches = []
+    for product_id, distance in db.photos.near(fingerprint, max_distance):
+        if product_id == exclude:
+            continue
+        product = db.get_product_by_id(product_id)
+        matches.append({
+            'product_id': product_id,
+            'farmer_id': product.farmer_id,
+            'farmer_name': product.farmer_name,
+            'image_filename': product.image_filename,
+            'distance': distance
+        })
+    return matches
 
-# Fix CSP issue by adding security headers
-@app.after_request
-def after_request(response):
-    response.headers['Content-Security-Policy'] = "script-src 'self' 'unsafe-eval' 'unsafe-inline' https://cdn.tailwindcss.com https://unpkg.com; style-src 'self' 'unsafe-inline' https://cdn.tailwindcss.com; font-src 'self' data:; img-src 'self' data: blob:;"
-    return response
+def custody_products(product_ids):
+    products = []
+    for product_id in product_ids:
+        product = db.get_product_by_id(product_id).to_dict()
+        current = db.custody.current(product_id)
+        product['stage'] = STAGES[current.stage]
+        product['holder'] = current.to_holder
+        products.append(product)
+    return products
 
-# Database simulation (same as before)
-class AgroLinkDatabase:
-    def __init__(self):
-        self.farmers = []
-        self.products = []
-        self.farmer_counter = 0
-        self.product_counter = 0
-        self.blockchain_block = 12847
-        self.add_sample_data()
+@bp.route('/api/products/<int:product_id>/transfer', methods=['POST'])
+def api_transfer_product(product_id):
+    if db.get_product_by_id(product_id) is None:
+        return jsonify({'success': False, 'message': f'Product {product_id} not found'}), 404
     
-    def add_sample_data(self):
-        sample_farmer = {
-            'name': 'Rajesh Kumar',
-            'email': 'farmer@example.com',
-            'phone': '+91 98765 43210',
-            'address': 'Sample Farm, Maharashtra, India',
-            'farm_size': '5.0',
-            'crops': 'Rice, Wheat, Tomatoes'
-        }
-        self.add_farmer(sample_farmer)
+    data = request.get_json(silent=True) or request.form
+    from_holder = str(data.get('from', '')).strip()
+    to_holder = str(data.get('to', '')).strip()
+    if not from_holder or not to_holder:
+        return jsonify({'success': False, 'message': 'from and to holders are required'}), 400
+    try:
+        stage = data.get('stage')
+        stage = parse_stage(stage) if stage not in (None, '') else db.custody.current(product_id).stage
+        event = db.transfer_product(product_id, from_holder, to_holder, stage, data.get('price'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 409
     
-    def add_farmer(self, farmer_data):
-        self.farmer_counter += 1
-        self.blockchain_block += 1
-        
-        farmer_data['id'] = self.farmer_counter
-        farmer_data['registration_date'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        farmer_data['blockchain_hash'] = f"0x{self.farmer_counter:08x}ABC123"
-        farmer_data['status'] = 'active'
-        farmer_data['block_number'] = self.blockchain_block
-        
-        self.farmers.append(farmer_data)
-        print(f"Farmer registered: {farmer_data['name']} (ID: {farmer_data['id']})")
-        return farmer_data
+    return jsonify({
+        'success': True,
+        'message': f'Product transferred to {to_holder}',
+        'transfer': event.to_dict()
+    })
+
+@bp.route('/api/products/<int:product_id>/history')
+def api_product_history(product_id):
+    if db.get_product_by_id(product_id) is None:
+        return jsonify({'success': False, 'message': f'Product {product_id} not found'}), 404
     
-    def add_product(self, product_data):
-        self.product_counter += 1
-        self.blockchain_block += 1
-        
-        hash_input = f"{product_data['product_name']}{product_data['farmer_id']}{datetime.now().isoformat()}"
-        blockchain_hash = hashlib.sha256(hash_input.encode()).hexdigest()[:16]
-        
-        product_data['id'] = self.product_counter
-        product_data['added_date'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        product_data['blockchain_hash'] = f"0x{blockchain_hash}"
-        product_data['block_number'] = self.blockchain_block
-        product_data['status'] = 'active'
-        product_data['qr_code'] = f"QR{self.product_counter:06d}"
-        
-        self.products.append(product_data)
-        print(f"Product added: {product_data['product_name']} (ID: {product_data['id']})")
-        return product_data
+    history = db.custody.history(product_id)
+    return jsonify({
+        'product_id': product_id,
+        'stage': STAGES[history[-1].stage],
+        'holder': history[-1].to_holder,
+        'history': [event.to_dict() for event in history]
+    })
+
+@bp.route('/api/products/<int:product_id>/similar_photos')
+def api_similar_photos(product_id):
+    if db.get_product_by_id(product_id) is None:
+        return jsonify({'success': False, 'message': f'Product {product_id} not found'}), 404
+    fingerprint = db.photos.fingerprint(product_id)
+    if fingerprint is None:
+        return jsonify({'success': False, 'message': f'Product {product_id} has no photo'}), 404
+    try:
+        max_distance = int(request.args.get('distance', photo_match_distance()))
+    except ValueError:
+        max_distance = -1
+    if not 0 <= max_distance <= HASH_BITS:
+        return jsonify({'success': False, 'message': f'distance must be an integer from 0 to {HASH_BITS}'}), 400
     
-    def get_farmer_count(self):
-        return len(self.farmers)
+    return jsonify({
+        'product_id': product_id,
+        'phash': f"{fingerprint:016x}",
+        'max_distance': max_distance,
+        'matches': similar_photos(fingerprint, max_distance, exclude=product_id)
+    })
+
+@bp.route('/api/holders/<holder>/products')
+def api_holder_products(holder):
+    try:
+        limit, offset = page_args()
+        stage = parse_stage(request.args['stage']) if request.args.get('stage') else None
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     
-    def get_product_count(self):
-        return len(self.products)
+    total, product_ids = db.custody.held_by(holder, stage, limit, offset)
+    return jsonify({
+        'holder': holder,
+        'stage': STAGES[stage] if stage is not None else None,
+        'total': total,
+        'products': custody_products(product_ids)
+    })
+
+@bp.route('/api/holders/<holder>/history')
+def api_holder_history(holder):
+    try:
+        limit, offset = page_args()
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     
-    def get_all_farmers(self):
-        return self.farmers
+    return jsonify({
+        'holder': holder,
+        'history': [event.to_dict() for event in db.custody.holder_history(holder, limit, offset)]
+    })
+
+@bp.route('/api/stages/<stage>/products')
+def api_stage_products(stage):
+    try:
+        limit, offset = page_args()
+        stage = parse_stage(stage)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     
-    def get_all_products(self):
-        return self.products
+    total, product_ids = db.custody.at_stage(stage, limit, offset)
+    return jsonify({'stage': STAGES[stage], 'total': total, 'products': custody_products(product_ids)})
+
+# Merkle anchoring: inclusion proofs and anchored batches
+@bp.route('/api/products/<int:product_id>/proof')
+def api_product_proof(product_id):
+    if db.anchor is None:
+        return jsonify({'success': False, 'message': 'Anchoring is disabled (set AGROLINK_ANCHOR_INTERVAL)'}), 404
+    if db.get_product_by_id(product_id) is None:
+        return jsonify({'success': False, 'message': f'Product {product_id} not found'}), 404
     
-    def get_farmer_by_id(self, farmer_id):
-        for farmer in self.farmers:
-            if farmer['id'] == farmer_id:
-                return farmer
-        return None
+    proof = db.anchor.proof(product_id)
+    if proof is None:
+        # Added by this or another worker but not anchored yet
+        return jsonify({'success': True, 'anchored': False, 'product_id': product_id,
+                        'message': 'Product is waiting for the next anchoring batch'}), 202
     
-    def get_product_by_id(self, product_id):
-        for product in self.products:
-            if product['id'] == product_id:
-                return product
-        return None
+    proof.update(success=True, anchored=True)
+    if request.args.get('onchain') and db.anchor.chain is not None and proof['batch']['chain_batch_id']:
+        batch, index = db.anchor.locate(product_id)
+        proof['onchain_verified'] = db.anchor.chain.verify(
+            batch.chain_batch_id, batch.leaves[index], index, batch.proof(index))
+    return jsonify(proof)
+
+@bp.route('/api/anchors')
+def api_anchors():
+    if db.anchor is None:
+        return jsonify({'success': False, 'message': 'Anchoring is disabled (set AGROLINK_ANCHOR_INTERVAL)'}), 404
+    try:
+        limit, offset = page_args()
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     
-    def get_blockchain_stats(self):
-        return {
-            'blockchain_status': 'Connected',
-            'latest_block': self.blockchain_block,
-            'account_count': 8 + self.get_farmer_count(),
-            'farmer_count': self.get_farmer_count(),
-            'product_count': self.get_product_count()
-        }
-
-# Initialize database
-db = AgroLinkDatabase()
+    return jsonify({
+        'interval': db.anchor.interval,
+        'onchain': db.anchor.chain is not None,
+        'pending': db.anchor.pending_count,
+        'anchored': db.anchor.anchored_count,
+        'batches': [batch.to_dict() for batch in db.anchor.batches(limit, offset)]
+    })
 
-# Homepage route
-@app.route('/')
-def index():
-    stats = db.get_blockchain_stats()
-    return render_template('index.html', 
-                         blockchain_status=stats['blockchain_status'],
-                         latest_block=stats['latest_block'], 
-                         account_count=stats['account_count'])
+# Anchor queued products now instead of waiting for the interval
+@bp.route('/admin/anchor', methods=['POST'])
+def admin_anchor():
+    if not is_admin_request():
+        return jsonify({'success': False, 'message': 'Admin token required'}), 403
+    if db.anchor is None:
+        return jsonify({'success': False, 'message': 'Anchoring is disabled (set AGROLINK_ANCHOR_INTERVAL)'}), 404
+    
+    try:
+        batch = db.anchor_pending()
+    except Exception as e:
+        logger.exception("Anchoring failed")
+        return jsonify({'success': False, 'message': f'Anchoring failed: {e}'}), 502
+    if batch is None:
+        return jsonify({'success': True, 'message': 'No products waiting to be anchored', 'batch': None})
+    return jsonify({'success': True, 'message': f'Anchored {len(batch.leaves)} products', 'batch': batch.to_dict()})
 
-# Farmer registration route
-@app.route('/register', methods=['GET', 'POST'])
-def register():
-    if request.method == 'GET':
-        return render_template('register.html')
+# Last orphaned-file sweep, or run one now
+@bp.route('/admin/janitor', methods=['GET', 'POST'])
+def admin_janitor():
+    if not is_admin_request():
+        return jsonify({'success': False, 'message': 'Admin token required'}), 403
     
-    elif request.method == 'POST':
-        try:
-            farmer_data = {
-                'name': request.form.get('name', '').strip(),
-                'email': request.form.get('email', '').strip(),
-                'phone': request.form.get('phone', '').strip(),
-                'address': request.form.get('address', '').strip(),
-                'farm_size': request.form.get('farm_size', ''),
-                'crops': request.form.get('crops', '').strip()
-            }
-            
-            required_fields = ['name', 'email', 'phone', 'address']
-            for field in required_fields:
-                if not farmer_data[field]:
-                    return jsonify({
-                        'success': False,
-                        'message': f'{field.replace("_", " ").title()} is required'
-                    })
-            
-            registered_farmer = db.add_farmer(farmer_data)
-            
-            return jsonify({
-                'success': True,
-                'message': 'Farmer registered successfully on blockchain!',
-                'farmer_id': registered_farmer['id'],
-                'blockchain_hash': registered_farmer['blockchain_hash'],
-                'registration_date': registered_farmer['registration_date']
-            })
-            
-        except Exception as e:
-            return jsonify({
-                'success': False,
-                'message': f'Registration failed: {str(e)}'
-            })
+    janitor = get_janitor()
+    report = janitor.sweep() if request.method == 'POST' else janitor.last_report
+    return jsonify({
+        'success': True,
+        'report': report.to_dict() if report is not None else None,
+        'total_removed': janitor.total_removed,
+        'total_reclaimed_bytes': janitor.total_reclaimed_bytes,
+        'interval': janitor.interval,
+        'min_age': janitor.min_age
+    })
 
-# Add product route with image processing
-@app.route('/add_product', methods=['GET', 'POST'])  
-def add_product():
-    if request.method == 'GET':
-        stats = db.get_blockchain_stats()
-        return render_template('add_product.html',
-                             farmer_count=stats['farmer_count'],
-                             product_count=stats['product_count'],
-                             blockchain_block=stats['latest_block'])
+# Write the catalog to a columnar snapshot; another instance loads it with AGROLINK_SNAPSHOT
+@bp.route('/admin/snapshot', methods=['POST'])
+def admin_snapshot():
+    if not is_admin_request():
+        return jsonify({'success': False, 'message': 'Admin token required'}), 403
+    format = request.args.get('format') or snapshot.available_formats()[0]
+    if format not in snapshot.available_formats():
+        return jsonify({'success': False, 'message': f'Snapshot format {format} is not available'}), 400
     
-    elif request.method == 'POST':
-        try:
-            product_data = {
-                'product_name': request.form.get('product_name', '').strip(),
-                'category': request.form.get('category', '').strip(),
-                'quantity': request.form.get('quantity', '').strip(),
-                'unit': request.form.get('unit', '').strip(),
-                'harvest_date': request.form.get('harvest_date', '').strip(),
-                'price_per_unit': request.form.get('price_per_unit', '').strip(),
-                'farmer_id': request.form.get('farmer_id', '').strip(),
-                'farm_location': request.form.get('farm_location', '').strip(),
-                'description': request.form.get('description', '').strip()
-            }
-            
-            # Validation
-            required_fields = ['product_name', 'category', 'quantity', 'unit', 'harvest_date', 'farmer_id', 'farm_location']
-            for field in required_fields:
-                if not product_data[field]:
-                    return jsonify({
-                        'success': False,
-                        'message': f'{field.replace("_", " ").title()} is required'
-                    })
-            
-            # Convert and validate farmer_id
-            try:
-                farmer_id = int(product_data['farmer_id'])
-                product_data['farmer_id'] = farmer_id
-            except ValueError:
-                return jsonify({'success': False, 'message': 'Invalid farmer ID'})
-            
-            # Check if farmer exists
-            farmer = db.get_farmer_by_id(farmer_id)
-            if not farmer:
-                return jsonify({
-                    'success': False,
-                    'message': f'Farmer with ID {farmer_id} not found. Please register as a farmer first.'
-                })
-            
-            product_data['farmer_name'] = farmer['name']
-            
-            # Handle image upload and watermarking
-            watermarked_filename = None
-            if 'product_image' in request.files:
-                file = request.files['product_image']
-                if file and file.filename != '' and allowed_file(file.filename):
-                    # Generate unique filename
-                    original_filename = secure_filename(file.filename)
-                    file_extension = original_filename.rsplit('.', 1)[1].lower()
-                    unique_filename = f"{uuid.uuid4().hex}.{file_extension}"
-                    
-                    # Save original image temporarily
-                    temp_path = os.path.join(app.root_path, app.config['UPLOAD_FOLDER'], unique_filename)
-                    file.save(temp_path)
-                    
-                    # Create watermarked version
-                    watermarked_filename = f"watermarked_{unique_filename}"
-                    watermarked_path = os.path.join(app.root_path, app.config['WATERMARKED_FOLDER'], watermarked_filename)
-                    
-                    # Add watermark
-                    if add_watermark(temp_path, farmer['name'], watermarked_path):
-                        product_data['image_filename'] = watermarked_filename
-                        # Remove temporary file
-                        os.remove(temp_path)
-                    else:
-                        return jsonify({'success': False, 'message': 'Failed to process image'})
-                elif file and file.filename != '':
-                    return jsonify({'success': False, 'message': 'Invalid file type. Please upload JPG, JPEG, or PNG files only.'})
-            
-            # Add product to blockchain
-            added_product = db.add_product(product_data)
-            
-            return jsonify({
-                'success': True,
-                'message': 'Product added successfully with watermarked image!',
-                'product_id': added_product['id'],
-                'blockchain_hash': added_product['blockchain_hash'],
-                'block_number': added_product['block_number'],
-                'qr_code': added_product['qr_code'],
-                'product_count': db.get_product_count(),
-                'watermarked_image': watermarked_filename
-            })
-            
-        except Exception as e:
-            print(f"Product addition error: {str(e)}")
-            return jsonify({
-                'success': False,
-                'message': f'Failed to add product: {str(e)}'
-            })
+    folder = os.path.join(current_app.root_path, current_app.config['SNAPSHOT_FOLDER'])
+    os.makedirs(folder, exist_ok=True)
+    name = f"agrolink-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+    path = os.path.join(folder, name if format == 'parquet' else f"{name}.agsnap")
+    start = time.perf_counter()
+    db.export_snapshot(path, format)
+    return jsonify({
+        'success': True,
+        'path': path,
+        'format': format,
+        'farmers': db.get_farmer_count(),
+        'products': db.get_product_count(),
+        'seconds': round(time.perf_counter() - start, 3)
+    })
 
-# View products route with watermarked images
-@app.route('/products')
-def products():
-    products_list = db.get_all_products()
-    stats = db.get_blockchain_stats()
+# Recompute every record and batch hash; progress and the result stream as JSON lines
+@bp.route('/admin/audit', methods=['POST'])
+def admin_audit():
+    if not is_admin_request():
+        return jsonify({'success': False, 'message': 'Admin token required'}), 403
+    try:
+        workers = int(request.args['workers']) if request.args.get('workers') else None
+        chunk_size = int(request.args['chunk_size']) if request.args.get('chunk_size') else None
+    except ValueError:
+        return jsonify({'success': False, 'message': 'workers and chunk_size must be integers'}), 400
     
-    # Generate products HTML with watermarked images
-    products_html = ""
-    for product in products_list:        
-        # Check if product has watermarked image
-        image_html = ""
-        if product.get('image_filename'):
-            image_html = f"""
-            <div style="text-align: center; margin-bottom: 15px;">
-                <img src="/watermarked/{product['image_filename']}" 
-                     style="max-width: 300px; max-height: 200px; border-radius: 8px; 
-                            border: 2px solid rgba(100,217,255,0.3); box-shadow: 0 4px 8px rgba(0,0,0,0.3);"
-                     alt="{product['product_name']} - Watermarked by {product['farmer_name']}">
-                <p style="font-size: 0.8rem; color: rgba(255,255,255,0.6); margin-top: 5px;">
-                    ✅ Watermarked & Verified Image
-                </p>
-            </div>
-            """
-        
-        products_html += f"""
-        <div style="background: rgba(15,15,35,0.25); backdrop-filter: blur(10px); border-radius:16px; 
-                    border:1px solid rgba(255,255,255,0.1); box-shadow:0 8px 32px rgba(0,0,0,0.36);
-                    padding: 25px; margin-bottom: 20px; transition: all 0.3s ease;
-                    border-left: 4px solid #64d9ff;">
-            <div style="border-bottom: 1px solid rgba(255,255,255,0.1); padding-bottom: 15px; margin-bottom: 15px;">
-                <h3 style="color: #64d9ff; margin: 0; font-size: 1.4rem; font-weight: 600;">
-                    🌾 {product['product_name']}
-                </h3>
-            </div>
-            
-            {image_html}
-            
-            <div style="display: grid; grid-template-columns: repeat(auto-fit, minmax(200px, 1fr)); gap: 20px;">
-                <div style="background: rgba(138,43,226,0.1); padding: 15px; border-radius: 8px; text-align: center;">
-                    <div style="color: #8a2be2; font-size: 0.9rem; margin-bottom: 5px; font-weight: 500;">📅 Harvest Date</div>
-                    <div style="color: white; font-size: 1.1rem; font-weight: 600;">{product['harvest_date']}</div>
-                </div>
-                
-                <div style="background: rgba(100,217,255,0.1); padding: 15px; border-radius: 8px; text-align: center;">
-                    <div style="color: #64d9ff; font-size: 0.9rem; margin-bottom: 5px; font-weight: 500;">⚖️ Quantity</div>
-                    <div style="color: white; font-size: 1.1rem; font-weight: 600;">{product['quantity']} {product['unit']}</div>
-                </div>
-            </div>
-            
-            <div style="margin-top: 20px; text-align: center;">
-                <button onclick="viewFullImage('{product.get('image_filename', '')}')" 
-                        style="background: linear-gradient(45deg, rgba(138,43,226,0.8), rgba(100,217,255,0.8)); 
-                               color: white; padding: 10px 20px; border-radius: 8px; border: none; 
-                               font-size: 14px; cursor: pointer; margin: 5px; transition: all 0.3s ease;"
-                        {"" if product.get('image_filename') else "disabled"}>
-                   🖼️ View Watermarked Image
-                </button>
-            </div>
-        </div>
-        """
+    events = audit_database(db._get_current_object(), workers, chunk_size)
     
-    if not products_html:
-        products_html = """
-        <div style="text-align: center; padding: 50px; background: rgba(255,193,7,0.1); 
-                    border: 1px solid rgba(255,193,7,0.3); border-radius: 16px; color: #ffc107;">
-            <h3 style="margin-bottom: 15px;">No Products Added Yet</h3>
-            <p style="margin-bottom: 20px; color: rgba(255,255,255,0.8);">Be the first farmer to add a watermarked product image!</p>
-            <a href="/add_product" style="background: linear-gradient(45deg, rgba(138,43,226,0.8), rgba(100,217,255,0.8));
-               color: white; padding: 12px 24px; border-radius: 8px; text-decoration: none; font-weight: 600;">
-               🚚 Add First Product
-            </a>
-        </div>
-        """
+    def generate():
+        for event in events:
+            if event['event'] == 'result':
+                LEDGER_AUDITS.labels('ok' if event['ok'] else 'mismatch').inc()
+                if not event['ok']:
+                    logger.warning("Ledger audit found a mismatch", extra={'mismatch': event['mismatch']})
+            yield json.dumps(event) + '\n'
     
-    return f"""
-    <!DOCTYPE html>
-    <html lang="en">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>Products - AgroLink</title>
-        <style>
-            body {{
-                background: linear-gradient(-45deg, #0f0c29, #302b63, #24243e, #3a1c71);
-                background-size: 400% 400%;
-                animation: gradientBG 15s ease infinite;
-                font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-                color: white;
-                min-height: 100vh;
-                margin: 0;
-                padding: 20px;
-            }}
-            
-            @keyframes gradientBG {{
-                0% {{ background-position: 0% 50%; }}
-                50% {{ background-position: 100% 50%; }}
-                100% {{ background-position: 0% 50%; }}
-            }}
-            
-            .container {{
-                max-width: 1000px;
-                margin: 0 auto;
-            }}
-            
-            .header {{
-                text-align: center;
-                margin-bottom: 40px;
-                padding: 20px 0;
-            }}
-            
-            .header h1 {{
-                font-size: 3rem;
-                font-weight: bold;
-                margin-bottom: 10px;
-                background: linear-gradient(45deg, #8a2be2, #64d9ff);
-                -webkit-background-clip: text;
-                -webkit-text-fill-color: transparent;
-                background-clip: text;
-            }}
-            
-            .stats {{
-                display: grid;
-                grid-template-columns: repeat(auto-fit, minmax(250px, 1fr));
-                gap: 20px;
-                margin-bottom: 40px;
-            }}
-            
-            .stat-card {{
-                background: rgba(15,15,35,0.25);
-                backdrop-filter: blur(10px);
-                border-radius: 16px;
-                border: 1px solid rgba(138,43,226,0.3);
-                padding: 25px;
-                text-align: center;
-                transition: all 0.3s ease;
-            }}
-            
-            .nav-buttons {{
-                text-align: center;
-                margin-bottom: 40px;
-            }}
-            
-            .nav-btn {{
-                background: linear-gradient(45deg, rgba(138,43,226,0.8), rgba(100,217,255,0.8));
-                border: none;
-                border-radius: 10px;
-                padding: 12px 24px;
-                color: white;
-                text-decoration: none;
-                margin: 0 10px 10px;
-                display: inline-block;
-                transition: all 0.3s ease;
-                font-weight: 600;
-            }}
-            
-            .nav-btn:hover {{
-                background: linear-gradient(45deg, rgba(138,43,226,1), rgba(100,217,255,1));
-                transform: translateY(-2px);
-                color: white;
-                text-decoration: none;
-            }}
-            
-            .modal {{
-                display: none;
-                position: fixed;
-                z-index: 1000;
-                left: 0;
-                top: 0;
-                width: 100%;
-                height: 100%;
-                background-color: rgba(0,0,0,0.8);
-            }}
-            
-            .modal-content {{
-                background: rgba(15,15,35,0.9);
-                margin: 5% auto;
-                padding: 20px;
-                border-radius: 16px;
-                width: 80%;
-                max-width: 600px;
-                text-align: center;
-            }}
-            
-            .close {{
-                color: #aaa;
-                float: right;
-                font-size: 28px;
-                font-weight: bold;
-                cursor: pointer;
-            }}
-            
-            .close:hover {{ color: white; }}
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="header">
-                <h1>🏪 Agricultural Products</h1>
-                <p style="font-size: 1.2rem; color: rgba(255,255,255,0.8);">Watermarked & Verified Product Images</p>
-            </div>
-            
-            <div class="stats">
-                <div class="stat-card">
-                    <h3 style="color: #64d9ff; margin-bottom: 10px;">Total Products</h3>
-                    <p style="font-size: 2.5rem; font-weight: bold; color: white; margin: 0;">{stats['product_count']}</p>
-                </div>
-                <div class="stat-card">
-                    <h3 style="color: #64d9ff; margin-bottom: 10px;">Registered Farmers</h3>
-                    <p style="font-size: 2.5rem; font-weight: bold; color: white; margin: 0;">{stats['farmer_count']}</p>
-                </div>
-                <div class="stat-card">
-                    <h3 style="color: #64d9ff; margin-bottom: 10px;">Blockchain Status</h3>
-                    <p style="font-size: 1.8rem; font-weight: bold; color: #22c55e; margin: 0;">🟢 Connected</p>
-                </div>
-            </div>
-            
-            <div class="nav-buttons">
-                <a href="/" class="nav-btn">🏠 Home Dashboard</a>
-                <a href="/add_product" class="nav-btn">🚚 Add New Product</a>
-                <a href="/register" class="nav-btn">👨‍🌾 Register Farmer</a>
-            </div>
-            
-            <div>
-                {products_html}
-            </div>
-        </div>
-        
-        <!-- Modal for viewing images -->
-        <div id="imageModal" class="modal">
-            <div class="modal-content">
-                <span class="close" onclick="closeModal()">&times;</span>
-                <h3 style="color: #64d9ff; margin-bottom: 20px;">Watermarked Product Image</h3>
-                <img id="modalImage" style="max-width: 100%; max-height: 400px; border-radius: 8px;">
-                <p style="margin-top: 15px; color: rgba(255,255,255,0.8);">
-                    This image is watermarked with farmer information and timestamp for authenticity verification.
-                </p>
-            </div>
-        </div>
-        
-        <script>
-            function viewFullImage(filename) {{
-                if (!filename) return;
-                
-                const modal = document.getElementById('imageModal');
-                const modalImg = document.getElementById('modalImage');
-                
-                modalImg.src = '/watermarked/' + filename;
-                modal.style.display = 'block';
-            }}
-            
-            function closeModal() {{
-                document.getElementById('imageModal').style.display = 'none';
-            }}
-            
-            // Close modal when clicking outside
-            window.onclick = function(event) {{
-                const modal = document.getElementById('imageModal');
-                if (event.target == modal) {{
-                    modal.style.display = 'none';
-                }}
-            }}
-        </script>
-    </body>
-    </html>
-    """
+    return Response(generate(), content_type='application/x-ndjson')
 
-# Serve watermarked images
-@app.route('/watermarked/<filename>')
-def watermarked_file(filename):
-    return send_from_directory(
-        os.path.join(app.root_path, app.config['WATERMARKED_FOLDER']),
-        filename
-    )
+# Prometheus metrics
+@bp.route('/metrics')
+def metrics():
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
 
-# API Routes (same as before)
-@app.route('/api/farmers')
-def api_farmers():
-    return jsonify({
-        'total_farmers': db.get_farmer_count(),
-        'farmers': db.get_all_farmers(),
-        'blockchain_status': 'Connected',
-        'last_updated': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    })
+# Collapsed profiler stacks, ready for flamegraph.pl or speedscope
+@bp.route('/admin/profile', methods=['GET', 'DELETE'])
+def admin_profile():
+    if not is_admin_request():
+        return jsonify({'success': False, 'message': 'Admin token required'}), 403
+    
+    if request.method == 'DELETE':
+        PROFILER.reset()
+        return jsonify({'success': True, 'message': 'Profiler samples cleared'})
+    
+    if request.args.get('format') == 'json':
+        return jsonify({
+            'enabled': PROFILER.enabled,
+            'sample_rate': PROFILER.sample_rate,
+            'interval': PROFILER.interval,
+            'routes': PROFILER.routes()
+        })
+    
+    return Response(PROFILER.collapsed(request.args.get('route')),
+                    content_type='text/plain; charset=utf-8')
 
-@app.route('/api/products')
-def api_products():
-    return jsonify({
-        'total_products': db.get_product_count(),
-        'products': db.get_all_products(),
-        'blockchain_status': 'Connected',
-        'last_updated': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    })
+def create_app(config=None, database=None):
+    """Build the Flask app; the database is created lazily unless one is passed in"""
+    app = Flask(__name__)
+    app.config.update(DEFAULT_CONFIG)
+    app.config.update(config or {})
+    assets = build_assets(app.root_path, os.path.join(app.root_path, app.config['ASSET_FOLDER']))
+    app.extensions['agrolink_assets'] = assets
+    app.template_folder = assets.template_dir
+    app.jinja_env.globals['asset_url'] = assets.url
+    app.register_blueprint(bp)
+    if database is not None:
+        app.extensions['agrolink_db'] = database
+    return app
 
-@app.route('/api/stats')
-def api_stats():
-    return jsonify(db.get_blockchain_stats())
+# WSGI entry point (gunicorn app:app)
+app = create_app()
 
 # Run the app
 if __name__ == '__main__':
@@ -0,0 +1,373 @@
+"""ASGI entry point: asynchronous request intake in front of the Flask app.
+
+    uvicorn asgi:application --workers 4
+    python asgi.py                  # built-in asyncio server if uvicorn is not installed
+
+Request bodies are read on the event loop, so a slow client upload holds a
+buffer rather than a thread. Bodies larger than SPOOL_MAX_BYTES spill to a
+temporary file, with the disk writes awaited in the thread pool.
+
+When a body is complete, the request runs in a bounded thread pool. Even
+the index-backed reads go there: the before_request hooks can replay the
+shared store, build the database or start the janitor, and none of that may
+stall the loop.
+
+Response bodies are streamed: each chunk the app yields is sent as it is
+produced, with at most RESPONSE_QUEUE_CHUNKS waiting for a slow client, so
+NDJSON progress arrives as it happens and large dumps are never held whole.
+"""
+import asyncio
+import io
+import os
+import sys
+import tempfile
+from urllib.parse import unquote
+from concurrent.futures import ThreadPoolExecutor
+
+from app import app as flask_app
+
+SPOOL_MAX_BYTES = 1024 * 1024
+MAX_HEADER_BYTES = 64 * 1024
+READ_CHUNK_BYTES = 64 * 1024
+# Response chunks buffered between the app thread and the connection
+RESPONSE_QUEUE_CHUNKS = 8
+
+
+class RequestTooLarge(Exception):
+    pass
+
+
+class ClientGone(Exception):
+    pass
+
+
+class ResponseStream:
+    """Carries a response from the app thread to the event loop, a few chunks at a time"""
+    END = object()
+
+    def __init__(self, loop, max_chunks=RESPONSE_QUEUE_CHUNKS):
+        self.loop = loop
+        self.queue = asyncio.Queue(max_chunks)
+        self.closed = False
+
+    def put(self, item):
+        """Called from the app thread; blocks while the queue is full"""
+        if self.closed:
+            raise ClientGone()
+        asyncio.run_coroutine_threadsafe(self.queue.put(item), self.loop).result()
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        # Unblock a producer waiting on a full queue; its next put raises ClientGone
+        self.closed = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+
+
+def _spill(data):
+    spool = tempfile.TemporaryFile()
+    spool.write(data)
+    return spool
+
+
+def build_environ(scope, body):
+    path = scope['path'].encode('utf-8').decode('latin-1')
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': path,
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            environ[name] = value
+        else:
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def call_wsgi(environ, emit):
+    """Run the Flask app, passing ``emit`` (status, headers) and then each body chunk"""
+    started = []
+    sent = []
+
+    def write(chunk):
+        if not sent:
+            sent.append(True)
+            emit((int(started[0].split(' ', 1)[0]), started[1]))
+        if chunk:
+            emit(chunk)
+
+    def start_response(status, headers, exc_info=None):
+        started[:] = [status, headers]
+        return write
+
+    result = flask_app(environ, start_response)
+    try:
+        for chunk in result:
+            if chunk:
+                write(chunk)
+        if not sent:
+            write(b'')
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+
+
+def stream_wsgi(environ, stream):
+    try:
+        call_wsgi(environ, stream.put)
+    except ClientGone:
+        pass
+    finally:
+        try:
+            stream.put(ResponseStream.END)
+        except ClientGone:
+            pass
+
+
+class AsgiApplication:
+    def __init__(self, threads=None):
+        self.threads = threads or int(os.environ.get('AGROLINK_ASGI_THREADS', 16))
+        self.executor = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+
+    def _executor(self):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='agrolink')
+        return self.executor
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.executor is not None:
+                    self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _read_body(self, receive, limit):
+        loop = asyncio.get_running_loop()
+        buffer = bytearray()
+        spool = None
+        size = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if limit is not None and size > limit:
+                raise RequestTooLarge()
+            if spool is not None:
+                await loop.run_in_executor(self._executor(), spool.write, chunk)
+            else:
+                buffer += chunk
+                if len(buffer) > SPOOL_MAX_BYTES:
+                    spool = await loop.run_in_executor(self._executor(), _spill, bytes(buffer))
+                    buffer = None
+            if not message.get('more_body', False):
+                break
+        if spool is None:
+            return io.BytesIO(buffer)
+        spool.seek(0)
+        return spool
+
+    async def _http(self, scope, receive, send):
+        try:
+            body = await self._read_body(receive, flask_app.config.get('MAX_CONTENT_LENGTH'))
+        except RequestTooLarge:
+            await _send_response(send, 413, [('Content-Type', 'application/json')],
+                                 b'{"success": false, "message": "Request body too large"}')
+            return
+        if body is None:
+            return  # client went away mid-upload
+
+        environ = build_environ(scope, body)
+        loop = asyncio.get_running_loop()
+        stream = ResponseStream(loop)
+        done = loop.run_in_executor(self._executor(), stream_wsgi, environ, stream)
+        done.add_done_callback(lambda _: body.close())
+        try:
+            item = await stream.get()
+            if item is not ResponseStream.END:
+                status, headers = item
+                await send(_response_start(status, headers))
+                while True:
+                    item = await stream.get()
+                    if item is ResponseStream.END:
+                        break
+                    await send({'type': 'http.response.body', 'body': item, 'more_body': True})
+                await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            stream.close()
+        # Re-raise anything the app raised
+        await done
+
+
+def _response_start(status, headers):
+    return {
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+    }
+
+
+async def _send_response(send, status, headers, body):
+    await send(_response_start(status, headers))
+    await send({'type': 'http.response.body', 'body': body})
+
+
+application = AsgiApplication()
+
+
+# Minimal HTTP/1.1 server for running the ASGI app without uvicorn
+async def _handle_connection(reader, writer, asgi_app, server_address):
+    try:
+        while True:
+            try:
+                head = await reader.readuntil(b'\r\n\r\n')
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                return
+            request_line, *header_lines = head[:-4].decode('latin-1').split('\r\n')
+            try:
+                method, target, version = request_line.split(' ', 2)
+            except ValueError:
+                return
+            headers = []
+            for line in header_lines:
+                name, _, value = line.partition(':')
+                headers.append((name.strip().lower().encode('latin-1'), value.strip().encode('latin-1')))
+            header_map = dict(headers)
+            if b'chunked' in header_map.get(b'transfer-encoding', b'').lower():
+                writer.write(b'HTTP/1.1 411 Length Required\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+                await writer.drain()
+                return
+            remaining = int(header_map.get(b'content-length', b'0') or 0)
+            keep_alive = (version == 'HTTP/1.1' and header_map.get(b'connection', b'').lower() != b'close')
+            path, _, query = target.partition('?')
+            scope = {
+                'type': 'http',
+                'asgi': {'version': '3.0'},
+                'http_version': version.split('/', 1)[1],
+                'method': method,
+                'scheme': 'http',
+                'path': unquote(path),
+                'raw_path': path.encode('latin-1'),
+                'query_string': query.encode('latin-1'),
+                'root_path': '',
+                'headers': headers,
+                'client': writer.get_extra_info('peername'),
+                'server': server_address,
+            }
+
+            async def receive():
+                nonlocal remaining
+                if remaining <= 0:
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                chunk = await reader.read(min(remaining, READ_CHUNK_BYTES))
+                if not chunk:
+                    return {'type': 'http.disconnect'}
+                remaining -= len(chunk)
+                return {'type': 'http.request', 'body': chunk, 'more_body': remaining > 0}
+
+            response = {}
+
+            async def send(message):
+                nonlocal keep_alive
+                if message['type'] == 'http.response.start':
+                    status = response['status'] = message['status']
+                    response_headers = message.get('headers', [])
+                    length = dict(response_headers).get(b'content-length')
+                    # Without a length, stream chunked (HTTP/1.1) or delimit the body by closing
+                    response['chunked'] = length is None and method != 'HEAD' and version == 'HTTP/1.1'
+                    if length is None and method != 'HEAD' and not response['chunked']:
+                        keep_alive = False
+                    lines = [f"HTTP/1.1 {status} {_reason(status)}"]
+                    for name, value in response_headers:
+                        if name not in (b'content-length', b'connection', b'transfer-encoding'):
+                            lines.append(f"{name.decode('latin-1')}: {value.decode('latin-1')}")
+                    if response['chunked']:
+                        lines.append('Transfer-Encoding: chunked')
+                    elif length is not None or method == 'HEAD':
+                        # HEAD reports the length a GET would have
+                        lines.append(f"Content-Length: {(length or b'0').decode('latin-1')}")
+                    lines.append('Connection: keep-alive' if keep_alive else 'Connection: close')
+                    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+                elif message['type'] == 'http.response.body':
+                    body = message.get('body', b'')
+                    if body and method != 'HEAD':
+                        writer.write(b'%x\r\n%s\r\n' % (len(body), body) if response['chunked'] else body)
+                    if response['chunked'] and not message.get('more_body', False):
+                        writer.write(b'0\r\n\r\n')
+                    await writer.drain()
+
+            try:
+                await asgi_app(scope, receive, send)
+            except ConnectionError:
+                return  # client went away mid-response
+            if 'status' not in response:
+                return
+            # Drain whatever the app did not read so the next request starts cleanly
+            while remaining > 0:
+                chunk = await reader.read(min(remaining, READ_CHUNK_BYTES))
+                if not chunk:
+                    return
+                remaining -= len(chunk)
+            if not keep_alive:
+                return
+    finally:
+        writer.close()
+
+
+def _reason(status):
+    from http import HTTPStatus
+    try:
+        return HTTPStatus(status).phrase
+    except ValueError:
+        return ''
+
+
+async def serve(host='0.0.0.0', port=8000, asgi_app=application, ready=None):
+    server = await asyncio.start_server(
+        lambda reader, writer: _handle_connection(reader, writer, asgi_app, (host, port)),
+        host, port, limit=MAX_HEADER_BYTES, backlog=2048)
+    if ready is not None:
+        ready(server.sockets[0].getsockname()[1])
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    port = int(os.environ.get('PORT', 8000))
+    try:
+        import uvicorn
+    except ImportError:
+        print(f"🚀 AgroLink async server on http://0.0.0.0:{port} (install uvicorn for production)")
+        asyncio.run(serve(port=port))
+    else:
+        uvicorn.run('asgi:application', host='0.0.0.0', port=port)
@@ -0,0 +1,245 @@
+"""Fingerprinted, precompressed static assets and per-request compression.
+
+At startup ``build_assets`` reads the HTML pages and moves their inline
+<style> and <script> blocks into CSS/JS files. Each file is named by its
+content hash (``/assets/register.3f2a9c1e.js``). The rewritten pages become
+the app's Jinja templates. Hand-written files under ``assets/`` are
+fingerprinted the same way.
+
+Every asset, and every page without template markup, is compressed once at
+maximum level: gzip always, brotli when the optional ``brotli`` package is
+installed. Serving one is then a dictionary lookup. Assets are immutable and
+cached for a year. Pages keep their URLs, so they are revalidated by ETag.
+Build outputs go to ``static/build`` and are reused across restarts until a
+source file changes.
+
+Other responses go through ``compress_response``. JSON, HTML and text bodies
+of at least AGROLINK_COMPRESS_MIN_BYTES are compressed per request at a fast
+level.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+PAGES = ('index.html', 'register.html', 'add_product.html', 'products.html', '404.html')
+ASSET_SOURCE_DIR = 'assets'
+MANIFEST_VERSION = 1
+
+CONTENT_TYPES = {
+    '.css': 'text/css; charset=utf-8',
+    '.js': 'application/javascript; charset=utf-8',
+    '.html': 'text/html; charset=utf-8',
+}
+COMPRESSIBLE_TYPES = {'text/html', 'text/plain', 'text/css', 'text/csv', 'application/json',
+                      'application/javascript', 'image/svg+xml'}
+DEFAULT_MIN_BYTES = 1024
+# Per-request levels trade ratio for latency; build-time levels are the maximum
+DYNAMIC_GZIP_LEVEL = 6
+DYNAMIC_BROTLI_QUALITY = 4
+
+# Inline blocks only: no attributes (so no src=) and no Jinja markup inside
+INLINE_BLOCK = re.compile(r'<(style|script)>(.*?)</\1>', re.DOTALL)
+
+
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def compress(body, encoding, fast=False):
+    if encoding == 'br':
+        return brotli.compress(body, quality=DYNAMIC_BROTLI_QUALITY if fast else 11)
+    return gzip.compress(body, compresslevel=DYNAMIC_GZIP_LEVEL if fast else 9, mtime=0)
+
+
+def negotiate_encoding(request, encodings):
+    """Best of ``encodings`` the client accepts, or None for identity"""
+    return request.accept_encodings.best_match(encodings) if encodings else None
+
+
+class Asset:
+    __slots__ = ('name', 'content_type', 'bodies', 'etag')
+
+    def __init__(self, name, content_type, body, bodies=None):
+        self.name = name
+        self.content_type = content_type
+        self.bodies = bodies if bodies is not None else {
+            encoding: compress(body, encoding) for encoding in available_encodings()}
+        self.bodies[None] = body
+        self.etag = hashlib.sha256(body).hexdigest()[:16]
+
+    def response(self, request, response_class, cache_control):
+        encodings = [encoding for encoding in self.bodies if encoding is not None]
+        encoding = negotiate_encoding(request, encodings)
+        response = response_class(self.bodies[encoding], content_type=self.content_type)
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = cache_control
+        # One ETag per encoding, so caches never mix the representations up
+        response.set_etag(f"{self.etag}-{encoding}" if encoding else self.etag)
+        return response.make_conditional(request)
+
+
+class AssetBundle:
+    def __init__(self, template_dir):
+        self.template_dir = template_dir
+        self.assets = {}   # fingerprinted name -> Asset
+        self.pages = {}    # page name -> Asset, for pages without template markup
+        self.urls = {}     # source name -> /assets/ url
+
+    def url(self, source_name):
+        return self.urls[source_name]
+
+
+def _fingerprinted(stem, extension, body):
+    return f"{stem}.{hashlib.sha256(body).hexdigest()[:8]}{extension}"
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def _sources(root):
+    sources = [os.path.join(root, page) for page in PAGES]
+    source_dir = os.path.join(root, ASSET_SOURCE_DIR)
+    if os.path.isdir(source_dir):
+        sources += sorted(entry.path for entry in os.scandir(source_dir)
+                          if entry.is_file() and os.path.splitext(entry.name)[1] in CONTENT_TYPES)
+    return [path for path in sources if os.path.isfile(path)]
+
+
+def _source_hashes(root, sources):
+    hashes = {}
+    for path in sources:
+        with open(path, 'rb') as f:
+            hashes[os.path.relpath(path, root)] = hashlib.sha256(f.read()).hexdigest()
+    return hashes
+
+
+def _extract_blocks(page, html):
+    """Move inline CSS/JS into separate files; returns (rewritten html, {name: body})"""
+    stem = page.rsplit('.', 1)[0]
+    extracted = {}
+    counters = {'style': 0, 'script': 0}
+
+    def replace(match):
+        tag, content = match.group(1), match.group(2)
+        if '{{' in content or '{%' in content or not content.strip():
+            return match.group(0)
+        counters[tag] += 1
+        suffix = f"-{counters[tag]}" if counters[tag] > 1 else ''
+        extension = '.css' if tag == 'style' else '.js'
+        body = content.strip().encode('utf-8') + b'\n'
+        name = _fingerprinted(f"{stem}{suffix}", extension, body)
+        extracted[name] = body
+        if tag == 'style':
+            return f'<link rel="stylesheet" href="/assets/{name}">'
+        return f'<script src="/assets/{name}"></script>'
+
+    return INLINE_BLOCK.sub(replace, html), extracted
+
+
+def _load(output_dir, manifest):
+    bundle = AssetBundle(os.path.join(output_dir, 'templates'))
+    bundle.urls = manifest['urls']
+    asset_dir = os.path.join(output_dir, 'assets')
+    for name in manifest['assets']:
+        bodies = {}
+        for encoding in manifest['encodings']:
+            with open(os.path.join(asset_dir, f"{name}.{encoding}"), 'rb') as f:
+                bodies[encoding] = f.read()
+        with open(os.path.join(asset_dir, name), 'rb') as f:
+            body = f.read()
+        asset = Asset(name, CONTENT_TYPES[os.path.splitext(name)[1]], body, bodies)
+        if name in manifest['pages']:
+            bundle.pages[name] = asset
+        else:
+            bundle.assets[name] = asset
+    return bundle
+
+
+def build_assets(root, output_dir):
+    """Extract, fingerprint and compress the pages and assets under ``root`` into ``output_dir``"""
+    sources = _sources(root)
+    hashes = _source_hashes(root, sources)
+    encodings = list(available_encodings())
+    manifest_path = os.path.join(output_dir, 'manifest.json')
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if (manifest['version'], manifest['sources'], manifest['encodings']) == (MANIFEST_VERSION, hashes, encodings):
+            return _load(output_dir, manifest)
+    except (OSError, ValueError, KeyError):
+        pass
+
+    bundle = AssetBundle(os.path.join(output_dir, 'templates'))
+    bodies = {}
+    for path in sources:
+        relative = os.path.relpath(path, root)
+        with open(path, 'rb') as f:
+            content = f.read()
+        if relative in PAGES:
+            html, extracted = _extract_blocks(relative, content.decode('utf-8'))
+            bodies.update(extracted)
+            html = html.encode('utf-8')
+            _write(os.path.join(bundle.template_dir, relative), html)
+            if b'{{' not in html and b'{%' not in html:
+                bundle.pages[relative] = Asset(relative, CONTENT_TYPES['.html'], html)
+        else:
+            stem, extension = os.path.splitext(os.path.basename(path))
+            name = _fingerprinted(stem, extension, content)
+            bundle.urls[os.path.basename(path)] = f"/assets/{name}"
+            bodies[name] = content
+    for name, body in bodies.items():
+        bundle.assets[name] = Asset(name, CONTENT_TYPES[os.path.splitext(name)[1]], body)
+
+    asset_dir = os.path.join(output_dir, 'assets')
+    for asset in list(bundle.assets.values()) + list(bundle.pages.values()):
+        for encoding, body in asset.bodies.items():
+            _write(os.path.join(asset_dir, f"{asset.name}.{encoding}" if encoding else asset.name), body)
+    # The manifest goes last, so a partial build is never reused
+    _write(manifest_path, json.dumps({
+        'version': MANIFEST_VERSION,
+        'sources': hashes,
+        'encodings': encodings,
+        'urls': bundle.urls,
+        'assets': sorted(list(bundle.assets) + list(bundle.pages)),
+        'pages': sorted(bundle.pages),
+    }, indent=1).encode('utf-8'))
+    return bundle
+
+
+def compress_response(request, response, min_bytes=DEFAULT_MIN_BYTES):
+    """Compress a dynamic response body in place when the client and content type allow it"""
+    if (response.direct_passthrough or response.is_streamed or response.status_code < 200
+            or response.status_code in (204, 206, 304) or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    if len(body) < min_bytes:
+        return response
+    encoding = negotiate_encoding(request, available_encodings())
+    if encoding is None:
+        return response
+    compressed = compress(body, encoding, fast=True)
+    if len(compressed) >= len(body):
+        return response
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    # Same content, different bytes: the ETag becomes weak so If-None-Match still matches
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
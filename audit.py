@@ -0,0 +1,190 @@
+"""Parallel integrity audit of the product ledger.
+
+The audit checks the following:
+
+- every product's stored ``blockchain_hash`` matches a hash recomputed from
+  its name, farmer and insertion time (in UTC, so the result does not depend
+  on the auditing host's time zone);
+- block numbers strictly increase in ledger order;
+- every anchored batch's leaves still match the products they commit to;
+- every batch's Merkle root is rebuilt from those leaves.
+
+Records are sent to a process pool as plain tuples, AGROLINK_AUDIT_CHUNK at
+a time, on AGROLINK_AUDIT_WORKERS processes (default: every core). Only a
+few chunks are in flight at once, so memory stays flat however large the
+store is, and throughput grows with the number of cores. Results are
+consumed in ledger order. Progress is reported as each chunk finishes, and
+the audit stops at the first mismatch.
+
+Run it against a shared-state file or a snapshot:
+
+    AGROLINK_SHARED_STATE=agrolink.db python audit.py --workers 8
+    AGROLINK_SNAPSHOT=catalog.agsnap python audit.py
+
+or against a running app with POST /admin/audit.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from anchoring import hash_leaf_content, leaf_content, merkle_root
+from records import product_hash
+
+DEFAULT_CHUNK = 20000
+# Chunks queued per worker, enough to keep every process busy
+CHUNKS_PER_WORKER = 2
+
+
+def _check_products(rows, previous_block):
+    # Top-level so it can be pickled into pool workers
+    for product_id, product_name, farmer_id, added_at, digest, block_number in rows:
+        computed = product_hash(product_name, farmer_id, added_at)
+        if computed != digest:
+            return {'kind': 'product_hash', 'product_id': product_id,
+                    'stored': f"0x{digest.hex()}", 'computed': f"0x{computed.hex()}"}
+        if previous_block is not None and block_number <= previous_block:
+            return {'kind': 'block_order', 'product_id': product_id,
+                    'block_number': block_number, 'previous_block': previous_block}
+        previous_block = block_number
+    return None
+
+
+def _check_batches(batches):
+    for batch_id, root, product_ids, leaves, contents in batches:
+        for product_id, leaf, content in zip(product_ids, leaves, contents):
+            if content is None:
+                return {'kind': 'anchored_product_missing', 'batch_id': batch_id, 'product_id': product_id}
+            computed = hash_leaf_content(content)
+            if computed != leaf:
+                return {'kind': 'anchor_leaf', 'batch_id': batch_id, 'product_id': product_id,
+                        'stored': f"0x{leaf.hex()}", 'computed': f"0x{computed.hex()}"}
+        computed = merkle_root(leaves)
+        if computed != root:
+            return {'kind': 'anchor_root', 'batch_id': batch_id,
+                    'stored': f"0x{root.hex()}", 'computed': f"0x{computed.hex()}"}
+    return None
+
+
+def _run_task(task):
+    function, args = task
+    return function(*args)
+
+
+def _tasks(products, batches, lookup, chunk_size):
+    """(size, (function, args)) per chunk, built lazily so only queued chunks are held in memory"""
+    previous_block = None
+    for start in range(0, len(products), chunk_size):
+        chunk = products[start:start + chunk_size]
+        rows = [(p.id, p.product_name, p.farmer_id, p.added_at, p.hash_digest, p.block_number) for p in chunk]
+        yield len(rows), (_check_products, (rows, previous_block))
+        previous_block = chunk[-1].block_number
+
+    group, size = [], 0
+    for batch in batches:
+        contents = []
+        for product_id in batch.product_ids:
+            product = lookup(product_id)
+            contents.append(leaf_content(product) if product is not None else None)
+        group.append((batch.id, batch.root, batch.product_ids, batch.leaves, contents))
+        size += len(batch.leaves)
+        if size >= chunk_size:
+            yield size, (_check_batches, (group,))
+            group, size = [], 0
+    if group:
+        yield size, (_check_batches, (group,))
+
+
+def run_audit(products, batches=(), lookup=None, workers=None, chunk_size=DEFAULT_CHUNK):
+    """Yield progress events while auditing, then a final result event"""
+    workers = workers or os.cpu_count() or 1
+    total = len(products) + sum(len(batch.leaves) for batch in batches)
+    start = time.perf_counter()
+    checked = 0
+    mismatch = None
+    tasks = _tasks(products, batches, lookup, chunk_size)
+
+    def progress():
+        return {'event': 'progress', 'checked': checked, 'total': total,
+                'seconds': round(time.perf_counter() - start, 3)}
+
+    if workers == 1 or total <= chunk_size:
+        for size, task in tasks:
+            mismatch = _run_task(task)
+            checked += size
+            yield progress()
+            if mismatch is not None:
+                break
+    else:
+        # The endpoint runs this on a server thread, which must not be forked
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            pending = []  # (size, future) in ledger order
+            try:
+                while True:
+                    while len(pending) < workers * CHUNKS_PER_WORKER:
+                        size, task = next(tasks, (None, None))
+                        if task is None:
+                            break
+                        pending.append((size, pool.submit(_run_task, task)))
+                    if not pending:
+                        break
+                    size, future = pending.pop(0)
+                    mismatch = future.result()
+                    checked += size
+                    yield progress()
+                    if mismatch is not None:
+                        break
+            finally:
+                for _, future in pending:
+                    future.cancel()
+
+    seconds = time.perf_counter() - start
+    yield {
+        'event': 'result',
+        'ok': mismatch is None,
+        'checked': checked,
+        'total': total,
+        'mismatch': mismatch,
+        'workers': workers,
+        'seconds': round(seconds, 3),
+        'records_per_second': round(checked / seconds) if seconds > 0 else None,
+    }
+
+
+def audit_database(database, workers=None, chunk_size=None):
+    """Audit every product and anchored batch of an AgroLinkDatabase"""
+    products = list(database.products)
+    # Oldest first, so the first mismatch reported is the earliest in the ledger
+    batches = database.anchor.batches()[::-1] if database.anchor is not None else []
+    if workers is None:
+        workers = int(os.environ.get('AGROLINK_AUDIT_WORKERS', 0)) or None
+    if chunk_size is None:
+        chunk_size = int(os.environ.get('AGROLINK_AUDIT_CHUNK', DEFAULT_CHUNK))
+    return run_audit(products, batches, database.products_by_id.get, workers, chunk_size)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=None)
+    parser.add_argument('--quiet', action='store_true', help='print only the result')
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('AGROLINK_LOG_LEVEL', 'WARNING')
+    from app import AgroLinkDatabase
+    database = AgroLinkDatabase()
+    for event in audit_database(database, args.workers, args.chunk_size):
+        if event['event'] == 'result':
+            print(json.dumps(event, indent=2))
+        elif not args.quiet:
+            print(f"checked {event['checked']}/{event['total']} in {event['seconds']}s", file=sys.stderr)
+    return 0 if event['ok'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1 @@
+"""Benchmarks for the AgroLink app; run modules with ``python -m benchmarks.<name>``."""
@@ -0,0 +1,160 @@
+"""Concurrent-connection capacity: threaded WSGI servers vs the ASGI mode.
+
+Starts the app in a child process under one of three servers:
+
+- threaded: werkzeug, one thread per connection
+- pooled: werkzeug with a fixed pool of threads, like gunicorn gthread
+- async: asgi.py on its built-in asyncio server
+
+For each count of slow clients, the benchmark opens that many /add_product
+uploads that send their headers and a first slice of the body, then stall.
+While they are held open it times /api/stats requests from a separate client.
+It records their latency and timeouts and the server's thread count and RSS.
+
+    python -m benchmarks.bench_async --slow-clients 50,200,1000 --output async.json
+"""
+import argparse
+import http.client
+import os
+import resource
+import socket
+import subprocess
+import sys
+import time
+
+from benchmarks.common import ROOT, Timer, print_table, save_results, summarize
+
+KEY_FIELDS = ('server', 'slow_clients')
+
+SERVERS = {
+    'threaded': """
+from werkzeug.serving import make_server
+import app
+server = make_server('127.0.0.1', 0, app.app, threaded=True)
+print(server.server_port, flush=True)
+server.serve_forever()
+""",
+    'pooled': """
+from concurrent.futures import ThreadPoolExecutor
+from socketserver import ThreadingMixIn
+from werkzeug.serving import BaseWSGIServer
+import app
+
+class PooledServer(ThreadingMixIn, BaseWSGIServer):
+    pool = ThreadPoolExecutor(max_workers={threads})
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+server = PooledServer('127.0.0.1', 0, app.app)
+print(server.server_port, flush=True)
+server.serve_forever()
+""",
+    'async': """
+import asyncio, os
+os.environ['AGROLINK_ASGI_THREADS'] = '{threads}'
+import asgi
+asyncio.run(asgi.serve('127.0.0.1', 0, asgi.AsgiApplication(), ready=lambda port: print(port, flush=True)))
+""",
+}
+
+
+def raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def start_server(name, threads):
+    env = dict(os.environ, AGROLINK_LOG_LEVEL='WARNING')
+    code = "import resource\nsoft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)\n" \
+           "resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))\n" + SERVERS[name].format(threads=threads)
+    process = subprocess.Popen([sys.executable, '-c', code], cwd=ROOT, env=env,
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    port = int(process.stdout.readline())
+    return process, port
+
+
+def server_usage(pid):
+    usage = {}
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('Threads:'):
+                usage['threads'] = int(line.split()[1])
+            elif line.startswith('VmRSS:'):
+                usage['rss_mb'] = round(int(line.split()[1]) / 1024, 1)
+    return usage
+
+
+def open_slow_upload(port, declared_bytes, sent_bytes):
+    sock = socket.create_connection(('127.0.0.1', port), timeout=10)
+    head = (f"POST /add_product HTTP/1.1\r\nHost: 127.0.0.1\r\n"
+            f"Content-Type: multipart/form-data; boundary=slowclient\r\n"
+            f"Content-Length: {declared_bytes}\r\n\r\n")
+    sock.sendall(head.encode() + b'x' * sent_bytes)
+    return sock
+
+
+def timed_requests(port, count, timeout, max_timeouts=3):
+    """Time ``count`` GETs, giving up after ``max_timeouts`` consecutive failures (a starved server)"""
+    latencies, errors, consecutive = [], 0, 0
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    with Timer() as wall:
+        for _ in range(count):
+            start = time.perf_counter()
+            try:
+                connection.request('GET', '/api/stats')
+                response = connection.getresponse()
+                response.read()
+                errors += response.status != 200
+                consecutive = 0
+            except (OSError, http.client.HTTPException):
+                errors += 1
+                consecutive += 1
+                connection.close()
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+            latencies.append(time.perf_counter() - start)
+            if consecutive >= max_timeouts:
+                break
+    connection.close()
+    return summarize(latencies, wall.elapsed, errors)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--servers', default='threaded,pooled,async')
+    parser.add_argument('--slow-clients', default='0,50,200,1000')
+    parser.add_argument('--threads', type=int, default=16, help='pool size for pooled and async')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--timeout', type=float, default=5.0)
+    parser.add_argument('--output', default='bench_async.json')
+    args = parser.parse_args(argv)
+    raise_fd_limit()
+
+    results = []
+    for name in args.servers.split(','):
+        process, port = start_server(name, args.threads)
+        try:
+            timed_requests(port, 20, args.timeout)  # warm up
+            for count in (int(v) for v in args.slow_clients.split(',')):
+                sockets = []
+                try:
+                    for _ in range(count):
+                        sockets.append(open_slow_upload(port, 2 * 1024 * 1024, 16 * 1024))
+                    time.sleep(0.5)  # let the server accept and start reading every upload
+                    usage = server_usage(process.pid)
+                    summary = timed_requests(port, args.requests, args.timeout)
+                finally:
+                    for sock in sockets:
+                        sock.close()
+                results.append(dict(server=name, slow_clients=count, **usage, **summary))
+                print_table(results[-1:], KEY_FIELDS, header=len(results) == 1)
+                print(f"{'':<33} server threads {usage['threads']}, RSS {usage['rss_mb']} MB")
+                time.sleep(0.5)
+        finally:
+            process.terminate()
+            process.wait()
+
+    save_results(args.output, 'async', vars(args), results)
+
+
+if __name__ == '__main__':
+    main()
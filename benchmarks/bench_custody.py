@@ -0,0 +1,95 @@
+"""Custody-chain query latency with deep per-product histories.
+
+Builds a ledger of products that each move up the stage sequence
+with several same-stage hand-offs between distributors, so histories run to
+tens of events. Then it times the provenance queries the API serves: full
+product history, current holdings (with and without a stage filter), products
+at a stage and a holder's recent activity. Also times transfer throughput.
+
+    python -m benchmarks.bench_custody --products 20000 --hops 40 --output custody.json
+"""
+import argparse
+import random
+import time
+
+from benchmarks.common import Timer, save_results, summarize
+
+from custody import STAGES, CustodyEvent, CustodyLedger, farmer_holder
+
+
+def build_ledger(products, hops, farmers, distributors, rng):
+    ledger = CustodyLedger()
+    block = 0
+    for product_id in range(1, products + 1):
+        holder = farmer_holder(rng.randrange(1, farmers + 1))
+        block += 1
+        ledger.add(CustodyEvent(product_id, None, holder, 0, 10.0, time.time(), block))
+        stage = 0
+        for hop in range(hops):
+            # Advance the stage every few hops, otherwise pass between distributors
+            if stage < len(STAGES) - 1 and rng.random() < 0.1:
+                stage += 1
+            receiver = f"distributor:{rng.randrange(distributors)}"
+            ledger.validate(product_id, holder, receiver, stage)
+            block += 1
+            ledger.add(CustodyEvent(product_id, holder, receiver, stage, 10.0 + hop, time.time(), block))
+            holder = receiver
+    return ledger
+
+
+def time_queries(name, queries, run):
+    latencies = []
+    results = 0
+    with Timer() as wall:
+        for query in queries:
+            start = time.perf_counter()
+            results += len(run(query))
+            latencies.append(time.perf_counter() - start)
+    return dict(query=name, results_per_query=round(results / len(queries), 1), **summarize(latencies, wall.elapsed))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--hops', type=int, default=30, help='transfers per product')
+    parser.add_argument('--farmers', type=int, default=500)
+    parser.add_argument('--distributors', type=int, default=200)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--limit', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', default='bench_custody.json')
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    with Timer() as building:
+        ledger = build_ledger(args.products, args.hops, args.farmers, args.distributors, rng)
+    build_rate = ledger.event_count / building.elapsed
+    print(f"Indexed {ledger.event_count} events in {building.elapsed:.1f}s ({build_rate:,.0f} transfers/s)")
+
+    product_ids = [rng.randrange(1, args.products + 1) for _ in range(args.queries)]
+    holders = [f"distributor:{rng.randrange(args.distributors)}" for _ in range(args.queries)]
+    stages = [rng.randrange(len(STAGES)) for _ in range(args.queries)]
+    limit = args.limit
+
+    results = [
+        time_queries('product_history', product_ids, ledger.history),
+        time_queries('held_by', holders, lambda holder: ledger.held_by(holder, None, limit)[1]),
+        time_queries('held_by_stage', list(zip(holders, stages)),
+                     lambda query: ledger.held_by(query[0], query[1], limit)[1]),
+        time_queries('at_stage', stages, lambda stage: ledger.at_stage(stage, limit)[1]),
+        time_queries('at_stage_deep_page', stages,
+                     lambda stage: ledger.at_stage(stage, limit, args.products // 10)[1]),
+        time_queries('holder_history', holders, lambda holder: ledger.holder_history(holder, limit)),
+    ]
+    print(f"{'query':<22} {'results':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for result in results:
+        latency = result['latency_ms']
+        print(f"{result['query']:<22} {result['results_per_query']:>8} "
+              f"{latency['p50']:>9.3f} {latency['p95']:>9.3f} {latency['p99']:>9.3f}")
+
+    save_results(args.output, 'custody', dict(vars(args), events=ledger.event_count,
+                                              transfers_per_second=round(build_rate)), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Radius and bounding-box query latency of the geohash index.
+
+    python -m benchmarks.bench_geo --points 1000000 --output geo.json
+"""
+import argparse
+import random
+import time
+
+from benchmarks.common import Timer, save_results, summarize
+from geo import CITIES, GeoIndex
+
+CATEGORIES = ('Vegetables', 'Fruits', 'Grains', 'Pulses', 'Spices')
+
+QUERIES = {
+    'radius_10km': {'radius_km': 10},
+    'radius_50km': {'radius_km': 50},
+    'radius_50km_category': {'radius_km': 50, 'category': 'Fruits'},
+    'radius_250km': {'radius_km': 250, 'limit': 100},
+    'bbox_1deg': {'bbox': 1.0},
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--points', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=11)
+    parser.add_argument('--output', default='bench_geo.json')
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    centres = list(CITIES.values())
+    index = GeoIndex()
+    with Timer() as build:
+        # Farms cluster around towns, scattered up to ~40 km away
+        for i in range(args.points):
+            lat, lon = rng.choice(centres)
+            index.add(i, lat + rng.uniform(-0.4, 0.4), lon + rng.uniform(-0.4, 0.4), rng.choice(CATEGORIES))
+    print(f"Indexed {args.points} points in {build.elapsed:.1f}s")
+
+    results = []
+    for name, query in QUERIES.items():
+        latencies, found = [], 0
+        for _ in range(args.repeat):
+            lat, lon = rng.choice(centres)
+            start = time.perf_counter()
+            if 'bbox' in query:
+                half = query['bbox'] / 2
+                found += len(index.within_bbox(lat - half, lon - half, lat + half, lon + half, limit=500))
+            else:
+                found += len(index.within_radius(lat, lon, query['radius_km'], category=query.get('category'),
+                                                 limit=query.get('limit', 500)))
+            latencies.append(time.perf_counter() - start)
+        summary = summarize(latencies, sum(latencies))
+        results.append(dict(query=name, average_results=found / args.repeat, **summary))
+        print(f"{name:<22} {found / args.repeat:>9.0f} results  p50 {summary['latency_ms']['p50']:>8.3f} ms  "
+              f"p95 {summary['latency_ms']['p95']:>8.3f} ms")
+
+    save_results(args.output, 'geo', vars(args), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""Bytes-per-record comparison of the legacy dict rows and the slotted records.
+
+Builds the same synthetic catalog twice, once as the free-form dicts that
+``add_product``/``add_farmer`` used to keep and once as ``ProductRecord`` /
+``FarmerRecord`` instances, and measures the retained heap with tracemalloc.
+
+    python -m benchmarks.bench_memory --products 200000 --output memory.json
+"""
+import argparse
+import gc
+import hashlib
+import time
+import tracemalloc
+from datetime import datetime
+
+from benchmarks.common import save_results
+from records import FarmerRecord, ProductRecord
+
+CATEGORIES = ('Vegetables', 'Fruits', 'Grains', 'Pulses', 'Spices', 'Dairy')
+UNITS = ('kg', 'quintal', 'ton', 'dozen', 'litre')
+LOCATIONS = ('Nashik, Maharashtra', 'Pune, Maharashtra', 'Ludhiana, Punjab', 'Guntur, Andhra Pradesh')
+
+
+def fresh(value):
+    # Form parsing yields a new string object per request, even for repeated values
+    return value.encode().decode()
+
+
+def product_form(i, farmers):
+    farmer_id = i % farmers + 1
+    return {
+        'product_name': f'Product {i}',
+        'category': fresh(CATEGORIES[i % len(CATEGORIES)]),
+        'quantity': str(10 + i % 90),
+        'unit': fresh(UNITS[i % len(UNITS)]),
+        'harvest_date': fresh(f'2026-{1 + i % 12:02d}-{1 + i % 28:02d}'),
+        'price_per_unit': str(20 + i % 50),
+        'farmer_id': farmer_id,
+        'farm_location': fresh(LOCATIONS[farmer_id % len(LOCATIONS)]),
+        'description': f'Fresh produce lot {i} from the benchmark farm',
+        'farmer_name': fresh(f'Farmer {farmer_id}'),
+    }
+
+
+def farmer_form(i):
+    return {
+        'name': f'Farmer {i}',
+        'email': f'farmer{i}@example.com',
+        'phone': f'+91 90000 {i:05d}',
+        'address': fresh(LOCATIONS[i % len(LOCATIONS)]),
+        'farm_size': '4.5',
+        'crops': fresh('Rice, Wheat, Tomatoes'),
+    }
+
+
+def legacy_product(data, id, block_number):
+    hash_input = f"{data['product_name']}{data['farmer_id']}{datetime.now().isoformat()}"
+    data['id'] = id
+    data['added_date'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    data['blockchain_hash'] = f"0x{hashlib.sha256(hash_input.encode()).hexdigest()[:16]}"
+    data['block_number'] = block_number
+    data['status'] = 'active'
+    data['qr_code'] = f"QR{id:06d}"
+    return data
+
+
+def legacy_farmer(data, id, block_number):
+    data['id'] = id
+    data['registration_date'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    data['blockchain_hash'] = f"0x{id:08x}ABC123"
+    data['status'] = 'active'
+    data['block_number'] = block_number
+    return data
+
+
+def measure(build, count):
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    rows = build(count)
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    del rows
+    return round(retained / count, 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--farmers', type=int, default=2000)
+    parser.add_argument('--output', default='bench_memory.json')
+    args = parser.parse_args(argv)
+
+    now = time.time()
+    builders = {
+        ('product', 'dict'): (args.products,
+                              lambda n: [legacy_product(product_form(i, args.farmers), i + 1, i) for i in range(n)]),
+        ('product', 'slots'): (args.products,
+                               lambda n: [ProductRecord.from_form(product_form(i, args.farmers), i + 1, i, now)
+                                          for i in range(n)]),
+        ('farmer', 'dict'): (args.farmers,
+                             lambda n: [legacy_farmer(farmer_form(i), i + 1, i) for i in range(n)]),
+        ('farmer', 'slots'): (args.farmers,
+                              lambda n: [FarmerRecord.from_form(farmer_form(i), i + 1, i, now) for i in range(n)]),
+    }
+
+    results = []
+    for (kind, layout), (count, build) in builders.items():
+        bytes_per_record = measure(build, count)
+        results.append({'record': kind, 'layout': layout, 'records': count, 'bytes_per_record': bytes_per_record})
+        print(f"{kind:<8} {layout:<6} {count:>9} records {bytes_per_record:>10.1f} bytes/record")
+
+    for kind in ('product', 'farmer'):
+        before, after = (r['bytes_per_record'] for r in results if r['record'] == kind)
+        print(f"{kind}: {before - after:.1f} bytes saved per record ({(1 - after / before) * 100:.1f}%)")
+
+    save_results(args.output, 'memory', vars(args), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""QR rendering latency by cache tier, and label sheet throughput.
+
+Measures a cold render, a disk cache hit (fresh service, warm directory) and
+a memory LRU hit for PNG and SVG, then renders a label sheet for a batch of
+products with one worker and with a process pool.
+
+    python -m benchmarks.bench_qr --labels 210 --workers 4 --output qr.json
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.common import Timer, save_results, summarize
+from qrcodes import QRCodeService
+
+BASE_URL = 'https://agrolink.example/verify/'
+
+
+def tier_latencies(cache_dir, fmt, size, count):
+    urls = [f"{BASE_URL}QR{i:06d}" for i in range(1, count + 1)]
+    latencies = {'render': [], 'disk': [], 'memory': []}
+    cold = QRCodeService(cache_dir)
+    for url in urls:
+        start = time.perf_counter()
+        cold.get(url, fmt, size)
+        latencies['render'].append(time.perf_counter() - start)
+    warm = QRCodeService(cache_dir)
+    for tier in ('disk', 'memory'):
+        for url in urls:
+            start = time.perf_counter()
+            warm.get(url, fmt, size)
+            latencies[tier].append(time.perf_counter() - start)
+    return latencies
+
+
+def labels(count, offset):
+    return [{
+        'url': f"{BASE_URL}QR{i:06d}",
+        'title': f"Product {i}",
+        'lines': [f"QR{i:06d}", f"Farmer {i % 97}", "Harvest 2026-10-01"],
+    } for i in range(offset, offset + count)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--codes', type=int, default=200)
+    parser.add_argument('--size', type=int, default=256)
+    parser.add_argument('--labels', type=int, default=210)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--output', default='bench_qr.json')
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for fmt in ('png', 'svg'):
+            for tier, latencies in tier_latencies(cache_dir, fmt, args.size, args.codes).items():
+                summary = summarize(latencies, sum(latencies))
+                results.append(dict(case=f'{fmt}_{tier}', **summary))
+                print(f"{fmt} {tier:<7} p50 {summary['latency_ms']['p50']:>8.3f} ms  "
+                      f"p95 {summary['latency_ms']['p95']:>8.3f} ms")
+
+    # Each sheet uses its own product range and cache so every code is a miss
+    for workers in sorted({1, args.workers}):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            service = QRCodeService(cache_dir, workers=workers)
+            batch = labels(args.labels, workers * args.labels)
+            with Timer() as sheet:
+                pdf = service.label_sheet(batch)
+            results.append(dict(case=f'label_sheet_{workers}_workers', labels=args.labels,
+                                seconds=round(sheet.elapsed, 3), pdf_bytes=len(pdf),
+                                labels_per_sec=round(args.labels / sheet.elapsed, 1)))
+            print(f"label sheet, {workers} worker(s): {args.labels} labels in {sheet.elapsed:.2f}s "
+                  f"({args.labels / sheet.elapsed:.0f} labels/sec)")
+
+    save_results(args.output, 'qr', vars(args), results)
+
+
+if __name__ == '__main__':
+    main()
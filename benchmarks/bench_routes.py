@@ -0,0 +1,232 @@
+"""Load test for the AgroLink HTTP routes.
+
+Drives /register, /add_product (with and without images), /products,
+/api/products and /api/stats either in-process through Flask's test client
+or over a local threaded WSGI server, at several concurrency levels and
+dataset sizes, and writes p50/p95/p99 latency and throughput to JSON.
+
+    python -m benchmarks.bench_routes --mode both --concurrency 1,8 \\
+        --dataset-sizes 100,10000 --output routes.json --compare previous.json
+"""
+import argparse
+import http.client
+import json
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import (Timer, compare_results, make_image_bytes, print_table,
+                               save_results, summarize)
+
+KEY_FIELDS = ('mode', 'scenario', 'concurrency', 'dataset_size')
+
+# Image sizes for the /add_product upload scenarios
+IMAGE_SIZES = {
+    'small': (320, 240),
+    'medium': (1280, 960),
+    'large': (2400, 1600),
+}
+
+PRODUCT_FORM = {
+    'product_name': 'Benchmark Tomatoes',
+    'category': 'Vegetables',
+    'quantity': '25',
+    'unit': 'kg',
+    'harvest_date': '2026-10-01',
+    'price_per_unit': '32',
+    'farmer_id': '1',
+    'farm_location': 'Nashik, Maharashtra',
+    'description': 'Vine ripened tomatoes from the benchmark farm',
+}
+
+FARMER_FORM = {
+    'name': 'Benchmark Farmer',
+    'email': 'bench@example.com',
+    'phone': '+91 90000 00000',
+    'address': 'Benchmark Farm, Pune, Maharashtra',
+    'farm_size': '3.5',
+    'crops': 'Tomatoes, Onions',
+}
+
+
+def build_scenarios(images):
+    """Return name -> (method, path, form fields, optional (filename, bytes))"""
+    scenarios = {
+        'register': ('POST', '/register', FARMER_FORM, None),
+        'add_product': ('POST', '/add_product', PRODUCT_FORM, None),
+        'products': ('GET', '/products', None, None),
+        'api_products': ('GET', '/api/products', None, None),
+        'api_stats': ('GET', '/api/stats', None, None),
+    }
+    for size, data in images.items():
+        scenarios[f'add_product_image_{size}'] = ('POST', '/add_product', PRODUCT_FORM, ('photo.jpg', data))
+    return scenarios
+
+
+def seed_dataset(app_module, size, min_farmers=1):
+    """Replace the app's database with one holding ``size`` products and at least ``min_farmers`` farmers"""
+    db = app_module.AgroLinkDatabase()
+    farmer_count = max(min_farmers, size // 50)
+    farmers = [db.add_farmer(dict(FARMER_FORM, name=f'Farmer {i}', email=f'farmer{i}@example.com'))
+               for i in range(farmer_count)]
+    for i in range(size):
+        farmer = farmers[i % farmer_count]
+        db.add_product(dict(PRODUCT_FORM, product_name=f'Product {i}', farmer_id=farmer.id,
+                            farmer_name=farmer.name))
+    app_module.app.extensions['agrolink_db'] = db
+    return db
+
+
+def encode_multipart(fields, upload):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    if upload is not None:
+        filename, data = upload
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="product_image"; '
+                     f'filename="{filename}"\r\nContent-Type: image/jpeg\r\n\r\n'.encode() + data + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+class InProcessClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, fields, upload):
+        if method == 'GET':
+            response = self.client.get(path)
+        else:
+            body, content_type = encode_multipart(fields, upload)
+            response = self.client.post(path, data=body, content_type=content_type)
+        return response.status_code == 200 and _succeeded(response.get_json(silent=True))
+
+    def close(self):
+        pass
+
+
+class HttpClient:
+    def __init__(self, port):
+        self.connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+
+    def request(self, method, path, fields, upload):
+        headers = {}
+        body = None
+        if method == 'POST':
+            body, headers['Content-Type'] = encode_multipart(fields, upload)
+        self.connection.request(method, path, body=body, headers=headers)
+        response = self.connection.getresponse()
+        payload = response.read()
+        if response.status != 200:
+            return False
+        if response.getheader('Content-Type', '').startswith('application/json'):
+            return _succeeded(json.loads(payload))
+        return True
+
+    def close(self):
+        self.connection.close()
+
+
+def _succeeded(payload):
+    return payload is None or not isinstance(payload, dict) or payload.get('success', True)
+
+
+class LocalServer:
+    """Threaded werkzeug server on an ephemeral port"""
+
+    def __init__(self, app):
+        from werkzeug.serving import make_server
+        self.server = make_server('127.0.0.1', 0, app, threaded=True)
+        self.port = self.server.server_port
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.thread.join()
+
+
+def run_scenario(client_factory, scenario, total_requests, concurrency, farmer_ids=()):
+    method, path, fields, upload = scenario
+    per_worker = max(1, total_requests // concurrency)
+
+    def worker(index):
+        # Each worker adds products for its own farmer, so uploads stay within the per-farmer admission limit
+        worker_fields = fields
+        if fields and 'farmer_id' in fields and farmer_ids:
+            worker_fields = dict(fields, farmer_id=str(farmer_ids[index % len(farmer_ids)]))
+        client = client_factory()
+        latencies, errors = [], 0
+        try:
+            for _ in range(per_worker):
+                with Timer() as timer:
+                    ok = client.request(method, path, worker_fields, upload)
+                latencies.append(timer.elapsed)
+                errors += not ok
+        finally:
+            client.close()
+        return latencies, errors
+
+    with Timer() as wall:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(pool.map(worker, range(concurrency)))
+
+    latencies = [latency for worker_latencies, _ in outcomes for latency in worker_latencies]
+    return summarize(latencies, wall.elapsed, sum(errors for _, errors in outcomes))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mode', choices=('inprocess', 'server', 'both'), default='inprocess')
+    parser.add_argument('--concurrency', default='1,4,16', help='comma separated worker counts')
+    parser.add_argument('--dataset-sizes', default='100,1000', help='comma separated product counts')
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario run')
+    parser.add_argument('--scenarios', default='', help='comma separated subset of scenarios')
+    parser.add_argument('--output', default='bench_routes.json')
+    parser.add_argument('--compare', help='previous results file to compare p95 latency against')
+    args = parser.parse_args(argv)
+
+    import app as app_module
+
+    images = {name: make_image_bytes(w, h, seed=i) for i, (name, (w, h)) in enumerate(IMAGE_SIZES.items())}
+    scenarios = build_scenarios(images)
+    if args.scenarios:
+        scenarios = {name: scenarios[name] for name in args.scenarios.split(',')}
+
+    modes = ('inprocess', 'server') if args.mode == 'both' else (args.mode,)
+    concurrencies = [int(c) for c in args.concurrency.split(',')]
+    dataset_sizes = [int(s) for s in args.dataset_sizes.split(',')]
+
+    results = []
+    print_table([], KEY_FIELDS)
+    for mode in modes:
+        for dataset_size in dataset_sizes:
+            for name, scenario in scenarios.items():
+                for concurrency in concurrencies:
+                    # Writes grow the dataset, so every run starts from a fresh seed
+                    db = seed_dataset(app_module, dataset_size, concurrency)
+                    farmer_ids = [farmer.id for farmer in db.farmers]
+                    if mode == 'inprocess':
+                        summary = run_scenario(lambda: InProcessClient(app_module.app), scenario,
+                                               args.requests, concurrency, farmer_ids)
+                    else:
+                        with LocalServer(app_module.app) as server:
+                            summary = run_scenario(lambda: HttpClient(server.port), scenario,
+                                                   args.requests, concurrency, farmer_ids)
+                    result = dict(mode=mode, scenario=name, concurrency=concurrency,
+                                  dataset_size=dataset_size, **summary)
+                    results.append(result)
+                    print_table([result], KEY_FIELDS, header=False)
+
+    save_results(args.output, 'routes', vars(args), results)
+    print(f"\nSaved {len(results)} results to {args.output}")
+    if args.compare:
+        compare_results(args.compare, results, KEY_FIELDS)
+
+
+if __name__ == '__main__':
+    main()
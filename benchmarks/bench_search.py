@@ -0,0 +1,76 @@
+"""Query latency of the product search index over a synthetic catalog.
+
+    python -m benchmarks.bench_search --products 1000000 --output search.json
+"""
+import argparse
+import random
+import time
+
+from benchmarks.common import Timer, save_results, summarize
+from search import ProductSearchIndex
+
+NAMES = ('Tomato', 'Onion', 'Potato', 'Basmati Rice', 'Wheat', 'Alphonso Mango', 'Banana', 'Turmeric',
+         'Chana Dal', 'Green Chilli', 'Cauliflower', 'Pomegranate', 'Grapes', 'Sugarcane', 'Cotton')
+CATEGORIES = ('Vegetables', 'Fruits', 'Grains', 'Pulses', 'Spices', 'Cash Crops')
+UNITS = ('kg', 'quintal', 'ton', 'dozen')
+LOCATIONS = ('Nashik Maharashtra', 'Pune Maharashtra', 'Ludhiana Punjab', 'Guntur Andhra Pradesh',
+             'Ratnagiri Maharashtra', 'Erode Tamil Nadu', 'Indore Madhya Pradesh')
+ADJECTIVES = ('fresh', 'organic', 'premium', 'sun dried', 'hand picked', 'export quality', 'pesticide free')
+
+QUERIES = {
+    'exact_selective': ('pomegranate ratnagiri', {}),
+    'exact_common': ('fresh', {}),
+    'prefix': ('pomeg', {}),
+    'typo': ('turmerik', {}),
+    'multi_term': ('organic alphonso mango', {}),
+    'filtered': ('tomato', {'category': 'Vegetables', 'unit': 'kg'}),
+    'lot_number': ('lot 123456', {}),
+}
+
+
+def synthetic_product(i, rng):
+    name = rng.choice(NAMES)
+    return {
+        'id': i,
+        'product_name': name,
+        'category': rng.choice(CATEGORIES),
+        'unit': rng.choice(UNITS),
+        'farm_location': rng.choice(LOCATIONS),
+        'farmer_name': f'Farmer {rng.randint(1, 20000)}',
+        'description': f'{rng.choice(ADJECTIVES)} {name.lower()} lot {i}',
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', default='bench_search.json')
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    index = ProductSearchIndex()
+    with Timer() as build:
+        for i in range(1, args.products + 1):
+            index.add(synthetic_product(i, rng))
+    print(f"Indexed {args.products} products in {build.elapsed:.1f}s "
+          f"({args.products / build.elapsed:.0f} inserts/sec)")
+
+    results = []
+    for name, (query, filters) in QUERIES.items():
+        latencies = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            _, total, _, _ = index.search(query, limit=20, **filters)
+            latencies.append(time.perf_counter() - start)
+        summary = summarize(latencies, sum(latencies))
+        results.append(dict(query=name, text=query, matches=total, **summary))
+        print(f"{name:<16} {total:>9} matches  p50 {summary['latency_ms']['p50']:>9.3f} ms  "
+              f"p95 {summary['latency_ms']['p95']:>9.3f} ms")
+
+    save_results(args.output, 'search', vars(args), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""Columnar snapshot export/import against JSON round-trips of the catalog.
+
+Generates a synthetic catalog of farmers and products, then times writing and
+reading it back (to records) as:
+
+- json: the /api/products and /api/farmers payloads (``to_dict`` lists)
+  dumped and parsed, plus rebuilding records from the parsed state;
+- binary: the mmap'd columnar snapshot;
+- parquet: the Arrow/Parquet snapshot (only with pyarrow installed).
+
+``--index`` also times AgroLinkDatabase.load_snapshot: ``binary+index`` is
+the time until lookups and custody work, ``binary+search`` the time until the
+background build of the search, geo and statistics indexes has finished.
+
+    python -m benchmarks.bench_snapshot --products 2000000 --output snapshot.json
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from benchmarks.common import Timer, peak_rss_mb, save_results
+
+import snapshot
+from records import FarmerRecord, ProductRecord
+
+CATEGORIES = ('Grains', 'Vegetables', 'Fruits', 'Pulses', 'Spices', 'Dairy')
+UNITS = ('kg', 'quintal', 'ton', 'dozen')
+LOCATIONS = ('Karnal', 'Nashik', 'Ludhiana', 'Guntur', 'Indore', 'Mysuru', 'Jalgaon', 'Kota')
+
+
+def build_catalog(farmers, products, rng):
+    now = time.time()
+    farmer_records = [
+        FarmerRecord(i, f"Farmer {i}", f"farmer{i}@example.com", f"+91 9{i:09d}",
+                     f"{rng.choice(LOCATIONS)}, India", f"{rng.uniform(1, 50):.1f}", 'Rice, Wheat',
+                     now - rng.uniform(0, 3e7), 12847 + i)
+        for i in range(1, farmers + 1)]
+    product_records = []
+    for i in range(1, products + 1):
+        farmer = farmer_records[rng.randrange(farmers)]
+        product_records.append(ProductRecord(
+            i, f"{rng.choice(CATEGORIES)} lot {i}", rng.choice(CATEGORIES), str(rng.randint(1, 500)),
+            rng.choice(UNITS), f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            str(rng.randint(10, 200)), farmer.id, rng.choice(LOCATIONS), '', farmer.name,
+            f"watermarked_{i:032x}.jpg" if rng.random() < 0.5 else None, now - rng.uniform(0, 3e7),
+            12847 + farmers + i, image_phash=rng.getrandbits(64) if rng.random() < 0.5 else None))
+    return farmer_records, product_records
+
+
+def json_round_trip(path, farmers, products):
+    with Timer() as write:
+        with open(path, 'w') as f:
+            json.dump({'farmers': [farmer.to_state() for farmer in farmers],
+                       'products': [product.to_state() for product in products]}, f)
+    with Timer() as read:
+        with open(path) as f:
+            data = json.load(f)
+        loaded = ([FarmerRecord.from_state(state) for state in data['farmers']],
+                  [ProductRecord.from_state(state) for state in data['products']])
+    return write.elapsed, read.elapsed, os.path.getsize(path), loaded
+
+
+def snapshot_round_trip(path, farmers, products, format):
+    with Timer() as write:
+        snapshot.write_snapshot(path, farmers, products, {}, format)
+    with Timer() as read:
+        loaded = snapshot.read_snapshot(path)
+    if os.path.isdir(path):
+        size = sum(entry.stat().st_size for entry in os.scandir(path))
+    else:
+        size = os.path.getsize(path)
+    return write.elapsed, read.elapsed, size, loaded[:2]
+
+
+def check(original, loaded):
+    for expected, actual in zip(original, loaded):
+        assert len(expected) == len(actual)
+        for a, b in zip(expected[:1000], actual[:1000]):
+            assert a.to_state() == b.to_state(), (a, b)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--farmers', type=int, default=20000)
+    parser.add_argument('--products', type=int, default=500000)
+    parser.add_argument('--index', action='store_true', help='also time load_snapshot into AgroLinkDatabase')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', default='bench_snapshot.json')
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    with Timer() as building:
+        farmers, products = build_catalog(args.farmers, args.products, rng)
+    print(f"Built {len(farmers)} farmers and {len(products)} products in {building.elapsed:.1f}s")
+
+    directory = tempfile.mkdtemp(prefix='agrolink-snapshot-')
+    results = []
+    try:
+        runs = [('json', lambda path: json_round_trip(path, farmers, products), 'catalog.json')]
+        for format in reversed(snapshot.available_formats()):
+            runs.append((format, lambda path, format=format: snapshot_round_trip(path, farmers, products, format),
+                         'catalog.agsnap' if format == 'binary' else 'catalog.parquet'))
+        for name, run, filename in runs:
+            write_seconds, read_seconds, size, loaded = run(os.path.join(directory, filename))
+            check((farmers, products), loaded)
+            del loaded
+            results.append({
+                'format': name,
+                'write_seconds': round(write_seconds, 3),
+                'read_seconds': round(read_seconds, 3),
+                'megabytes': round(size / 1e6, 1),
+                'rows_per_second_read': round((args.farmers + args.products) / read_seconds),
+            })
+
+        if args.index:
+            os.environ['AGROLINK_SNAPSHOT'] = os.path.join(directory, 'catalog.agsnap')
+            import app as app_module
+            with Timer() as loading:
+                database = app_module.AgroLinkDatabase()
+            assert database.get_product_count() == args.products
+            results.append({'format': 'binary+index', 'read_seconds': round(loading.elapsed, 3)})
+            with Timer() as indexing:
+                database.wait_for_indexes()
+            results.append({'format': 'binary+search',
+                            'read_seconds': round(loading.elapsed + indexing.elapsed, 3)})
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    json_result = results[0]
+    print(f"{'format':<14} {'write s':>9} {'read s':>9} {'MB':>8} {'rows/s read':>12} {'read vs json':>13}")
+    for result in results:
+        speedup = json_result['read_seconds'] / result['read_seconds']
+        print(f"{result['format']:<14} {result.get('write_seconds', ''):>9} {result['read_seconds']:>9} "
+              f"{result.get('megabytes', ''):>8} {result.get('rows_per_second_read', ''):>12} {speedup:>12.1f}x")
+    print(f"Peak RSS: {peak_rss_mb()} MB")
+
+    save_results(args.output, 'snapshot', vars(args), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Import and first-request latency of the app in fresh interpreters.
+
+Each run spawns a new Python process that imports ``app``, serves one
+/api/stats request through the test client and reports which heavy modules
+were loaded along the way. ``--ref`` also measures an older revision (e.g.
+the commit before the app factory), checked out to a temporary directory
+with ``git archive``.
+
+    python -m benchmarks.bench_startup --runs 20 --ref HEAD~1 --output startup.json
+"""
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import tarfile
+import tempfile
+
+from benchmarks.common import ROOT, Timer, percentile, save_results
+
+HEAVY_MODULES = ('PIL.Image', 'qrcode', 'web3', 'sqlite3')
+
+PROBE = f"""
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.app.test_client().get('/api/stats')
+served = time.perf_counter()
+print(json.dumps({{
+    'import_ms': (imported - start) * 1000,
+    'first_request_ms': (served - imported) * 1000,
+    'loaded': [m for m in {HEAVY_MODULES!r} if m in sys.modules],
+}}))
+"""
+
+
+def export_revision(ref, target):
+    archive = subprocess.run(['git', 'archive', ref], cwd=ROOT, check=True, capture_output=True).stdout
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        tar.extractall(target)
+
+
+def probe(tree):
+    env = dict(os.environ, AGROLINK_LOG_LEVEL='WARNING', PYTHONDONTWRITEBYTECODE='1')
+    with Timer() as process:
+        output = subprocess.run([sys.executable, '-c', PROBE], cwd=tree, env=env,
+                                check=True, capture_output=True, text=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result['process_ms'] = process.elapsed * 1000
+    return result
+
+
+def measure(trees, runs):
+    """Alternate between trees on every run so machine noise hits them equally"""
+    samples = {name: {'process_ms': [], 'import_ms': [], 'first_request_ms': []} for name, _ in trees}
+    loaded = {}
+    for name, tree in trees:
+        probe(tree)  # untimed, to warm the OS page cache
+    for _ in range(runs):
+        for name, tree in trees:
+            result = probe(tree)
+            for metric, values in samples[name].items():
+                values.append(result[metric])
+            loaded[name] = result['loaded']
+    summaries = {}
+    for name, metrics in samples.items():
+        summaries[name] = {metric: {'p50': round(percentile(sorted(values), 0.5), 2),
+                                    'p95': round(percentile(sorted(values), 0.95), 2)}
+                           for metric, values in metrics.items()}
+    return summaries, loaded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--ref', help='also measure this git revision')
+    parser.add_argument('--output', default='bench_startup.json')
+    args = parser.parse_args(argv)
+
+    trees = [('working tree', ROOT)]
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.ref:
+            export_revision(args.ref, tmp)
+            trees.append((args.ref, tmp))
+        summaries, loaded = measure(trees, args.runs)
+
+    results = []
+    for name, _ in trees:
+        summary = summaries[name]
+        results.append(dict(tree=name, heavy_modules_loaded=loaded[name], **summary))
+        print(f"{name:<14} import p50 {summary['import_ms']['p50']:>8.1f} ms  "
+              f"first request p50 {summary['first_request_ms']['p50']:>8.1f} ms  "
+              f"process p50 {summary['process_ms']['p50']:>8.1f} ms  loaded: {', '.join(loaded[name]) or '-'}")
+
+    save_results(args.output, 'startup', vars(args), results)
+
+
+if __name__ == '__main__':
+    main()
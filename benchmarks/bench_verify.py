@@ -0,0 +1,82 @@
+"""Scan throughput of /verify/<qr_code> for a single worker.
+
+Seeds a catalog, then replays scans with a Zipf-like popularity skew (a few
+products printed on many packages) through Flask's test client: cold scans
+that build the cached entry, warm JSON and HTML scans, ETag revalidations
+(304) and hash lookups. Also times the bare cache lookup.
+
+    python -m benchmarks.bench_verify --products 100000 --scans 20000 --output verify.json
+"""
+import argparse
+import random
+import time
+
+from benchmarks.bench_routes import seed_dataset
+from benchmarks.common import Timer, save_results, summarize
+
+import app as app_module
+
+HTML_ACCEPT = 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8'
+
+
+def scan_codes(products, scans, rng):
+    weights = [1 / rank for rank in range(1, products + 1)]
+    ids = rng.choices(range(1, products + 1), weights=weights, k=scans)
+    return [f"QR{product_id:06d}" for product_id in ids]
+
+
+def replay(client, paths, headers=None):
+    latencies, errors = [], 0
+    with Timer() as wall:
+        for path in paths:
+            start = time.perf_counter()
+            response = client.get(path, headers=headers)
+            latencies.append(time.perf_counter() - start)
+            errors += response.status_code not in (200, 304)
+    return summarize(latencies, wall.elapsed, errors)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--scans', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=5)
+    parser.add_argument('--output', default='bench_verify.json')
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    with Timer() as seeding:
+        db = seed_dataset(app_module, args.products)
+    print(f"Seeded {args.products} products in {seeding.elapsed:.1f}s")
+    client = app_module.app.test_client()
+    codes = scan_codes(args.products, args.scans, rng)
+    paths = [f"/verify/{code}" for code in codes]
+
+    cases = {}
+    distinct = list(dict.fromkeys(paths))
+    cases['json_cold'] = replay(client, distinct)
+    cases['json_warm'] = replay(client, paths)
+    cases['html_warm'] = replay(client, paths, {'Accept': HTML_ACCEPT})
+    etag = db.verification.get(codes[0]).etag
+    cases['revalidate_304'] = replay(client, [paths[0]] * args.scans, {'If-None-Match': f'"{etag}"'})
+    hashes = [f"/verify/hash/{db.get_product_by_qr(code).blockchain_hash}" for code in codes]
+    cases['hash_warm'] = replay(client, hashes)
+
+    latencies = []
+    for code in codes:
+        start = time.perf_counter()
+        db.verification.get(code)
+        latencies.append(time.perf_counter() - start)
+    cases['cache_lookup'] = summarize(latencies, sum(latencies))
+
+    results = []
+    for name, summary in cases.items():
+        results.append(dict(case=name, **summary))
+        print(f"{name:<16} {summary['throughput_rps']:>10.0f} scans/sec  p50 {summary['latency_ms']['p50']:>8.3f} ms  "
+              f"p99 {summary['latency_ms']['p99']:>8.3f} ms")
+
+    save_results(args.output, 'verify', vars(args), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+"""Micro-benchmark for the image watermark pipeline.
+
+Synthesizes a corpus of test images across resolutions and formats (JPEG,
+opaque PNG and PNG with alpha), then runs ``add_watermark``'s decode,
+composite and encode stages:
+
+* single-threaded, one configuration per fresh process so that the peak RSS
+  reported belongs to that configuration alone;
+* across a process or thread pool over the whole corpus, for throughput;
+* per output encoding (the old baseline JPEG at quality 90, the progressive
+  JPEG and every WebP/AVIF variant this Pillow build supports), for bytes
+  saved against the baseline and encode cost.
+
+    python -m benchmarks.bench_watermark --resolutions 640x480,1920x1080 \\
+        --workers 1,4 --output watermark.json
+    python -m benchmarks.bench_watermark --sections encodings --resolutions 300x200,1280x960
+"""
+import argparse
+import io
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from benchmarks.common import Timer, make_image_bytes, peak_rss_mb, save_results
+
+DEFAULT_RESOLUTIONS = '640x480,1280x960,1920x1080,3000x2000,4000x3000'
+
+# name -> (PIL format, mode, file extension)
+FORMATS = {
+    'jpeg': ('JPEG', 'RGB', 'jpg'),
+    'png': ('PNG', 'RGB', 'png'),
+    'png_alpha': ('PNG', 'RGBA', 'png'),
+}
+
+FARMER_NAMES = {
+    'short': 'Ravi',
+    'medium': 'Rajesh Kumar Patil',
+    'long': 'Shri Venkataramana Subrahmanya Lakshminarayana Krishnamurthy',
+}
+
+STAGES = ('decode', 'composite', 'encode')
+
+
+def generate_corpus(directory, resolutions, formats):
+    """Write one synthetic image per (resolution, format) and return their descriptions"""
+    corpus = []
+    for index, (width, height) in enumerate(resolutions):
+        for fmt_name in formats:
+            pil_format, mode, extension = FORMATS[fmt_name]
+            path = os.path.join(directory, f'{width}x{height}_{fmt_name}.{extension}')
+            with open(path, 'wb') as f:
+                f.write(make_image_bytes(width, height, pil_format, mode, seed=index))
+            corpus.append({
+                'path': path,
+                'resolution': f'{width}x{height}',
+                'format': fmt_name,
+                'bytes': os.path.getsize(path),
+            })
+    return corpus
+
+
+def watermark_once(image_path, farmer_name, output_path):
+    """Run the pipeline stage by stage and return seconds spent in each"""
+    from app import composite_watermark, decode_image, encode_image
+
+    timings = {}
+    start = time.perf_counter()
+    img = decode_image(image_path)
+    timings['decode'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    watermarked = composite_watermark(img, farmer_name)
+    timings['composite'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    encode_image(watermarked, output_path)
+    timings['encode'] = time.perf_counter() - start
+    return timings
+
+
+def measure_config(job):
+    """Single-threaded run of one configuration; executed in a fresh process"""
+    image_path, farmer_name, output_path, iterations = job
+    # Warm up imports, fonts and codecs before timing
+    watermark_once(image_path, farmer_name, output_path)
+    totals = dict.fromkeys(STAGES, 0.0)
+    with Timer() as wall:
+        for _ in range(iterations):
+            for stage, seconds in watermark_once(image_path, farmer_name, output_path).items():
+                totals[stage] += seconds
+    return {
+        'images_per_sec': round(iterations / wall.elapsed, 2),
+        'stage_ms': {stage: round(totals[stage] / iterations * 1000, 3) for stage in STAGES},
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def _pool_job(job):
+    image_path, farmer_name, output_path = job
+    timings = watermark_once(image_path, farmer_name, output_path)
+    timings['peak_rss_mb'] = peak_rss_mb()
+    return timings
+
+
+def measure_pool(corpus, farmer_name, output_dir, workers, rounds, pool_kind):
+    jobs = [(item['path'], farmer_name, os.path.join(output_dir, f"pool_{n}_{os.path.basename(item['path'])}.jpg"))
+            for n in range(rounds) for item in corpus]
+    if pool_kind == 'process':
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    else:
+        executor = ThreadPoolExecutor(max_workers=workers)
+    with executor:
+        # Start every worker and warm it up before the clock starts
+        list(executor.map(_pool_job, jobs[:workers]))
+        with Timer() as wall:
+            timings = list(executor.map(_pool_job, jobs))
+
+    totals = {stage: sum(t[stage] for t in timings) for stage in STAGES}
+    return {
+        'pool': pool_kind,
+        'workers': workers,
+        'images': len(jobs),
+        'images_per_sec': round(len(jobs) / wall.elapsed, 2),
+        'stage_ms': {stage: round(totals[stage] / len(jobs) * 1000, 3) for stage in STAGES},
+        # Largest single worker; threads share the benchmark process
+        'peak_rss_mb': max(t['peak_rss_mb'] or 0 for t in timings),
+    }
+
+
+def measure_encodings(corpus, farmer_name, iterations):
+    """Encoded size and time of each output format for every corpus image"""
+    from app import JPEG_OPTIONS, composite_watermark, decode_image, supported_variants
+
+    encodings = [('jpeg_q90', 'JPEG', {'quality': 90}), ('jpeg', 'JPEG', JPEG_OPTIONS)]
+    encodings += [(extension, pil_format, options) for extension, pil_format, _, options in supported_variants()]
+    results = []
+    for item in corpus:
+        watermarked = composite_watermark(decode_image(item['path']), farmer_name)
+        baseline = None
+        for name, pil_format, options in encodings:
+            timings = []
+            for _ in range(iterations):
+                buffer = io.BytesIO()
+                start = time.perf_counter()
+                watermarked.save(buffer, pil_format, **options)
+                timings.append(time.perf_counter() - start)
+            size = buffer.tell()
+            baseline = baseline or size
+            results.append({
+                'resolution': item['resolution'],
+                'input_format': item['format'],
+                'encoding': name,
+                'bytes': size,
+                'saved_pct': round((1 - size / baseline) * 100, 1),
+                'encode_ms': round(min(timings) * 1000, 3),
+            })
+    return results
+
+
+def parse_resolutions(value):
+    return [tuple(int(part) for part in item.split('x')) for item in value.split(',')]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--resolutions', default=DEFAULT_RESOLUTIONS)
+    parser.add_argument('--formats', default=','.join(FORMATS))
+    parser.add_argument('--names', default=','.join(FARMER_NAMES), help='farmer name lengths to test')
+    parser.add_argument('--iterations', type=int, default=5, help='single-threaded runs per configuration')
+    parser.add_argument('--workers', default=f'1,{os.cpu_count() or 1}', help='comma separated pool sizes')
+    parser.add_argument('--pool', choices=('process', 'thread'), default='process')
+    parser.add_argument('--pool-rounds', type=int, default=2, help='passes over the corpus per pool run')
+    parser.add_argument('--sections', default='single,pool,encodings')
+    parser.add_argument('--corpus-dir', help='keep the generated corpus here instead of a temp dir')
+    parser.add_argument('--output', default='bench_watermark.json')
+    args = parser.parse_args(argv)
+
+    workdir = args.corpus_dir or tempfile.mkdtemp(prefix='agrolink-watermark-')
+    os.makedirs(workdir, exist_ok=True)
+    output_dir = os.path.join(workdir, 'out')
+    os.makedirs(output_dir, exist_ok=True)
+
+    try:
+        corpus = generate_corpus(workdir, parse_resolutions(args.resolutions), args.formats.split(','))
+        names = args.names.split(',')
+        sections = args.sections.split(',')
+        print(f"Corpus: {len(corpus)} images in {workdir}")
+
+        single = []
+        spawn = multiprocessing.get_context('spawn')
+        if 'single' in sections:
+            print(f"\n{'resolution':<11} {'format':<10} {'name':<7} {'img/s':>8} "
+              f"{'decode':>8} {'compos.':>8} {'encode':>8} {'rss MiB':>8}")
+            for item in corpus:
+                for name in names:
+                    job = (item['path'], FARMER_NAMES[name], os.path.join(output_dir, 'single.jpg'), args.iterations)
+                    with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as executor:
+                        measured = executor.submit(measure_config, job).result()
+                    result = dict(resolution=item['resolution'], format=item['format'], name_length=name,
+                                  input_bytes=item['bytes'], **measured)
+                    single.append(result)
+                    stages = result['stage_ms']
+                    print(f"{result['resolution']:<11} {result['format']:<10} {name:<7} "
+                          f"{result['images_per_sec']:>8.1f} {stages['decode']:>8.2f} "
+                          f"{stages['composite']:>8.2f} {stages['encode']:>8.2f} {result['peak_rss_mb']:>8}")
+
+        pool = []
+        if 'pool' in sections:
+            print(f"\n{args.pool} pool over the whole corpus ({args.pool_rounds} rounds):")
+            for workers in (int(w) for w in args.workers.split(',')):
+                result = measure_pool(corpus, FARMER_NAMES['medium'], output_dir, workers,
+                                      args.pool_rounds, args.pool)
+                pool.append(result)
+                print(f"  {workers:>3} workers: {result['images_per_sec']:>8.1f} images/sec")
+
+        encodings = []
+        if 'encodings' in sections:
+            encodings = measure_encodings(corpus, FARMER_NAMES['medium'], args.iterations)
+            print(f"\n{'resolution':<11} {'input':<10} {'encoding':<9} {'bytes':>10} {'saved':>7} {'encode ms':>10}")
+            for result in encodings:
+                print(f"{result['resolution']:<11} {result['input_format']:<10} {result['encoding']:<9} "
+                      f"{result['bytes']:>10} {result['saved_pct']:>6.1f}% {result['encode_ms']:>10.2f}")
+
+        save_results(args.output, 'watermark', vars(args),
+                     {'single': single, 'pool': pool, 'encodings': encodings})
+        print(f"\nSaved results to {args.output}")
+    finally:
+        if not args.corpus_dir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
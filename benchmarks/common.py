@@ -0,0 +1,149 @@
+"""Shared helpers for the AgroLink benchmarks: statistics, images and result files."""
+import io
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# Keep the app's request logs out of benchmark output unless asked for
+os.environ.setdefault('AGROLINK_LOG_LEVEL', 'WARNING')
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, wall_seconds, errors=0):
+    """Summarize per-request latencies (seconds) into the result record shape"""
+    values = sorted(latencies)
+    count = len(values)
+    return {
+        'requests': count,
+        'errors': errors,
+        'wall_seconds': round(wall_seconds, 4),
+        'throughput_rps': round(count / wall_seconds, 2) if wall_seconds > 0 else 0.0,
+        'latency_ms': {
+            'mean': round(sum(values) / count * 1000, 3) if count else 0.0,
+            'p50': round(percentile(values, 0.50) * 1000, 3),
+            'p95': round(percentile(values, 0.95) * 1000, 3),
+            'p99': round(percentile(values, 0.99) * 1000, 3),
+            'max': round(values[-1] * 1000, 3) if count else 0.0,
+        },
+    }
+
+
+def make_image_bytes(width, height, fmt='JPEG', mode='RGB', seed=0):
+    """Synthesize a photo-like test image (gradient plus noise) and return the encoded bytes"""
+    from PIL import Image, ImageChops
+
+    rng = random.Random(seed)
+    gradient = Image.linear_gradient('L').resize((width, height))
+    noise = Image.effect_noise((width, height), 40 + rng.randint(0, 20))
+    red = ImageChops.add(gradient, noise, scale=2.0)
+    green = ImageChops.add(gradient.rotate(90, expand=False), noise, scale=2.0)
+    blue = noise
+    image = Image.merge('RGB', (red, green, blue))
+    if mode == 'RGBA':
+        image.putalpha(gradient)
+    elif mode != 'RGB':
+        image = image.convert(mode)
+
+    buffer = io.BytesIO()
+    if fmt == 'JPEG':
+        image.save(buffer, fmt, quality=85)
+    else:
+        image.save(buffer, fmt)
+    return buffer.getvalue()
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MiB (None where unsupported)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and KiB elsewhere
+    return round(peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024, 1)
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'git_commit': commit,
+    }
+
+
+def save_results(path, benchmark, config, results):
+    payload = {
+        'benchmark': benchmark,
+        'environment': environment(),
+        'config': config,
+        'results': results,
+    }
+    with open(path, 'w') as f:
+        json.dump(payload, f, indent=2)
+    return payload
+
+
+def result_key(result, key_fields):
+    return tuple(result.get(field) for field in key_fields)
+
+
+def compare_results(baseline_path, results, key_fields, metric=('latency_ms', 'p95')):
+    """Print the change of ``metric`` for every result also present in the baseline file"""
+    with open(baseline_path) as f:
+        baseline = {result_key(r, key_fields): r for r in json.load(f)['results']}
+
+    print(f"\nComparison against {baseline_path} ({'.'.join(metric)}):")
+    for result in results:
+        previous = baseline.get(result_key(result, key_fields))
+        if previous is None:
+            continue
+        old, new = previous, result
+        for part in metric:
+            old, new = old[part], new[part]
+        change = (new - old) / old * 100 if old else 0.0
+        label = ' '.join(str(v) for v in result_key(result, key_fields))
+        print(f"  {label:<50} {old:>10.3f} -> {new:>10.3f} ({change:+.1f}%)")
+
+
+def print_table(results, key_fields, header=True):
+    if header:
+        columns = ' '.join(f"{field:<16}" for field in key_fields)
+        print(f"{columns} {'rps':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for result in results:
+        keys = ' '.join(f"{str(result.get(field)):<16}" for field in key_fields)
+        latency = result['latency_ms']
+        print(f"{keys} {result['throughput_rps']:>10.1f} {latency['p50']:>9.3f} "
+              f"{latency['p95']:>9.3f} {latency['p99']:>9.3f} {result['errors']:>7}")
+
+
+class Timer:
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
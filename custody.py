@@ -0,0 +1,137 @@
+"""Custody chain for products, mirroring SupplyChain.sol's Stage/transferProduct.
+
+Every product starts with a Produced event held by its farmer. Each transfer
+moves it to a new holder and optionally a later stage. As in the contract, a
+stage can never go backwards. Unlike the contract, a transfer may keep the
+current stage, e.g. a hand-off between two distributors while Shipped.
+
+Events are append-only. They are indexed by product (full provenance), by
+holder (every event a holder took part in), and by the current holder and
+current stage of each product, so every query costs O(page size) rather than
+a scan of the ledger (paging into holdings also skips ``offset`` entries).
+"""
+import threading
+from itertools import islice
+
+# Same order as the Stage enum in SupplyChain.sol
+STAGES = ('Produced', 'Processed', 'Shipped', 'Received', 'Sold')
+
+
+def parse_stage(value):
+    """Stage index from a name (any case) or an index"""
+    if isinstance(value, int) or (isinstance(value, str) and value.isdigit()):
+        index = int(value)
+        if 0 <= index < len(STAGES):
+            return index
+    else:
+        for index, name in enumerate(STAGES):
+            if name.lower() == str(value).strip().lower():
+                return index
+    raise ValueError(f"stage must be one of {', '.join(STAGES)}")
+
+
+def farmer_holder(farmer_id):
+    return f"farmer:{farmer_id}"
+
+
+class CustodyEvent:
+    __slots__ = ('product_id', 'from_holder', 'to_holder', 'stage', 'price', 'timestamp', 'block_number')
+
+    def __init__(self, product_id, from_holder, to_holder, stage, price, timestamp, block_number):
+        self.product_id = product_id
+        self.from_holder = from_holder
+        self.to_holder = to_holder
+        self.stage = stage
+        self.price = price
+        self.timestamp = timestamp
+        self.block_number = block_number
+
+    def to_dict(self):
+        return {
+            'product_id': self.product_id,
+            'from': self.from_holder,
+            'to': self.to_holder,
+            'stage': STAGES[self.stage],
+            'price': self.price,
+            'timestamp': self.timestamp,
+            'block_number': self.block_number,
+        }
+
+    def to_state(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_state(cls, state):
+        return cls(**state)
+
+
+class CustodyLedger:
+    def __init__(self):
+        self.event_count = 0
+        self._by_product = {}   # product id -> [events], oldest first
+        self._by_holder = {}    # holder -> [events] sent or received, oldest first
+        self._current = {}      # product id -> latest event
+        self._held = {}         # holder -> {product id: None}, insertion ordered
+        self._at_stage = {}     # stage -> {product id: None}
+        self._held_at = {}      # (holder, stage) -> {product id: None}
+        self._lock = threading.Lock()
+
+    def validate(self, product_id, from_holder, to_holder, stage):
+        """Raise ValueError unless the transfer is allowed from the product's current state"""
+        current = self._current.get(product_id)
+        if current is None:
+            if from_holder is not None:
+                raise ValueError(f"Product {product_id} has no custody record")
+            return
+        if from_holder is None:
+            raise ValueError(f"Product {product_id} already has a custody record")
+        if from_holder != current.to_holder:
+            raise ValueError(f"Product {product_id} is held by {current.to_holder}, not {from_holder}")
+        if not to_holder:
+            raise ValueError("Receiver is required")
+        if stage < current.stage:
+            raise ValueError(f"Invalid stage transition {STAGES[current.stage]} -> {STAGES[stage]}")
+
+    def add(self, event):
+        """Index an event that has already been validated"""
+        with self._lock:
+            self.event_count += 1
+            self._by_product.setdefault(event.product_id, []).append(event)
+            for holder in {event.from_holder, event.to_holder} - {None}:
+                self._by_holder.setdefault(holder, []).append(event)
+
+            previous = self._current.get(event.product_id)
+            if previous is not None:
+                self._held[previous.to_holder].pop(event.product_id, None)
+                self._at_stage[previous.stage].pop(event.product_id, None)
+                self._held_at[(previous.to_holder, previous.stage)].pop(event.product_id, None)
+            self._current[event.product_id] = event
+            self._held.setdefault(event.to_holder, {})[event.product_id] = None
+            self._at_stage.setdefault(event.stage, {})[event.product_id] = None
+            self._held_at.setdefault((event.to_holder, event.stage), {})[event.product_id] = None
+
+    def current(self, product_id):
+        return self._current.get(product_id)
+
+    def history(self, product_id):
+        """Full provenance of a product, oldest first"""
+        return list(self._by_product.get(product_id, ()))
+
+    def holder_history(self, holder, limit=None, offset=0):
+        """Events a holder sent or received, newest first"""
+        events = self._by_holder.get(holder, [])
+        end = max(len(events) - offset, 0)
+        start = max(end - limit, 0) if limit is not None else 0
+        return events[start:end][::-1]
+
+    def held_by(self, holder, stage=None, limit=None, offset=0):
+        """(total, product ids) currently held by ``holder``, optionally at one stage"""
+        held = self._held.get(holder, {}) if stage is None else self._held_at.get((holder, stage), {})
+        stop = offset + limit if limit is not None else None
+        return len(held), list(islice(held, offset, stop))
+
+    def at_stage(self, stage, limit=None, offset=0):
+        """(total, product ids) currently at ``stage``"""
+        products = self._at_stage.get(stage, {})
+        stop = offset + limit if limit is not None else None
+        return len(products), list(islice(products, offset, stop))
@@ -0,0 +1,287 @@
+"""Offline geocoding and a geohash spatial index for farms and products.
+
+``resolve_location`` maps free-text addresses such as "Sample Farm,
+Maharashtra, India" to coordinates using a small built-in gazetteer of
+Indian cities and state centroids (extendable with a CSV file named by
+AGROLINK_GAZETTEER, one ``name,latitude,longitude[,state]`` per line). No network
+lookups are made.
+
+``GeoIndex`` stores each point under its geohash cell at several
+precisions. A radius or bounding-box query picks the finest precision whose
+covering cells stay under ``MAX_QUERY_CELLS``, gathers the candidates from
+those cells and filters them exactly, so query cost follows the number of
+nearby points rather than the size of the catalog.
+"""
+import csv
+import math
+import os
+import re
+import threading
+from collections import defaultdict
+from functools import lru_cache
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Geohash precisions maintained by the index (precision 6 cells are ~1.2 km x 0.6 km)
+INDEX_PRECISIONS = (2, 3, 4, 5, 6)
+MAX_QUERY_CELLS = 64
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# City-level entries, resolved before state centroids
+CITIES = {
+    'mumbai': (19.0760, 72.8777), 'pune': (18.5204, 73.8567), 'nashik': (19.9975, 73.7898),
+    'nagpur': (21.1458, 79.0882), 'aurangabad': (19.8762, 75.3433), 'kolhapur': (16.7050, 74.2433),
+    'ratnagiri': (16.9902, 73.3120), 'satara': (17.6805, 74.0183), 'sangli': (16.8524, 74.5815),
+    'solapur': (17.6599, 75.9064), 'ahmednagar': (19.0948, 74.7480), 'jalgaon': (21.0077, 75.5626),
+    'amravati': (20.9374, 77.7796), 'latur': (18.4088, 76.5604), 'delhi': (28.6139, 77.2090),
+    'new delhi': (28.6139, 77.2090), 'bengaluru': (12.9716, 77.5946), 'bangalore': (12.9716, 77.5946),
+    'chennai': (13.0827, 80.2707), 'hyderabad': (17.3850, 78.4867), 'kolkata': (22.5726, 88.3639),
+    'ahmedabad': (23.0225, 72.5714), 'surat': (21.1702, 72.8311), 'rajkot': (22.3039, 70.8022),
+    'jaipur': (26.9124, 75.7873), 'jodhpur': (26.2389, 73.0243), 'lucknow': (26.8467, 80.9462),
+    'kanpur': (26.4499, 80.3319), 'varanasi': (25.3176, 82.9739), 'agra': (27.1767, 78.0081),
+    'indore': (22.7196, 75.8577), 'bhopal': (23.2599, 77.4126), 'ludhiana': (30.9010, 75.8573),
+    'amritsar': (31.6340, 74.8723), 'chandigarh': (30.7333, 76.7794), 'karnal': (29.6857, 76.9905),
+    'guntur': (16.3067, 80.4365), 'vijayawada': (16.5062, 80.6480), 'visakhapatnam': (17.6868, 83.2185),
+    'erode': (11.3410, 77.7172), 'coimbatore': (11.0168, 76.9558), 'madurai': (9.9252, 78.1198),
+    'mysuru': (12.2958, 76.6394), 'mysore': (12.2958, 76.6394), 'belagavi': (15.8497, 74.4977),
+    'hubballi': (15.3647, 75.1240), 'patna': (25.5941, 85.1376), 'bhubaneswar': (20.2961, 85.8245),
+    'guwahati': (26.1445, 91.7362), 'shimla': (31.1048, 77.1734), 'srinagar': (34.0837, 74.7973),
+    'dehradun': (30.3165, 78.0322), 'thiruvananthapuram': (8.5241, 76.9366), 'kochi': (9.9312, 76.2673),
+    'raipur': (21.2514, 81.6296), 'ranchi': (23.3441, 85.3096), 'warangal': (17.9689, 79.5941),
+}
+
+STATES = {
+    'maharashtra': (19.7515, 75.7139), 'punjab': (31.1471, 75.3412), 'andhra pradesh': (15.9129, 79.7400),
+    'tamil nadu': (11.1271, 78.6569), 'karnataka': (15.3173, 75.7139), 'kerala': (10.8505, 76.2711),
+    'gujarat': (22.2587, 71.1924), 'rajasthan': (27.0238, 74.2179), 'madhya pradesh': (22.9734, 78.6569),
+    'uttar pradesh': (26.8467, 80.9462), 'bihar': (25.0961, 85.3131), 'west bengal': (22.9868, 87.8550),
+    'odisha': (20.9517, 85.0985), 'telangana': (18.1124, 79.0193), 'haryana': (29.0588, 76.0856),
+    'assam': (26.2006, 92.9376), 'himachal pradesh': (31.1048, 77.1734), 'uttarakhand': (30.0668, 79.0193),
+    'jharkhand': (23.6102, 85.2799), 'chhattisgarh': (21.2787, 81.8661), 'goa': (15.2993, 74.1240),
+    'jammu and kashmir': (33.7782, 76.5762), 'india': (20.5937, 78.9629),
+}
+
+# State of each built-in city, used to roll products up by region
+CITY_STATES = {
+    'mumbai': 'maharashtra', 'pune': 'maharashtra', 'nashik': 'maharashtra', 'nagpur': 'maharashtra',
+    'aurangabad': 'maharashtra', 'kolhapur': 'maharashtra', 'ratnagiri': 'maharashtra',
+    'satara': 'maharashtra', 'sangli': 'maharashtra', 'solapur': 'maharashtra', 'ahmednagar': 'maharashtra',
+    'jalgaon': 'maharashtra', 'amravati': 'maharashtra', 'latur': 'maharashtra', 'delhi': 'delhi',
+    'new delhi': 'delhi', 'bengaluru': 'karnataka', 'bangalore': 'karnataka', 'chennai': 'tamil nadu',
+    'hyderabad': 'telangana', 'kolkata': 'west bengal', 'ahmedabad': 'gujarat', 'surat': 'gujarat',
+    'rajkot': 'gujarat', 'jaipur': 'rajasthan', 'jodhpur': 'rajasthan', 'lucknow': 'uttar pradesh',
+    'kanpur': 'uttar pradesh', 'varanasi': 'uttar pradesh', 'agra': 'uttar pradesh',
+    'indore': 'madhya pradesh', 'bhopal': 'madhya pradesh', 'ludhiana': 'punjab', 'amritsar': 'punjab',
+    'chandigarh': 'chandigarh', 'karnal': 'haryana', 'guntur': 'andhra pradesh',
+    'vijayawada': 'andhra pradesh', 'visakhapatnam': 'andhra pradesh', 'erode': 'tamil nadu',
+    'coimbatore': 'tamil nadu', 'madurai': 'tamil nadu', 'mysuru': 'karnataka', 'mysore': 'karnataka',
+    'belagavi': 'karnataka', 'hubballi': 'karnataka', 'patna': 'bihar', 'bhubaneswar': 'odisha',
+    'guwahati': 'assam', 'shimla': 'himachal pradesh', 'srinagar': 'jammu and kashmir',
+    'dehradun': 'uttarakhand', 'thiruvananthapuram': 'kerala', 'kochi': 'kerala',
+    'raipur': 'chhattisgarh', 'ranchi': 'jharkhand', 'warangal': 'telangana',
+}
+
+
+def _load_gazetteer():
+    cities = dict(CITIES)
+    path = os.environ.get('AGROLINK_GAZETTEER')
+    if path and os.path.exists(path):
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.reader(f):
+                if len(row) >= 3 and not row[0].startswith('#'):
+                    name = row[0].strip().lower()
+                    cities[name] = (float(row[1]), float(row[2]))
+                    if len(row) >= 4 and row[3].strip():
+                        CITY_STATES[name] = row[3].strip().lower()
+    return cities
+
+
+_CITIES = _load_gazetteer()
+_LONGEST_NAME_WORDS = max(len(name.split()) for name in list(_CITIES) + list(STATES))
+_WORD_RE = re.compile(r"[a-z]+")
+
+
+@lru_cache(maxsize=8192)
+def resolve_location(text):
+    """Resolve free text to (latitude, longitude, matched place, 'city' | 'state'), or None"""
+    if not text:
+        return None
+    words = _WORD_RE.findall(text.lower())
+    best_state = None
+    # Prefer the longest matching place name, and any city over a state
+    for size in range(min(_LONGEST_NAME_WORDS, len(words)), 0, -1):
+        for start in range(len(words) - size + 1):
+            name = ' '.join(words[start:start + size])
+            if name in _CITIES:
+                lat, lon = _CITIES[name]
+                return lat, lon, name, 'city'
+            if best_state is None and name in STATES and name != 'india':
+                best_state = name
+    if best_state is None and 'india' in words:
+        best_state = 'india'
+    if best_state is not None:
+        lat, lon = STATES[best_state]
+        return lat, lon, best_state, 'state'
+    return None
+
+
+def resolve_region(text):
+    """State (title case) that free text resolves to, or None"""
+    location = resolve_location(text)
+    if location is None:
+        return None
+    place, level = location[2], location[3]
+    region = place if level == 'state' else CITY_STATES.get(place)
+    return region.title() if region and region != 'india' else None
+
+
+def geohash_encode(lat, lon, precision=6):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, lon) if even else (lat_range, lat)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def _cell_size(precision):
+    """(latitude degrees, longitude degrees) covered by one geohash cell"""
+    total_bits = 5 * precision
+    lon_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0, a)))
+
+
+def check_point(lat, lon):
+    """Raise ValueError unless (lat, lon) is a finite point on the globe"""
+    if not -90.0 <= lat <= 90.0:
+        raise ValueError("Latitude must be between -90 and 90")
+    if not -180.0 <= lon <= 180.0:
+        raise ValueError("Longitude must be between -180 and 180")
+
+
+def radius_bbox(lat, lon, radius_km):
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    dlon = dlat / max(math.cos(math.radians(lat)), 1e-6)
+    return max(-90.0, lat - dlat), max(-180.0, lon - dlon), min(90.0, lat + dlat), min(180.0, lon + dlon)
+
+
+class GeoIndex:
+    def __init__(self):
+        self._cells = {precision: defaultdict(list) for precision in INDEX_PRECISIONS}
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    def add(self, item_id, lat, lon, category=None):
+        entry = (item_id, lat, lon, category)
+        full_hash = geohash_encode(lat, lon, INDEX_PRECISIONS[-1])
+        with self._lock:
+            for precision in INDEX_PRECISIONS:
+                self._cells[precision][full_hash[:precision]].append(entry)
+            self._count += 1
+
+    def add_many(self, entries):
+        """Index (item id, lat, lon, category) tuples; places repeat, so each one is hashed once"""
+        hashes = {}
+        cells = []
+        for entry in entries:
+            point = entry[1:3]
+            full_hash = hashes.get(point)
+            if full_hash is None:
+                full_hash = hashes[point] = geohash_encode(point[0], point[1], INDEX_PRECISIONS[-1])
+            cells.append(full_hash)
+        with self._lock:
+            for entry, full_hash in zip(entries, cells):
+                for precision in INDEX_PRECISIONS:
+                    self._cells[precision][full_hash[:precision]].append(entry)
+            self._count += len(entries)
+
+    def _covering_cells(self, min_lat, min_lon, max_lat, max_lon):
+        """Pick the finest precision whose covering cell count stays within MAX_QUERY_CELLS"""
+        # Never walk cells outside the globe, whatever box the caller passed
+        min_lat, max_lat = max(min_lat, -90.0), min(max_lat, 90.0)
+        min_lon, max_lon = max(min_lon, -180.0), min(max_lon, 180.0)
+        if not (min_lat <= max_lat and min_lon <= max_lon):
+            return INDEX_PRECISIONS[0], set()
+        for precision in reversed(INDEX_PRECISIONS):
+            cell_lat, cell_lon = _cell_size(precision)
+            rows = int(max_lat // cell_lat - min_lat // cell_lat) + 1
+            cols = int(max_lon // cell_lon - min_lon // cell_lon) + 1
+            if rows * cols <= MAX_QUERY_CELLS or precision == INDEX_PRECISIONS[0]:
+                break
+        cells = set()
+        lat = (min_lat // cell_lat) * cell_lat + cell_lat / 2
+        while lat < max_lat + cell_lat:
+            lon = (min_lon // cell_lon) * cell_lon + cell_lon / 2
+            while lon < max_lon + cell_lon:
+                cells.add(geohash_encode(min(lat, 89.999999), min(lon, 179.999999), precision))
+                lon += cell_lon
+            lat += cell_lat
+        return precision, cells
+
+    def _candidates(self, min_lat, min_lon, max_lat, max_lon, category):
+        precision, cells = self._covering_cells(min_lat, min_lon, max_lat, max_lon)
+        index = self._cells[precision]
+        with self._lock:
+            buckets = [list(index[cell]) for cell in cells if cell in index]
+        for bucket in buckets:
+            for entry in bucket:
+                if category is None or entry[3] == category:
+                    yield entry
+
+    def within_bbox(self, min_lat, min_lon, max_lat, max_lon, category=None, limit=None):
+        """Return [(item id, lat, lon)] inside the box"""
+        check_point(min_lat, min_lon)
+        check_point(max_lat, max_lon)
+        if min_lat > max_lat or min_lon > max_lon:
+            raise ValueError("Bounding box minimums must not exceed its maximums")
+        matches = [(item_id, lat, lon)
+                   for item_id, lat, lon, _ in self._candidates(min_lat, min_lon, max_lat, max_lon, category)
+                   if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon]
+        return matches[:limit] if limit else matches
+
+    def _scan_radius(self, lat, lon, radius_km, category):
+        matches = []
+        for item_id, item_lat, item_lon, _ in self._candidates(*radius_bbox(lat, lon, radius_km), category):
+            distance = haversine_km(lat, lon, item_lat, item_lon)
+            if distance <= radius_km:
+                matches.append((distance, item_id, item_lat, item_lon))
+        matches.sort()
+        return matches
+
+    def within_radius(self, lat, lon, radius_km, category=None, limit=None):
+        """Return [(distance km, item id, lat, lon)] within the radius, nearest first"""
+        check_point(lat, lon)
+        if not 0 < radius_km < math.inf:
+            raise ValueError("radius_km must be a positive number")
+        if limit:
+            # Grow the search ring; once a ring holds ``limit`` points they are the nearest ones
+            for fraction in (0.125, 0.25, 0.5):
+                matches = self._scan_radius(lat, lon, radius_km * fraction, category)
+                if len(matches) >= limit:
+                    return matches[:limit]
+            return self._scan_radius(lat, lon, radius_km, category)[:limit]
+        return self._scan_radius(lat, lon, radius_km, category)
@@ -0,0 +1,168 @@
+"""Idempotency keys for form submissions that create records.
+
+A client sends the same ``Idempotency-Key`` (header or ``idempotency_key``
+form field) on every retry of one submission. The first request runs and
+its response is stored. A retry gets the stored response back without
+running the view again. A retry that arrives while the original is still
+running waits for it instead of racing it.
+
+Keys are kept for AGROLINK_IDEMPOTENCY_TTL seconds (default one day). At most
+AGROLINK_IDEMPOTENCY_ENTRIES keys are kept; the oldest finished ones go first,
+and a key whose request is still running is never evicted to make room.
+Reusing a key with different form data is rejected rather than replayed.
+
+With AGROLINK_SHARED_STATE set, keys live in the shared SQLite file, so a
+retry routed to another worker is still recognised.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from itertools import islice
+
+DEFAULT_TTL = 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 10000
+# How long a retry waits for the original request before giving up
+DEFAULT_WAIT = 10.0
+POLL_INTERVAL = 0.05
+MAX_KEY_LENGTH = 255
+
+NEW = 'new'
+REPLAY = 'replay'
+MISMATCH = 'mismatch'
+IN_PROGRESS = 'in_progress'
+
+
+def request_fingerprint(form, files):
+    """Hash of the submitted fields, and of each upload's name and size"""
+    digest = hashlib.sha256()
+    for name, value in sorted(form.items(multi=True)):
+        if name != 'idempotency_key':
+            digest.update(f"{name}\0{value}\0".encode('utf-8'))
+    for name, upload in sorted(files.items(multi=True), key=lambda item: item[0]):
+        upload.stream.seek(0, os.SEEK_END)
+        size = upload.stream.tell()
+        upload.stream.seek(0)
+        digest.update(f"{name}\0{upload.filename}\0{size}\0".encode('utf-8'))
+    return digest.hexdigest()
+
+
+class StoredResponse:
+    __slots__ = ('status', 'headers', 'body')
+
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+
+class _Entry:
+    __slots__ = ('fingerprint', 'created', 'response', 'done')
+
+    def __init__(self, fingerprint, created):
+        self.fingerprint = fingerprint
+        self.created = created
+        self.response = None
+        self.done = threading.Event()
+
+
+class IdempotencyStore:
+    """Keys of this process, evicted by age and count (oldest first)"""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL, wait=DEFAULT_WAIT):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.wait = wait
+        self._entries = OrderedDict()  # key -> _Entry, oldest first
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _expire(self, now):
+        entries = self._entries
+        while entries and next(iter(entries.values())).created < now - self.ttl:
+            entries.popitem(last=False)
+
+    def _make_room(self):
+        entries = self._entries
+        excess = len(entries) - self.max_entries + 1
+        if excess > 0:
+            # Evicting a running request's key would let a retry run it a second time
+            finished = (key for key, entry in entries.items() if entry.done.is_set())
+            for key in list(islice(finished, excess)):
+                del entries[key]
+
+    def begin(self, key, fingerprint):
+        """(NEW, None) when the caller should run the request, else (REPLAY, response), MISMATCH or IN_PROGRESS"""
+        deadline = time.monotonic() + self.wait
+        while True:
+            with self._lock:
+                now = time.time()
+                self._expire(now)
+                entry = self._entries.get(key)
+                if entry is None:
+                    self._make_room()
+                    self._entries[key] = _Entry(fingerprint, now)
+                    return NEW, None
+            if entry.fingerprint != fingerprint:
+                return MISMATCH, None
+            if not entry.done.wait(max(deadline - time.monotonic(), 0)):
+                return IN_PROGRESS, None
+            if entry.response is not None:
+                return REPLAY, entry.response
+            # The original failed and released the key; try to take it over
+
+    def complete(self, key, response):
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.response = response
+            entry.done.set()
+
+    def abandon(self, key):
+        """Release a key whose request failed, so a retry runs it again"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is not None:
+            entry.done.set()
+
+
+class SharedIdempotencyStore:
+    """Keys shared by every worker through the SharedStore's SQLite file"""
+
+    def __init__(self, store, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL, wait=DEFAULT_WAIT):
+        self.store = store
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.wait = wait
+
+    def begin(self, key, fingerprint):
+        deadline = time.monotonic() + self.wait
+        while True:
+            existing = self.store.reserve_key(key, fingerprint, self.ttl, self.max_entries)
+            if existing is None:
+                return NEW, None
+            stored_fingerprint, status, headers, body = existing
+            if stored_fingerprint != fingerprint:
+                return MISMATCH, None
+            if status is not None:
+                return REPLAY, StoredResponse(status, headers, body)
+            if time.monotonic() >= deadline:
+                return IN_PROGRESS, None
+            # Another worker is still running the original request
+            time.sleep(POLL_INTERVAL)
+
+    def complete(self, key, response):
+        self.store.finish_key(key, response.status, response.headers, response.body)
+
+    def abandon(self, key):
+        self.store.release_key(key)
+
+
+def create_store(shared_store=None):
+    max_entries = int(os.environ.get('AGROLINK_IDEMPOTENCY_ENTRIES', DEFAULT_MAX_ENTRIES))
+    ttl = float(os.environ.get('AGROLINK_IDEMPOTENCY_TTL', DEFAULT_TTL))
+    if shared_store is not None:
+        return SharedIdempotencyStore(shared_store, max_entries, ttl)
+    return IdempotencyStore(max_entries, ttl)
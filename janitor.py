@@ -0,0 +1,147 @@
+"""Background cleanup of image files that no product refers to.
+
+A failed or interrupted upload can leave its original under
+static/uploads/products, or a partial watermarked file (or format variant)
+under static/watermarked. ``UploadJanitor`` reconciles each directory against
+the product store:
+
+- it walks the directory with ``os.scandir``, so no full listing is built;
+- it handles AGROLINK_JANITOR_BATCH entries at a time and sleeps
+  AGROLINK_JANITOR_PAUSE seconds between batches, so a sweep never competes
+  with requests for disk I/O;
+- it removes only unreferenced files older than AGROLINK_JANITOR_MIN_AGE
+  seconds, so uploads still being processed are left alone.
+
+A sweep runs every AGROLINK_JANITOR_INTERVAL seconds on a daemon thread
+(0 disables it). Each sweep reports the files it scanned and removed and the
+bytes it reclaimed.
+"""
+import logging
+import os
+import threading
+import time
+
+from logging_setup import LOGGER_NAME
+from metrics import JANITOR_RECLAIMED_BYTES, JANITOR_REMOVED_FILES
+
+logger = logging.getLogger(f"{LOGGER_NAME}.janitor")
+
+DEFAULT_INTERVAL = 60 * 60
+DEFAULT_MIN_AGE = 60 * 60
+DEFAULT_BATCH = 500
+DEFAULT_PAUSE = 0.05
+
+
+class SweepReport:
+    __slots__ = ('started_at', 'duration', 'scanned', 'removed', 'reclaimed_bytes', 'errors', 'directories')
+
+    def __init__(self, started_at):
+        self.started_at = started_at
+        self.duration = 0.0
+        self.scanned = 0
+        self.removed = 0
+        self.reclaimed_bytes = 0
+        self.errors = 0
+        self.directories = {}  # name -> {'scanned', 'removed', 'reclaimed_bytes'}
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class UploadJanitor:
+    def __init__(self, directories, interval=DEFAULT_INTERVAL, min_age=DEFAULT_MIN_AGE,
+                 batch=DEFAULT_BATCH, pause=DEFAULT_PAUSE, before_sweep=None):
+        # name -> (path, predicate telling whether a file name is still referenced)
+        self.directories = directories
+        self.interval = interval
+        self.min_age = min_age
+        self.batch = batch
+        self.pause = pause
+        self.before_sweep = before_sweep
+        self.last_report = None
+        self.total_removed = 0
+        self.total_reclaimed_bytes = 0
+        self._sweep_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+
+    @classmethod
+    def from_env(cls, directories, before_sweep=None):
+        return cls(directories,
+                   float(os.environ.get('AGROLINK_JANITOR_INTERVAL', DEFAULT_INTERVAL)),
+                   float(os.environ.get('AGROLINK_JANITOR_MIN_AGE', DEFAULT_MIN_AGE)),
+                   int(os.environ.get('AGROLINK_JANITOR_BATCH', DEFAULT_BATCH)),
+                   float(os.environ.get('AGROLINK_JANITOR_PAUSE', DEFAULT_PAUSE)),
+                   before_sweep)
+
+    def _sweep_directory(self, name, path, is_referenced, cutoff, report):
+        stats = report.directories[name] = {'scanned': 0, 'removed': 0, 'reclaimed_bytes': 0}
+        try:
+            entries = os.scandir(path)
+        except FileNotFoundError:
+            return
+        with entries:
+            in_batch = 0
+            for entry in entries:
+                if in_batch >= self.batch:
+                    in_batch = 0
+                    time.sleep(self.pause)
+                in_batch += 1
+                stats['scanned'] += 1
+                try:
+                    if not entry.is_file(follow_symlinks=False) or is_referenced(entry.name):
+                        continue
+                    info = entry.stat(follow_symlinks=False)
+                    if info.st_mtime > cutoff:
+                        continue
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    continue  # removed by another worker's janitor meanwhile
+                except OSError:
+                    report.errors += 1
+                    logger.warning("Could not remove orphaned file", exc_info=True, extra={'path': entry.path})
+                    continue
+                stats['removed'] += 1
+                stats['reclaimed_bytes'] += info.st_size
+                JANITOR_REMOVED_FILES.labels(name).inc()
+                JANITOR_RECLAIMED_BYTES.labels(name).inc(info.st_size)
+        report.scanned += stats['scanned']
+        report.removed += stats['removed']
+        report.reclaimed_bytes += stats['reclaimed_bytes']
+
+    def sweep(self):
+        """Remove every unreferenced file older than ``min_age``; returns a SweepReport"""
+        with self._sweep_lock:
+            report = SweepReport(time.time())
+            start = time.perf_counter()
+            if self.before_sweep is not None:
+                self.before_sweep()
+            cutoff = report.started_at - self.min_age
+            for name, (path, is_referenced) in self.directories.items():
+                self._sweep_directory(name, path, is_referenced, cutoff, report)
+            report.duration = time.perf_counter() - start
+            self.last_report = report
+            self.total_removed += report.removed
+            self.total_reclaimed_bytes += report.reclaimed_bytes
+        if report.removed:
+            logger.info("Removed orphaned image files", extra=report.to_dict())
+        return report
+
+    def start(self):
+        """Sweep every ``interval`` seconds on a daemon thread; later calls do nothing"""
+        if self._thread is not None or self.interval <= 0:
+            return
+
+        def run():
+            while True:
+                time.sleep(self.interval)
+                try:
+                    self.sweep()
+                except Exception:
+                    logger.exception("Orphaned file sweep failed")
+
+        # Concurrent first requests all call start(); only one may create the thread
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=run, name='agrolink-janitor', daemon=True)
+                self._thread.start()
@@ -0,0 +1,106 @@
+"""Structured, non-blocking logging for AgroLink.
+
+Request threads only put records on an in-memory queue; a background
+``QueueListener`` thread formats them as one JSON object per line and writes
+them to stdout. High-volume INFO/DEBUG records can be sampled so that busy
+periods do not flood the output.
+
+Environment variables:
+    AGROLINK_LOG_LEVEL        minimum level for the "agrolink" logger (default INFO)
+    AGROLINK_LOG_INFO_SAMPLE  fraction of INFO/DEBUG records kept (default 1.0)
+"""
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+LOGGER_NAME = 'agrolink'
+
+# Attributes present on every LogRecord; anything else was passed via extra=
+_STANDARD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a fraction of records below WARNING; always keep warnings and errors"""
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or self.rate >= 1.0 or random.random() < self.rate
+
+
+class RequestContextFilter(logging.Filter):
+    """Attach the current request id and route, when logging inside a request"""
+
+    def filter(self, record):
+        try:
+            from flask import g, has_request_context, request
+        except ImportError:
+            return True
+        if has_request_context():
+            if not hasattr(record, 'request_id'):
+                record.request_id = g.get('request_id')
+            if not hasattr(record, 'route'):
+                record.route = request.url_rule.rule if request.url_rule is not None else request.path
+        return True
+
+
+class _DeferredQueueHandler(QueueHandler):
+    # The stock handler formats on the calling thread; only merge the
+    # message arguments here and leave JSON encoding to the listener
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def configure_logging(stream=None):
+    """Install the queue handler on the "agrolink" logger (idempotent)"""
+    global _listener
+    logger = logging.getLogger(LOGGER_NAME)
+    if _listener is not None:
+        return logger
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(float(os.environ.get('AGROLINK_LOG_INFO_SAMPLE', 1.0))))
+    queue_handler.addFilter(RequestContextFilter())
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter())
+
+    logger.addHandler(queue_handler)
+    logger.setLevel(os.environ.get('AGROLINK_LOG_LEVEL', 'INFO').upper())
+    logger.propagate = False
+
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return logger
@@ -0,0 +1,274 @@
+"""Lightweight Prometheus-style metrics for AgroLink.
+
+Counters, gauges and histograms are kept in process memory and rendered in
+the Prometheus text exposition format by ``REGISTRY.render()``. Updates take
+a single per-metric lock, so instrumenting a request costs a few dictionary
+lookups rather than any I/O.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# Latency buckets in seconds, tuned for web requests and image processing
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *labelvalues):
+        """Return the child metric for the given label values"""
+        if len(labelvalues) != len(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}')
+        key = tuple(str(v) for v in labelvalues)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _default(self):
+        if self.labelnames:
+            raise ValueError(f'{self.name} requires labels {self.labelnames}')
+        return self._children[()]
+
+    def collect(self):
+        with self._lock:
+            return list(self._children.items())
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for labelvalues, child in sorted(self.collect()):
+            lines.extend(child.render(self, labelvalues))
+        return lines
+
+
+class _ValueChild:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def render(self, metric, labelvalues):
+        return [f'{metric.name}{_format_labels(metric.labelnames, labelvalues)} {_format_value(self.value)}']
+
+
+class _GaugeChild(_ValueChild):
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value):
+        with self._lock:
+            self.value = value
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        # One slot per bucket plus the implicit +Inf bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def render(self, metric, labelvalues):
+        with self._lock:
+            counts = list(self.counts)
+            total, count = self.sum, self.count
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            labels = _format_labels(metric.labelnames, labelvalues, f'le="{_format_value(bound)}"')
+            lines.append(f'{metric.name}_bucket{labels} {cumulative}')
+        labels = _format_labels(metric.labelnames, labelvalues)
+        lines.append(f'{metric.name}_sum{labels} {_format_value(total)}')
+        lines.append(f'{metric.name}_count{labels} {count}')
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _ValueChild()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def dec(self, amount=1):
+        self._default().dec(amount)
+
+    def set(self, value):
+        self._default().set(value)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """Render every registered metric in Prometheus text format"""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+REQUEST_LATENCY = REGISTRY.histogram(
+    'agrolink_request_duration_seconds', 'HTTP request latency by route',
+    ('method', 'route', 'status'))
+REQUEST_COUNT = REGISTRY.counter(
+    'agrolink_requests_total', 'HTTP requests handled', ('method', 'route', 'status'))
+REQUEST_ERRORS = REGISTRY.counter(
+    'agrolink_request_errors_total', 'HTTP requests that raised or returned 5xx', ('method', 'route'))
+REQUESTS_IN_FLIGHT = REGISTRY.gauge(
+    'agrolink_requests_in_flight', 'HTTP requests currently being served', ('route',))
+WATERMARK_STAGE_LATENCY = REGISTRY.histogram(
+    'agrolink_watermark_stage_seconds', 'Watermark pipeline time by stage', ('stage',))
+WATERMARK_ENCODE_LATENCY = REGISTRY.histogram(
+    'agrolink_watermark_encode_seconds', 'Watermark encode time by output format', ('format',))
+WATERMARK_ENCODED_BYTES = REGISTRY.counter(
+    'agrolink_watermark_encoded_bytes_total', 'Bytes written by watermark encodes by output format', ('format',))
+DB_OPERATION_LATENCY = REGISTRY.histogram(
+    'agrolink_db_operation_seconds', 'Database operation latency', ('operation',))
+QR_CACHE_LOOKUPS = REGISTRY.counter(
+    'agrolink_qr_cache_lookups_total', 'QR code cache lookups by result (memory, disk, miss)', ('result',))
+IDEMPOTENT_REQUESTS = REGISTRY.counter(
+    'agrolink_idempotent_requests_total',
+    'Requests carrying an Idempotency-Key by outcome (new, replay, mismatch, in_progress)', ('result',))
+UPLOAD_ADMISSIONS = REGISTRY.counter(
+    'agrolink_upload_admissions_total',
+    'Image uploads by admission result (admitted, queued, per_farmer, busy, too_large, invalid)', ('result',))
+UPLOAD_QUEUE_WAIT = REGISTRY.histogram(
+    'agrolink_upload_queue_wait_seconds', 'Time image uploads waited for a processing slot')
+UPLOADS_ACTIVE = REGISTRY.gauge(
+    'agrolink_uploads_active', 'Image uploads currently being processed')
+DUPLICATE_PHOTOS = REGISTRY.counter(
+    'agrolink_duplicate_photos_total', "Uploaded photos resembling another farmer's photo")
+JANITOR_REMOVED_FILES = REGISTRY.counter(
+    'agrolink_janitor_removed_files_total', 'Orphaned image files removed by directory', ('directory',))
+JANITOR_RECLAIMED_BYTES = REGISTRY.counter(
+    'agrolink_janitor_reclaimed_bytes_total', 'Bytes reclaimed from orphaned image files by directory', ('directory',))
+LEDGER_AUDITS = REGISTRY.counter(
+    'agrolink_ledger_audits_total', 'Ledger integrity audits by result (ok, mismatch)', ('result',))
+ANCHOR_BATCHES = REGISTRY.counter(
+    'agrolink_anchor_batches_total', 'Merkle anchoring batches by result (anchored, failed)', ('result',))
+ANCHORED_PRODUCTS = REGISTRY.counter(
+    'agrolink_anchored_products_total', 'Products covered by an anchored Merkle root')
+
+
+def timed(histogram, *labelvalues):
+    """Decorator observing the wrapped function's runtime on ``histogram``"""
+    child = histogram.labels(*labelvalues)
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
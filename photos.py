@@ -0,0 +1,116 @@
+"""Perceptual hashes of product photos and a multi-index table for near-duplicate lookups.
+
+``perceptual_hash`` is the DCT pHash of an image. It takes the 8x8 lowest
+frequencies of a 32x32 greyscale thumbnail, and each bit records whether one
+coefficient is above their median. Re-encoding, resizing, mild crops and colour
+changes move a hash by only a few of its 64 bits, so a reused photo stays
+within a small Hamming distance of the original.
+
+``PhotoIndex`` is a multi-index hash table. Each hash is split into four
+16-bit chunks, and each chunk position has its own table. If two hashes are
+within ``k`` bits, at least one of their chunks is within ``k // 4`` bits. A
+query therefore looks up the few chunk values near each of its own chunks and
+checks only the photos found there, instead of every stored photo. (A BK-tree
+does poorly here: 64-bit hashes sit about 32 bits apart, so a query still
+visits most of the tree.) Past MAX_INDEXED_RADIUS the chunk neighbourhoods
+grow too large to enumerate, so wider queries scan every hash instead.
+"""
+import math
+import threading
+from itertools import combinations
+
+HASH_SIZE = 8
+HASH_BITS = HASH_SIZE * HASH_SIZE
+CHUNKS = 4
+THUMBNAIL_SIZE = 32
+DEFAULT_MATCH_DISTANCE = 10
+# Widest per-chunk radius looked up through the tables (2517 flip masks per chunk)
+MAX_INDEXED_RADIUS = 4
+
+# DCT-II basis, restricted to the frequencies the hash keeps
+_COSINES = [[math.cos((2 * x + 1) * u * math.pi / (2 * THUMBNAIL_SIZE)) for x in range(THUMBNAIL_SIZE)]
+            for u in range(HASH_SIZE)]
+
+
+def perceptual_hash(img):
+    """64-bit DCT hash of a PIL image"""
+    from PIL import Image
+    thumbnail = img.convert('L').resize((THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.LANCZOS)
+    pixels = list(thumbnail.getdata())
+    rows = [pixels[y * THUMBNAIL_SIZE:(y + 1) * THUMBNAIL_SIZE] for y in range(THUMBNAIL_SIZE)]
+    # Separable transform: rows first, then columns, low frequencies only
+    row_coefficients = [[sum(c * p for c, p in zip(basis, row)) for basis in _COSINES] for row in rows]
+    coefficients = [sum(basis[y] * row_coefficients[y][u] for y in range(THUMBNAIL_SIZE))
+                    for basis in _COSINES for u in range(HASH_SIZE)]
+    # The DC term is the average brightness; leave it out of the median
+    ac = sorted(coefficients[1:])
+    median = ac[len(ac) // 2]
+    fingerprint = 0
+    for coefficient in coefficients:
+        fingerprint = (fingerprint << 1) | (coefficient > median)
+    return fingerprint
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+def _flip_masks(bits, radius):
+    """Every mask of at most ``radius`` set bits within ``bits`` bits"""
+    masks = []
+    for count in range(radius + 1):
+        for positions in combinations(range(bits), count):
+            masks.append(sum(1 << position for position in positions))
+    return masks
+
+
+class PhotoIndex:
+    """Product photo hashes, searchable by Hamming distance"""
+
+    def __init__(self, chunks=CHUNKS):
+        self.chunks = chunks
+        self.chunk_bits = HASH_BITS // chunks
+        self._tables = [{} for _ in range(chunks)]   # chunk value -> product ids
+        self._by_id = {}                            # product id -> hash
+        self._masks = [_flip_masks(self.chunk_bits, radius) for radius in range(MAX_INDEXED_RADIUS + 1)]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def fingerprint(self, product_id):
+        return self._by_id.get(product_id)
+
+    def _split(self, fingerprint):
+        mask = (1 << self.chunk_bits) - 1
+        return [(fingerprint >> (index * self.chunk_bits)) & mask for index in range(self.chunks)]
+
+    def add(self, product_id, fingerprint):
+        with self._lock:
+            self._by_id[product_id] = fingerprint
+            for table, value in zip(self._tables, self._split(fingerprint)):
+                table.setdefault(value, []).append(product_id)
+
+    def near(self, fingerprint, max_distance=DEFAULT_MATCH_DISTANCE):
+        """(product id, distance) of every photo within ``max_distance`` bits, closest first"""
+        if not 0 <= max_distance <= HASH_BITS:
+            raise ValueError(f"max_distance must be between 0 and {HASH_BITS}")
+        # A hash within max_distance bits is within this many bits in at least one chunk
+        radius = max_distance // self.chunks
+        with self._lock:
+            if radius <= MAX_INDEXED_RADIUS:
+                candidates = set()
+                for table, value in zip(self._tables, self._split(fingerprint)):
+                    for mask in self._masks[radius]:
+                        ids = table.get(value ^ mask)
+                        if ids:
+                            candidates.update(ids)
+            else:
+                candidates = self._by_id
+            matches = []
+            for product_id in candidates:
+                distance = hamming(fingerprint, self._by_id[product_id])
+                if distance <= max_distance:
+                    matches.append((product_id, distance))
+        matches.sort(key=lambda match: (match[1], match[0]))
+        return matches
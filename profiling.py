@@ -0,0 +1,135 @@
+"""Opt-in sampling profiler for AgroLink routes.
+
+A single background thread periodically captures the Python stack of every
+request thread that has been selected for profiling and aggregates the
+samples per route as collapsed stacks (``frame;frame;frame count``), the
+input format of flamegraph.pl and speedscope.
+
+Nothing runs until the first request is profiled, and requests that are not
+selected pay only for a flag check, so leaving the hook installed is free.
+
+Environment variables:
+    AGROLINK_PROFILE           enable sampling of ordinary requests ("1")
+    AGROLINK_PROFILE_RATE      fraction of requests to profile (default 0.01)
+    AGROLINK_PROFILE_INTERVAL  seconds between stack samples (default 0.005)
+"""
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+# Header an admin can send to force profiling of a single request
+PROFILE_HEADER = 'X-AgroLink-Profile'
+
+# Distinct stacks kept per route before new ones are folded together
+MAX_STACKS_PER_ROUTE = 5000
+TRUNCATED_STACK = '[truncated]'
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse_stack(frame):
+    """Return the root-first collapsed representation of ``frame``'s stack"""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return ';'.join(labels)
+
+
+class SamplingProfiler:
+    def __init__(self, enabled=False, sample_rate=0.01, interval=0.005):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self._active = {}
+        self._stacks = defaultdict(Counter)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            enabled=os.environ.get('AGROLINK_PROFILE', '') not in ('', '0', 'false'),
+            sample_rate=float(os.environ.get('AGROLINK_PROFILE_RATE', 0.01)),
+            interval=float(os.environ.get('AGROLINK_PROFILE_INTERVAL', 0.005)),
+        )
+
+    def should_sample(self):
+        """Decide whether an ordinary request should be profiled"""
+        return self.enabled and random.random() < self.sample_rate
+
+    def start(self, route):
+        """Begin sampling the calling thread under ``route``"""
+        with self._lock:
+            self._active[threading.get_ident()] = route
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='agrolink-profiler', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def stop(self):
+        """Stop sampling the calling thread"""
+        with self._lock:
+            self._active.pop(threading.get_ident(), None)
+
+    def _run(self):
+        sampler_ident = threading.get_ident()
+        while True:
+            with self._lock:
+                active = list(self._active.items())
+            if not active:
+                self._wakeup.clear()
+                # Re-check after clearing so a concurrent start() is not lost
+                with self._lock:
+                    idle = not self._active
+                if idle:
+                    self._wakeup.wait()
+                continue
+
+            frames = sys._current_frames()
+            samples = []
+            for ident, route in active:
+                frame = frames.get(ident)
+                if frame is not None and ident != sampler_ident:
+                    samples.append((route, collapse_stack(frame)))
+            del frames
+
+            with self._lock:
+                for route, stack in samples:
+                    stacks = self._stacks[route]
+                    if stack not in stacks and len(stacks) >= MAX_STACKS_PER_ROUTE:
+                        stack = TRUNCATED_STACK
+                    stacks[stack] += 1
+            time.sleep(self.interval)
+
+    def routes(self):
+        """Return the total sample count collected for each route"""
+        with self._lock:
+            return {route: sum(stacks.values()) for route, stacks in self._stacks.items()}
+
+    def collapsed(self, route=None):
+        """Render collapsed stacks for one route, or all routes with the route as root frame"""
+        with self._lock:
+            if route is not None:
+                items = [(stack, count) for stack, count in self._stacks.get(route, {}).items()]
+            else:
+                items = [(f"{name};{stack}", count)
+                         for name, stacks in self._stacks.items()
+                         for stack, count in stacks.items()]
+        items.sort()
+        return ''.join(f"{stack} {count}\n" for stack, count in items)
+
+    def reset(self):
+        with self._lock:
+            self._stacks.clear()
+
+
+PROFILER = SamplingProfiler.from_env()
@@ -0,0 +1,242 @@
+"""QR code rendering for product verification links.
+
+Each code is rendered once for a given (data, format, size). The bytes go into
+a bounded in-memory LRU and a content-addressed disk cache, so later requests
+and restarts skip the encoder. The cache key doubles as the HTTP ETag.
+Printable label sheets render their missing codes in a process pool and are
+written to the PDF one page at a time, so only one page bitmap is held.
+"""
+import hashlib
+import io
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import qrcode
+from qrcode.constants import ERROR_CORRECT_M
+from PIL import Image, ImageDraw, ImageFont
+
+from metrics import QR_CACHE_LOOKUPS
+
+FORMATS = {'png': 'image/png', 'svg': 'image/svg+xml'}
+DEFAULT_SIZE = 256
+MIN_SIZE = 64
+MAX_SIZE = 2048
+BORDER = 4  # quiet zone, in modules
+
+DEFAULT_MEMORY_BYTES = 8 * 1024 * 1024
+
+# A4 at 300 dpi, 3 x 7 labels per page
+SHEET_SIZE = (2480, 3508)
+SHEET_MARGIN = 60
+LABEL_COLUMNS = 3
+LABEL_ROWS = 7
+LABEL_QR_SIZE = 300
+
+# Below this many uncached codes a label sheet renders inline
+PARALLEL_THRESHOLD = 16
+
+
+def qr_matrix(data):
+    qr = qrcode.QRCode(error_correction=ERROR_CORRECT_M, border=BORDER)
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr.get_matrix()
+
+
+def render_png(matrix, size):
+    modules = len(matrix)
+    img = Image.new('1', (modules, modules), 1)
+    img.putdata([0 if dark else 1 for row in matrix for dark in row])
+    # Scale by a whole number of pixels per module and pad to the requested size,
+    # so every module has the same width
+    scale = max(size // modules, 1)
+    img = img.resize((modules * scale, modules * scale), Image.NEAREST)
+    if img.width != size:
+        canvas = Image.new('1', (size, size), 1)
+        offset = (size - img.width) // 2
+        canvas.paste(img, (offset, offset))
+        img = canvas
+    buf = io.BytesIO()
+    img.save(buf, 'PNG', optimize=True)
+    return buf.getvalue()
+
+
+def render_svg(matrix, size):
+    modules = len(matrix)
+    # One subpath per horizontal run of dark modules
+    path = []
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < modules:
+            if not row[x]:
+                x += 1
+                continue
+            start = x
+            while x < modules and row[x]:
+                x += 1
+            path.append(f"M{start} {y}h{x - start}v1H{start}z")
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{size}" height="{size}" '
+            f'viewBox="0 0 {modules} {modules}" shape-rendering="crispEdges">'
+            f'<rect width="{modules}" height="{modules}" fill="#fff"/>'
+            f'<path d="{"".join(path)}" fill="#000"/></svg>').encode()
+
+
+RENDERERS = {'png': render_png, 'svg': render_svg}
+
+
+def render(data, fmt, size):
+    return RENDERERS[fmt](qr_matrix(data), size)
+
+
+def _render_job(job):
+    # Top-level so it can be pickled into pool workers
+    return render(*job)
+
+
+def cache_key(data, fmt, size):
+    return hashlib.sha256(f"{fmt}:{size}:{data}".encode()).hexdigest()
+
+
+def _load_font(size):
+    for name in ("arial.ttf", "DejaVuSans.ttf"):
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    return ImageFont.load_default()
+
+
+def _save_page(page, buf):
+    """Write one page to the PDF in ``buf``; later pages are appended as incremental updates"""
+    page.save(buf, 'PDF', resolution=300.0, append=buf.tell() > 0)
+
+
+class QRCodeService:
+    def __init__(self, cache_dir, max_memory_bytes=DEFAULT_MEMORY_BYTES, workers=None):
+        self.cache_dir = cache_dir
+        self.max_memory_bytes = max_memory_bytes
+        self.workers = workers or os.cpu_count() or 1
+        self._memory = OrderedDict()  # key -> bytes, least recently used first
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._pool = None
+
+    @classmethod
+    def from_env(cls, cache_dir):
+        return cls(cache_dir,
+                   int(os.environ.get('AGROLINK_QR_CACHE_BYTES', DEFAULT_MEMORY_BYTES)),
+                   int(os.environ.get('AGROLINK_QR_WORKERS', 0)) or None)
+
+    def get(self, data, fmt='png', size=DEFAULT_SIZE):
+        """Return (rendered bytes, cache key) for ``data``"""
+        if fmt not in FORMATS:
+            raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+        if not MIN_SIZE <= size <= MAX_SIZE:
+            raise ValueError(f"size must be between {MIN_SIZE} and {MAX_SIZE}")
+        key = cache_key(data, fmt, size)
+        body = self._lookup(key, fmt)
+        if body is None:
+            body = render(data, fmt, size)
+            self._store(key, fmt, body)
+        return body, key
+
+    def get_many(self, items, fmt='png', size=DEFAULT_SIZE):
+        """Render a list of data strings, farming cache misses out to worker processes"""
+        keys = [cache_key(data, fmt, size) for data in items]
+        bodies = [self._lookup(key, fmt) for key in keys]
+        missing = [i for i, body in enumerate(bodies) if body is None]
+        jobs = [(items[i], fmt, size) for i in missing]
+        if len(jobs) >= PARALLEL_THRESHOLD and self.workers > 1:
+            chunksize = max(len(jobs) // (self.workers * 4), 1)
+            rendered = self._get_pool().map(_render_job, jobs, chunksize=chunksize)
+        else:
+            rendered = map(_render_job, jobs)
+        for i, body in zip(missing, rendered):
+            self._store(keys[i], fmt, body)
+            bodies[i] = body
+        return bodies
+
+    def label_sheet(self, labels):
+        """Render a multi-page PDF of labels, each a dict with url, title and lines"""
+        codes = self.get_many([label['url'] for label in labels], 'png', LABEL_QR_SIZE)
+        per_page = LABEL_COLUMNS * LABEL_ROWS
+        cell_width = (SHEET_SIZE[0] - 2 * SHEET_MARGIN) // LABEL_COLUMNS
+        cell_height = (SHEET_SIZE[1] - 2 * SHEET_MARGIN) // LABEL_ROWS
+        title_font, text_font = _load_font(40), _load_font(30)
+
+        buf = io.BytesIO()
+        page = None
+        for index, (label, code) in enumerate(zip(labels, codes)):
+            if index % per_page == 0:
+                if page is not None:
+                    _save_page(page, buf)
+                page = Image.new('L', SHEET_SIZE, 255)
+                draw = ImageDraw.Draw(page)
+            row, column = divmod(index % per_page, LABEL_COLUMNS)
+            left = SHEET_MARGIN + column * cell_width
+            top = SHEET_MARGIN + row * cell_height
+            draw.rectangle([left, top, left + cell_width - 1, top + cell_height - 1], outline=200)
+            page.paste(Image.open(io.BytesIO(code)), (left + (cell_width - LABEL_QR_SIZE) // 2, top + 10))
+            text_y = top + LABEL_QR_SIZE + 15
+            draw.text((left + 20, text_y), label['title'][:32], font=title_font, fill=0)
+            for line in label.get('lines', ()):
+                text_y += 34
+                draw.text((left + 20, text_y), line[:40], font=text_font, fill=60)
+
+        _save_page(page if page is not None else Image.new('L', SHEET_SIZE, 255), buf)
+        return buf.getvalue()
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                # Forking a threaded server copies locks held by other threads; start clean workers instead
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+            return self._pool
+
+    def _path(self, key, fmt):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.{fmt}")
+
+    def _lookup(self, key, fmt):
+        with self._lock:
+            body = self._memory.get(key)
+            if body is not None:
+                self._memory.move_to_end(key)
+                QR_CACHE_LOOKUPS.labels('memory').inc()
+                return body
+        try:
+            with open(self._path(key, fmt), 'rb') as f:
+                body = f.read()
+        except FileNotFoundError:
+            QR_CACHE_LOOKUPS.labels('miss').inc()
+            return None
+        QR_CACHE_LOOKUPS.labels('disk').inc()
+        self._remember(key, body)
+        return body
+
+    def _store(self, key, fmt, body):
+        path = self._path(key, fmt)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so concurrent readers never see a partial file
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+        self._remember(key, body)
+
+    def _remember(self, key, body):
+        if len(body) > self.max_memory_bytes:
+            return
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_bytes -= len(previous)
+            self._memory[key] = body
+            self._memory_bytes += len(body)
+            while self._memory_bytes > self.max_memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
@@ -0,0 +1,181 @@
+"""Compact record types for farmers and products.
+
+Records use ``__slots__`` instead of per-instance dicts, intern the small
+set of strings that repeat across millions of rows (category, unit, status,
+locations, harvest dates), keep timestamps as epoch floats and the product
+hash as raw bytes. Display strings such as ``added_date``, ``qr_code`` and
+``blockchain_hash`` are derived on access, so they cost nothing until a
+record is serialized.
+
+Records still support ``record['field']`` and ``record.get('field')`` so
+routes and templates can treat them like the dicts they replace.
+"""
+import hashlib
+import sys
+import time
+from datetime import datetime, timezone
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def format_timestamp(timestamp):
+    return time.strftime(DATE_FORMAT, time.localtime(timestamp))
+
+
+def product_hash(product_name, farmer_id, added_at):
+    """Record hash of a product: first 8 bytes of SHA-256 over its name, farmer and insertion time in UTC"""
+    added = datetime.fromtimestamp(added_at, timezone.utc).isoformat()
+    return hashlib.sha256(f"{product_name}{farmer_id}{added}".encode()).digest()[:8]
+
+
+class _Record:
+    __slots__ = ()
+    # Serialized field order; derived fields are properties
+    _fields = ()
+    # Fields left out of to_dict() while they are None
+    _optional = ()
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key) from None
+
+    def __contains__(self, key):
+        return key in self._fields and getattr(self, key, None) is not None
+
+    def get(self, key, default=None):
+        value = getattr(self, key, default) if isinstance(key, str) else default
+        return default if value is None else value
+
+    def to_dict(self):
+        data = {}
+        for field in self._fields:
+            value = getattr(self, field)
+            if value is None and field in self._optional:
+                continue
+            data[field] = value
+        return data
+
+    def __repr__(self):
+        return f"{type(self).__name__}(id={self.id!r})"
+
+    def to_state(self):
+        """Every stored slot as JSON-friendly values, for the shared store"""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_state(cls, state):
+        return cls(**state)
+
+
+class FarmerRecord(_Record):
+    __slots__ = ('id', 'name', 'email', 'phone', 'address', 'farm_size', 'crops',
+                 'registered_at', 'block_number', 'status', 'latitude', 'longitude')
+    _fields = ('name', 'email', 'phone', 'address', 'farm_size', 'crops', 'id',
+               'registration_date', 'blockchain_hash', 'status', 'block_number',
+               'latitude', 'longitude')
+    _optional = ('latitude', 'longitude')
+
+    def __init__(self, id, name, email, phone, address, farm_size, crops,
+                 registered_at, block_number, status='active', latitude=None, longitude=None):
+        self.id = id
+        self.name = _intern(name)
+        self.email = email
+        self.phone = phone
+        self.address = _intern(address)
+        self.farm_size = farm_size
+        self.crops = crops
+        self.registered_at = registered_at
+        self.block_number = block_number
+        self.status = _intern(status)
+        self.latitude = latitude
+        self.longitude = longitude
+
+    @classmethod
+    def from_form(cls, data, id, block_number, registered_at):
+        return cls(id, data['name'], data.get('email', ''), data.get('phone', ''),
+                   data.get('address', ''), data.get('farm_size', ''), data.get('crops', ''),
+                   registered_at, block_number)
+
+    @property
+    def registration_date(self):
+        return format_timestamp(self.registered_at)
+
+    @property
+    def blockchain_hash(self):
+        return f"0x{self.id:08x}ABC123"
+
+
+class ProductRecord(_Record):
+    __slots__ = ('id', 'product_name', 'category', 'quantity', 'unit', 'harvest_date',
+                 'price_per_unit', 'farmer_id', 'farm_location', 'description', 'farmer_name',
+                 'image_filename', 'added_at', 'hash_digest', 'block_number', 'status',
+                 'latitude', 'longitude', 'image_phash')
+    _fields = ('product_name', 'category', 'quantity', 'unit', 'harvest_date', 'price_per_unit',
+               'farmer_id', 'farm_location', 'description', 'farmer_name', 'image_filename',
+               'id', 'added_date', 'blockchain_hash', 'block_number', 'status', 'qr_code',
+               'latitude', 'longitude')
+    _optional = ('image_filename', 'latitude', 'longitude')
+
+    def __init__(self, id, product_name, category, quantity, unit, harvest_date, price_per_unit,
+                 farmer_id, farm_location, description, farmer_name, image_filename,
+                 added_at, block_number, hash_digest=None, status='active', latitude=None, longitude=None,
+                 image_phash=None):
+        self.id = id
+        self.product_name = product_name
+        self.category = _intern(category)
+        self.quantity = quantity
+        self.unit = _intern(unit)
+        self.harvest_date = _intern(harvest_date)
+        self.price_per_unit = price_per_unit
+        self.farmer_id = farmer_id
+        self.farm_location = _intern(farm_location)
+        self.description = description
+        self.farmer_name = _intern(farmer_name)
+        self.image_filename = image_filename
+        self.added_at = added_at
+        self.block_number = block_number
+        self.status = _intern(status)
+        self.latitude = latitude
+        self.longitude = longitude
+        # Perceptual hash of the uploaded photo (see photos.py)
+        self.image_phash = image_phash
+        self.hash_digest = hash_digest if hash_digest is not None else self.compute_hash()
+
+    @classmethod
+    def from_form(cls, data, id, block_number, added_at):
+        return cls(id, data['product_name'], data['category'], data['quantity'], data['unit'],
+                   data['harvest_date'], data.get('price_per_unit', ''), data['farmer_id'],
+                   data['farm_location'], data.get('description', ''), data.get('farmer_name', ''),
+                   data.get('image_filename'), added_at, block_number,
+                   image_phash=data.get('image_phash'))
+
+    def to_state(self):
+        state = super().to_state()
+        state['hash_digest'] = self.hash_digest.hex()
+        return state
+
+    @classmethod
+    def from_state(cls, state):
+        return cls(**dict(state, hash_digest=bytes.fromhex(state['hash_digest'])))
+
+    def compute_hash(self):
+        """Recompute the record hash from its content"""
+        return product_hash(self.product_name, self.farmer_id, self.added_at)
+
+    @property
+    def added_date(self):
+        return format_timestamp(self.added_at)
+
+    @property
+    def blockchain_hash(self):
+        return f"0x{self.hash_digest.hex()}"
+
+    @property
+    def qr_code(self):
+        return f"QR{self.id:06d}"
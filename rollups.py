@@ -0,0 +1,198 @@
+"""Time-bucketed product rollups with retention.
+
+Each product is added to day, ISO-week and month buckets on two time axes,
+when it was added (``added``) and when it was harvested (``harvest``).
+Within a bucket, stats are kept per (category, region). Range queries read
+only the buckets in the range and never touch product records. Buckets older
+than the retention window for their granularity, counted back from today,
+are dropped. Dates are user input, so a far-future harvest date only adds
+its own bucket and never pushes the window forward.
+
+Retention is configured with AGROLINK_ROLLUP_RETENTION, e.g.
+``day=90,week=104,month=0`` (bucket counts; 0 keeps buckets forever).
+"""
+import heapq
+import os
+import threading
+from datetime import date, timedelta
+
+from aggregates import GroupStats, to_number
+
+GRANULARITIES = ('day', 'week', 'month')
+AXES = ('added', 'harvest')
+ROLLUP_DIMENSIONS = ('category', 'region')
+
+DEFAULT_RETENTION = {'day': 90, 'week': 104, 'month': 0}
+
+UNKNOWN_REGION = 'Unknown'
+
+
+def bucket_start(day, granularity):
+    """First day of the bucket containing ``day``"""
+    if granularity == 'day':
+        return day
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def buckets_back(day, granularity, count):
+    """Start of the bucket ``count`` buckets before the one containing ``day``"""
+    if granularity == 'day':
+        return day - timedelta(days=count)
+    if granularity == 'week':
+        return bucket_start(day, 'week') - timedelta(weeks=count)
+    months = day.year * 12 + day.month - 1 - count
+    return date(months // 12, months % 12 + 1, 1)
+
+
+def parse_retention(value):
+    retention = dict(DEFAULT_RETENTION)
+    for item in filter(None, (part.strip() for part in (value or '').split(','))):
+        granularity, _, count = item.partition('=')
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown rollup granularity: {granularity}")
+        retention[granularity] = int(count)
+    return retention
+
+
+class _Series:
+    """Buckets for one (granularity, axis) pair"""
+
+    def __init__(self, granularity, retention):
+        self.granularity = granularity
+        self.retention = retention
+        self.buckets = {}  # bucket ordinal -> {(category, region): GroupStats}
+        self._ordinals = []  # min-heap of bucket ordinals, for eviction
+
+    def cell(self, day, cell_key):
+        """Stats for ``cell_key`` in the bucket holding ``day``, or None if that bucket has expired"""
+        start = bucket_start(day, self.granularity).toordinal()
+        cells = self.buckets.get(start)
+        if cells is None:
+            horizon = self.horizon()
+            if horizon is not None and start < horizon:
+                return None
+            cells = self.buckets[start] = {}
+            heapq.heappush(self._ordinals, start)
+            self.evict(horizon)
+        stats = cells.get(cell_key)
+        if stats is None:
+            stats = cells[cell_key] = GroupStats()
+        return stats
+
+    def horizon(self):
+        """Ordinal of the oldest bucket kept, or None when buckets are kept forever"""
+        if not self.retention:
+            return None
+        return buckets_back(date.today(), self.granularity, self.retention - 1).toordinal()
+
+    def evict(self, horizon):
+        if horizon is None:
+            return
+        while self._ordinals and self._ordinals[0] < horizon:
+            self.buckets.pop(heapq.heappop(self._ordinals), None)
+
+
+class ProductRollups:
+    def __init__(self, retention=None):
+        self.retention = dict(DEFAULT_RETENTION, **(retention or {}))
+        self._series = {(granularity, axis): _Series(granularity, self.retention[granularity])
+                        for granularity in GRANULARITIES for axis in AXES}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(parse_retention(os.environ.get('AGROLINK_ROLLUP_RETENTION')))
+
+    def add(self, product, region=None):
+        days = {'added': date.fromtimestamp(product['added_at'])}
+        try:
+            days['harvest'] = date.fromisoformat(product.get('harvest_date') or '')
+        except ValueError:
+            pass
+        cell_key = (product['category'], region or UNKNOWN_REGION)
+        unit = product['unit']
+        quantity = to_number(product['quantity'])
+        price = to_number(product.get('price_per_unit'))
+        harvest_date = product.get('harvest_date')
+
+        with self._lock:
+            for (granularity, axis), series in self._series.items():
+                if axis in days:
+                    stats = series.cell(days[axis], cell_key)
+                    if stats is not None:
+                        stats.add(unit, quantity, price, harvest_date)
+
+    def add_many(self, items):
+        """Fold in (product, region) pairs at once; same result as ``add`` for each"""
+        # Products are grouped by (day, cell) per axis first, then merged into every granularity
+        by_axis = {axis: {} for axis in AXES}
+        harvest_days = {}
+        for product, region in items:
+            harvest_date = product.get('harvest_date')
+            days = {'added': date.fromtimestamp(product['added_at'])}
+            harvest_day = harvest_days.get(harvest_date, False)
+            if harvest_day is False:
+                try:
+                    harvest_day = date.fromisoformat(harvest_date or '')
+                except ValueError:
+                    harvest_day = None
+                harvest_days[harvest_date] = harvest_day
+            if harvest_day is not None:
+                days['harvest'] = harvest_day
+            cell_key = (product['category'], region or UNKNOWN_REGION)
+            for axis, day in days.items():
+                stats = by_axis[axis].get((day, cell_key))
+                if stats is None:
+                    stats = by_axis[axis][(day, cell_key)] = GroupStats()
+                stats.add(product['unit'], to_number(product['quantity']),
+                          to_number(product.get('price_per_unit')), harvest_date)
+
+        with self._lock:
+            for (granularity, axis), series in self._series.items():
+                for (day, cell_key), source in by_axis[axis].items():
+                    stats = series.cell(day, cell_key)
+                    if stats is not None:
+                        stats.merge(source)
+
+    def query(self, granularity='day', axis='added', start=None, end=None,
+              category=None, region=None, group_by=()):
+        """Return [{'bucket': 'YYYY-MM-DD', 'groups': [...]}] for buckets starting in [start, end]"""
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+        if axis not in AXES:
+            raise ValueError(f"axis must be one of {', '.join(AXES)}")
+        unknown = [d for d in group_by if d not in ROLLUP_DIMENSIONS]
+        if unknown:
+            raise ValueError(f"Unknown dimension(s): {', '.join(unknown)}")
+
+        low = bucket_start(start, granularity).toordinal() if start else None
+        high = end.toordinal() if end else None
+        series = self._series[(granularity, axis)]
+        rows = []
+        with self._lock:
+            # Buckets age out as days pass, not only when new ones arrive
+            series.evict(series.horizon())
+            for ordinal in sorted(series.buckets):
+                if (low is not None and ordinal < low) or (high is not None and ordinal > high):
+                    continue
+                merged = {}
+                for (cell_category, cell_region), stats in series.buckets[ordinal].items():
+                    if category and cell_category != category:
+                        continue
+                    if region and cell_region.lower() != region.lower():
+                        continue
+                    values = {'category': cell_category, 'region': cell_region}
+                    key = tuple(values[d] for d in group_by)
+                    target = merged.get(key)
+                    if target is None:
+                        target = merged[key] = GroupStats()
+                    target.merge(stats)
+                if merged:
+                    rows.append({
+                        'bucket': date.fromordinal(ordinal).isoformat(),
+                        'groups': [dict(zip(group_by, key), **stats.to_dict()) for key, stats in merged.items()],
+                    })
+        return rows
+
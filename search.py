@@ -0,0 +1,247 @@
+"""In-process full-text and faceted search over products.
+
+An inverted index maps each term to the products containing it, weighted by
+the field it came from. Queries are ranked with BM25, the last query term is
+treated as a prefix (search-as-you-type), and terms that are not in the
+vocabulary are corrected to terms within one edit via a deletion index
+(the SymSpell technique), so lookups never scan the vocabulary. Facet
+counts by category and unit are computed over the matching set.
+
+The index is updated incrementally from ``AgroLinkDatabase.add_product``;
+``add_many`` indexes a whole catalog at once and sorts the vocabulary once.
+"""
+import bisect
+import heapq
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+
+# Field weights applied to term frequencies
+FIELD_WEIGHTS = {
+    'product_name': 3.0,
+    'category': 2.0,
+    'farmer_name': 1.5,
+    'farm_location': 1.0,
+    'description': 1.0,
+}
+
+FACET_FIELDS = ('category', 'unit')
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Shortest term considered for typo correction, and prefix expansion limit
+MIN_TYPO_LENGTH = 4
+MAX_PREFIX_EXPANSIONS = 50
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(text.lower()) if text else []
+
+
+def _deletes(term):
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+def _within_one_edit(a, b):
+    """True if a and b differ by at most one insertion, deletion, substitution or transposition"""
+    if a == b:
+        return True
+    la, lb = len(a), len(b)
+    if abs(la - lb) > 1:
+        return False
+    if la == lb:
+        diffs = [i for i in range(la) if a[i] != b[i]]
+        if len(diffs) == 1:
+            return True
+        return (len(diffs) == 2 and diffs[1] == diffs[0] + 1
+                and a[diffs[0]] == b[diffs[1]] and a[diffs[1]] == b[diffs[0]])
+    if la > lb:
+        a, b = b, a
+    # b is one character longer than a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i:] == b[i + 1:]
+
+
+class ProductSearchIndex:
+    def __init__(self):
+        self._postings = defaultdict(dict)  # term -> {product id: weighted term frequency}
+        self._doc_lengths = {}
+        self._total_length = 0.0
+        self._facets = {}  # product id -> (category, unit)
+        self._vocabulary = []  # sorted, for prefix lookups
+        self._deletions = defaultdict(set)  # deletion variant -> terms
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._doc_lengths)
+
+    @staticmethod
+    def _weigh(product, tokens=None):
+        weighted = Counter()
+        for field, weight in FIELD_WEIGHTS.items():
+            text = product.get(field) or ''
+            terms = tokens.get(text) if tokens is not None else None
+            if terms is None:
+                terms = tokenize(text)
+                if tokens is not None:
+                    tokens[text] = terms
+            for term in terms:
+                weighted[term] += weight
+        return weighted
+
+    def _insert(self, product, weighted, new_terms):
+        """Add postings under the lock; returns terms seen for the first time via ``new_terms``"""
+        product_id = product['id']
+        for term, frequency in weighted.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term]
+                new_terms.append(term)
+            postings[product_id] = frequency
+        length = sum(weighted.values())
+        self._doc_lengths[product_id] = length
+        self._total_length += length
+        self._facets[product_id] = tuple(product.get(field) for field in FACET_FIELDS)
+
+    def _add_terms(self, terms):
+        for term in terms:
+            if len(term) >= MIN_TYPO_LENGTH:
+                for variant in _deletes(term):
+                    self._deletions[variant].add(term)
+
+    def add(self, product):
+        """Index a product record (or dict with the indexed fields)"""
+        weighted = self._weigh(product)
+        with self._lock:
+            new_terms = []
+            self._insert(product, weighted, new_terms)
+            for term in new_terms:
+                bisect.insort(self._vocabulary, term)
+            self._add_terms(new_terms)
+
+    def add_many(self, products):
+        """Index many products at once, e.g. when loading a snapshot"""
+        # Field values repeat across a catalog (categories, farmers, places), so each is tokenized once
+        tokens = {}
+        weighted = [self._weigh(product, tokens) for product in products]
+        with self._lock:
+            new_terms = []
+            for product, product_weights in zip(products, weighted):
+                self._insert(product, product_weights, new_terms)
+            new_terms.sort()
+            self._vocabulary = list(heapq.merge(self._vocabulary, new_terms))
+            self._add_terms(new_terms)
+
+    def _expand_prefix(self, prefix):
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        terms = []
+        for term in self._vocabulary[start:start + MAX_PREFIX_EXPANSIONS]:
+            if not term.startswith(prefix):
+                break
+            terms.append(term)
+        return terms
+
+    def _correct(self, term):
+        if len(term) < MIN_TYPO_LENGTH:
+            return []
+        candidates = set(self._deletions.get(term, ()))
+        for variant in _deletes(term):
+            if variant in self._postings:
+                candidates.add(variant)
+            candidates.update(self._deletions.get(variant, ()))
+        return [c for c in candidates if _within_one_edit(term, c)]
+
+    def _resolve(self, term, is_prefix):
+        """Map a query term to the indexed terms it should match"""
+        if term in self._postings:
+            terms = [term]
+        else:
+            terms = self._correct(term)
+        if is_prefix:
+            terms = list(dict.fromkeys(terms + self._expand_prefix(term)))
+        return terms
+
+    def _term_weights(self, term, matched, doc_count):
+        """Return [(postings, idf * boost)] for the indexed terms matching a query term"""
+        weights = []
+        for indexed_term in matched:
+            postings = self._postings[indexed_term]
+            idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            # Corrected and prefix-expanded terms rank below exact matches
+            boost = 1.0 if indexed_term == term else 0.5
+            weights.append((postings, idf * boost))
+        return weights
+
+    def search(self, query, category=None, unit=None, limit=20, offset=0):
+        """Return (ranked [(product id, score)], total matches, facet counts, corrected terms)"""
+        query_terms = list(dict.fromkeys(tokenize(query)))
+        with self._lock:
+            doc_count = len(self._doc_lengths) or 1
+            average_length = self._total_length / doc_count or 1.0
+            doc_lengths = self._doc_lengths
+            k1_b = K1 * B / average_length
+            k1_1b = K1 * (1 - B)
+
+            expansions = {}
+            weighted_terms = []
+            for position, term in enumerate(query_terms):
+                matched = self._resolve(term, is_prefix=position == len(query_terms) - 1)
+                expansions[term] = matched
+                weights = self._term_weights(term, matched, doc_count)
+                weighted_terms.append((sum(len(postings) for postings, _ in weights), weights))
+
+            if not query_terms:
+                scores = dict.fromkeys(doc_lengths, 0.0)
+            else:
+                # Score the rarest term over its postings, then only re-check surviving
+                # candidates against the remaining terms (AND semantics)
+                weighted_terms.sort(key=lambda item: item[0])
+                scores = {}
+                for postings, weight in weighted_terms[0][1]:
+                    weight *= K1 + 1
+                    term_scores = {product_id: weight * frequency / (frequency + k1_1b + k1_b * doc_lengths[product_id])
+                                   for product_id, frequency in postings.items()}
+                    if scores:
+                        for product_id, score in term_scores.items():
+                            scores[product_id] = scores.get(product_id, 0.0) + score
+                    else:
+                        scores = term_scores
+                for _, weights in weighted_terms[1:]:
+                    if not scores:
+                        break
+                    narrowed = {}
+                    for product_id, score in scores.items():
+                        term_score = 0.0
+                        norm = k1_1b + k1_b * doc_lengths[product_id]
+                        for postings, weight in weights:
+                            frequency = postings.get(product_id)
+                            if frequency is not None:
+                                term_score += weight * frequency * (K1 + 1) / (frequency + norm)
+                        if term_score:
+                            narrowed[product_id] = score + term_score
+                    scores = narrowed
+
+            facets = {field: Counter() for field in FACET_FIELDS}
+            matches = []
+            for product_id, score in scores.items():
+                values = self._facets[product_id]
+                if category and values[0] != category:
+                    continue
+                if unit and values[1] != unit:
+                    continue
+                matches.append((score, product_id))
+            for field, counts in zip(FACET_FIELDS, zip(*(self._facets[pid] for _, pid in matches))):
+                facets[field].update(counts)
+
+        # Highest score first, ties broken by newest product
+        top = heapq.nlargest(offset + limit, matches)[offset:]
+        corrections = {term: terms for term, terms in expansions.items() if terms != [term]}
+        return ([(product_id, score) for score, product_id in top], len(matches),
+                {field: dict(counts.most_common()) for field, counts in facets.items()}, corrections)
@@ -0,0 +1,151 @@
+"""Shared state for running several app workers (e.g. gunicorn -w N).
+
+Set AGROLINK_SHARED_STATE to a SQLite file path and every worker process
+writes its inserts to the same append-only change log there. Each append
+allocates the record id and block number in the same ``BEGIN IMMEDIATE``
+transaction that logs the change, so ids and blocks are unique and gap-free
+across processes.
+
+Workers keep their in-memory records and indexes. Before each request they
+check ``PRAGMA data_version``, a per-connection counter that moves when
+another connection commits. Only then do they replay the changes logged
+since their last sequence number. A worker that starts late or restarts
+replays the whole log and reaches the same view.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    record_id INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS claims (
+    name TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS idempotency (
+    key TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    created REAL NOT NULL,
+    status INTEGER,
+    headers TEXT,
+    body BLOB
+);
+CREATE INDEX IF NOT EXISTS idempotency_created ON idempotency (created);
+"""
+
+# Block numbers continue from the simulated chain height
+INITIAL_BLOCK = 12847
+
+BUSY_TIMEOUT = 30.0
+
+
+class SharedStore:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+            conn.execute("INSERT OR IGNORE INTO counters VALUES ('block', ?)", (INITIAL_BLOCK,))
+
+    @classmethod
+    def from_env(cls):
+        path = os.environ.get('AGROLINK_SHARED_STATE')
+        return cls(path) if path else None
+
+    def _connection(self):
+        # One connection per thread and process; a forked worker must not reuse its parent's
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+            self._local.data_version = None
+        return conn
+
+    def _next(self, conn, name):
+        conn.execute("INSERT OR IGNORE INTO counters VALUES (?, 0)", (name,))
+        conn.execute("UPDATE counters SET value = value + 1 WHERE name = ?", (name,))
+        return conn.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()[0]
+
+    def append(self, kind, build):
+        """Allocate an id and block for ``kind``, log ``build(id, block)`` and return the record"""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            record_id = self._next(conn, kind)
+            block_number = self._next(conn, 'block')
+            record = build(record_id, block_number)
+            conn.execute("INSERT INTO changes (kind, record_id, data) VALUES (?, ?, ?)",
+                         (kind, record_id, json.dumps(record.to_state())))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return record
+
+    def claim(self, name):
+        """True for exactly one caller across all workers, e.g. to seed sample data once"""
+        cursor = self._connection().execute("INSERT OR IGNORE INTO claims VALUES (?)", (name,))
+        return cursor.rowcount == 1
+
+    def reserve_key(self, key, fingerprint, ttl, max_entries):
+        """Claim an idempotency key; returns None if claimed, else its (fingerprint, status, headers, body)
+
+        Status is None while the request that claimed the key is still running.
+        """
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            now = time.time()
+            conn.execute("DELETE FROM idempotency WHERE created < ?", (now - ttl,))
+            row = conn.execute("SELECT fingerprint, status, headers, body FROM idempotency WHERE key = ?",
+                               (key,)).fetchone()
+            if row is None:
+                cursor = conn.execute("INSERT INTO idempotency (key, fingerprint, created) VALUES (?, ?, ?)",
+                                      (key, fingerprint, now))
+                # Rowids grow with insertion, so this drops the oldest finished keys beyond the bound
+                conn.execute("DELETE FROM idempotency WHERE rowid <= ? AND status IS NOT NULL",
+                             (cursor.lastrowid - max_entries,))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        if row is None:
+            return None
+        fingerprint, status, headers, body = row
+        return fingerprint, status, json.loads(headers) if headers else None, body
+
+    def finish_key(self, key, status, headers, body):
+        self._connection().execute("UPDATE idempotency SET status = ?, headers = ?, body = ? WHERE key = ?",
+                                   (status, json.dumps(headers), body, key))
+
+    def release_key(self, key):
+        self._connection().execute("DELETE FROM idempotency WHERE key = ? AND status IS NULL", (key,))
+
+    def changed(self):
+        """Whether another connection has committed since this thread last looked"""
+        conn = self._connection()
+        version = conn.execute('PRAGMA data_version').fetchone()[0]
+        if version == self._local.data_version:
+            return False
+        self._local.data_version = version
+        return True
+
+    def changes_since(self, seq):
+        """Yield (seq, kind, state dict) for every change after ``seq``, oldest first"""
+        rows = self._connection().execute(
+            "SELECT seq, kind, data FROM changes WHERE seq > ? ORDER BY seq", (seq,))
+        for row_seq, kind, data in rows:
+            yield row_seq, kind, json.loads(data)
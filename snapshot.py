@@ -0,0 +1,292 @@
+"""Columnar snapshots of the farmer and product catalog.
+
+A snapshot stores each record field as one column, so export and import
+handle whole arrays at a time instead of one JSON object per record.
+
+With the optional ``pyarrow`` package, a snapshot is a directory holding
+farmers.parquet, products.parquet and snapshot.json, readable by any Arrow or
+Parquet tool. Without it, a snapshot is a single binary file that is read
+through ``mmap``:
+
+    magic (8 bytes) | header length (u64) | JSON header | column buffers
+
+Each buffer starts on an 8-byte boundary. The header lists every column's
+kind and where its buffers are:
+
+- int, uint, float: packed 64-bit values, plus a validity byte per row if
+  the column has nulls;
+- dict (repeated strings such as category or location): int32 codes into
+  a dictionary kept in the header, with -1 for null;
+- str: UTF-8 text with int64 character offsets, so rows are slices of one
+  decoded string;
+- bytes: raw data with int64 byte offsets;
+- json: anything else, as JSON text in the str layout.
+
+Loading a column is then one ``memoryview.cast`` plus ``tolist``, and
+records are built column by column through their constructors.
+"""
+import array
+import importlib.util
+import inspect
+import json
+import mmap
+import os
+import struct
+import sys
+
+MAGIC = b'AGSNAP\x00\x01'
+VERSION = 1
+ALIGNMENT = 8
+TABLES = ('farmers', 'products')
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+# A string column is dictionary-encoded when it repeats at least this much
+DICTIONARY_RATIO = 4
+
+
+def available_formats():
+    # Only locate pyarrow here; it is slow to import, so that waits for the first Parquet snapshot
+    return ('parquet', 'binary') if importlib.util.find_spec('pyarrow') is not None else ('binary',)
+
+
+def column_kind(values):
+    present = [value for value in values if value is not None]
+    types = {type(value) for value in present}
+    if not types:
+        return 'json'
+    if types == {int}:
+        if INT64_MIN <= min(present) and max(present) <= INT64_MAX:
+            return 'int'
+        if min(present) >= 0 and max(present) < 2 ** 64:
+            return 'uint'
+    elif types == {float}:
+        return 'float'
+    elif types == {str}:
+        return 'dict' if len(set(present)) * DICTIONARY_RATIO <= len(present) else 'str'
+    elif types == {bytes}:
+        return 'bytes'
+    return 'json'
+
+
+def _columns(records, record_class):
+    """(name, values) per stored slot of ``record_class``"""
+    return [(name, [getattr(record, name) for record in records]) for name in record_class.__slots__]
+
+
+def _build(record_class, names, columns, rows):
+    """Records from column lists, passed positionally in constructor order"""
+    parameters = list(inspect.signature(record_class).parameters.values())
+    by_name = dict(zip(names, columns))
+    ordered = []
+    for parameter in parameters:
+        if parameter.name in by_name:
+            ordered.append(by_name[parameter.name])
+        elif parameter.default is not inspect.Parameter.empty:
+            ordered.append([parameter.default] * rows)
+        else:
+            raise ValueError(f"Snapshot has no {parameter.name!r} column for {record_class.__name__}")
+    return list(map(record_class, *ordered))
+
+
+# Binary layout
+
+class _Buffers:
+    """Column buffers laid out back to back, each 8-byte aligned"""
+
+    def __init__(self):
+        self.chunks = []
+        self.offset = 0
+
+    def add(self, data):
+        padding = -self.offset % ALIGNMENT
+        if padding:
+            self.chunks.append(b'\0' * padding)
+            self.offset += padding
+        start = self.offset
+        self.chunks.append(data)
+        self.offset += len(data)
+        return [start, len(data)]
+
+
+def _pack(code, values):
+    return array.array(code, values).tobytes()
+
+
+def _encode_column(buffers, name, values):
+    kind = column_kind(values)
+    column = {'name': name, 'kind': kind}
+    if kind in ('int', 'uint', 'float'):
+        code, fill = {'int': ('q', 0), 'uint': ('Q', 0), 'float': ('d', 0.0)}[kind]
+        column['values'] = buffers.add(_pack(code, [fill if value is None else value for value in values]))
+        if None in values:
+            column['valid'] = buffers.add(bytes(value is not None for value in values))
+    elif kind == 'dict':
+        dictionary = {}
+        codes = [-1 if value is None else dictionary.setdefault(value, len(dictionary)) for value in values]
+        column['dictionary'] = list(dictionary)
+        column['values'] = buffers.add(_pack('i', codes))
+    else:
+        if kind == 'json':
+            values = [None if value is None else json.dumps(value) for value in values]
+        offsets = [0]
+        total = 0
+        for value in values:
+            total += len(value) if value is not None else 0
+            offsets.append(total)
+        if kind == 'bytes':
+            data = b''.join(value for value in values if value is not None)
+        else:
+            data = ''.join(value for value in values if value is not None).encode('utf-8')
+        column['offsets'] = buffers.add(_pack('q', offsets))
+        column['values'] = buffers.add(data)
+        if None in values:
+            column['valid'] = buffers.add(bytes(value is not None for value in values))
+    return column
+
+
+def _write_binary(path, tables, state):
+    header = {'version': VERSION, 'state': state, 'tables': {}}
+    buffers = _Buffers()
+    for table, (rows, columns) in tables.items():
+        header['tables'][table] = {
+            'rows': rows,
+            'columns': [_encode_column(buffers, name, values) for name, values in columns],
+        }
+    encoded = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    # Pad the header so the buffers after it stay aligned
+    encoded += b' ' * (-(len(MAGIC) + 8 + len(encoded)) % ALIGNMENT)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(MAGIC + struct.pack('<Q', len(encoded)) + encoded)
+        f.writelines(buffers.chunks)
+    os.replace(temp_path, path)
+
+
+def _decode_column(view, base, column):
+    kind = column['kind']
+
+    def buffer(key):
+        start, length = column[key]
+        return view[base + start:base + start + length]
+
+    if kind in ('int', 'uint', 'float'):
+        values = buffer('values').cast({'int': 'q', 'uint': 'Q', 'float': 'd'}[kind]).tolist()
+    elif kind == 'dict':
+        lookup = [sys.intern(value) for value in column['dictionary']] + [None]
+        return [lookup[code] for code in buffer('values').cast('i').tolist()]
+    else:
+        offsets = buffer('offsets').cast('q').tolist()
+        data = bytes(buffer('values'))
+        if kind != 'bytes':
+            data = data.decode('utf-8')
+        values = [data[start:end] for start, end in zip(offsets, offsets[1:])]
+        if kind == 'json':
+            values = [json.loads(value) if value else None for value in values]
+    if 'valid' in column:
+        values = [value if valid else None for value, valid in zip(values, bytes(buffer('valid')))]
+    return values
+
+
+def _read_binary(path):
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                if bytes(view[:len(MAGIC)]) != MAGIC:
+                    raise ValueError(f"{path} is not an AgroLink snapshot")
+                (header_length,) = struct.unpack_from('<Q', mapped, len(MAGIC))
+                base = len(MAGIC) + 8
+                header = json.loads(bytes(view[base:base + header_length]))
+                base += header_length
+                tables = {}
+                for table, spec in header['tables'].items():
+                    names = [column['name'] for column in spec['columns']]
+                    columns = [_decode_column(view, base, column) for column in spec['columns']]
+                    tables[table] = (spec['rows'], names, columns)
+            finally:
+                view.release()
+    return tables, header['state']
+
+
+# Arrow / Parquet layout
+
+def _write_parquet(path, tables, state):
+    import pyarrow
+    import pyarrow.parquet
+    os.makedirs(path, exist_ok=True)
+    kinds = {}
+    for table, (rows, columns) in tables.items():
+        arrays, names = [], []
+        kinds[table] = {}
+        for name, values in columns:
+            kind = column_kind(values)
+            kinds[table][name] = kind
+            if kind == 'json':
+                values = [None if value is None else json.dumps(value) for value in values]
+            arrow_type = {'int': pyarrow.int64(), 'uint': pyarrow.uint64(), 'float': pyarrow.float64(),
+                          'dict': pyarrow.string(), 'str': pyarrow.string(), 'json': pyarrow.string(),
+                          'bytes': pyarrow.binary()}[kind]
+            array = pyarrow.array(values, type=arrow_type)
+            arrays.append(array.dictionary_encode() if kind == 'dict' else array)
+            names.append(name)
+        pyarrow.parquet.write_table(pyarrow.Table.from_arrays(arrays, names=names),
+                                    os.path.join(path, f"{table}.parquet"))
+    with open(os.path.join(path, 'snapshot.json'), 'w') as f:
+        json.dump({'version': VERSION, 'state': state, 'kinds': kinds}, f)
+
+
+def _read_parquet(path):
+    import pyarrow
+    import pyarrow.parquet
+    with open(os.path.join(path, 'snapshot.json')) as f:
+        meta = json.load(f)
+    tables = {}
+    for table in TABLES:
+        data = pyarrow.parquet.read_table(os.path.join(path, f"{table}.parquet"), memory_map=True)
+        names, columns = [], []
+        for name in data.column_names:
+            column = data.column(name).combine_chunks()
+            if pyarrow.types.is_dictionary(column.type):
+                # Decode through the dictionary rather than one Python string per row
+                lookup = [sys.intern(value) for value in column.dictionary.to_pylist()] + [None]
+                values = [lookup[code] for code in column.indices.fill_null(-1).to_pylist()]
+            else:
+                values = column.to_pylist()
+            if meta['kinds'][table][name] == 'json':
+                values = [None if value is None else json.loads(value) for value in values]
+            names.append(name)
+            columns.append(values)
+        tables[table] = (data.num_rows, names, columns)
+    return tables, meta['state']
+
+
+def write_snapshot(path, farmers, products, state, format=None):
+    """Write the records column-wise; ``format`` is 'parquet' or 'binary' (default: the best available)"""
+    from records import FarmerRecord, ProductRecord
+    format = format or available_formats()[0]
+    if format not in available_formats():
+        raise ValueError(f"Snapshot format {format!r} is not available; install pyarrow for parquet")
+    tables = {
+        'farmers': (len(farmers), _columns(farmers, FarmerRecord)),
+        'products': (len(products), _columns(products, ProductRecord)),
+    }
+    if format == 'parquet':
+        _write_parquet(path, tables, state)
+    else:
+        _write_binary(path, tables, state)
+    return format
+
+
+def read_snapshot(path):
+    """(farmers, products, state) from a snapshot written by ``write_snapshot``"""
+    from records import FarmerRecord, ProductRecord
+    if os.path.isdir(path):
+        if 'parquet' not in available_formats():
+            raise ValueError(f"{path} is a Parquet snapshot; install pyarrow to read it")
+        tables, state = _read_parquet(path)
+    else:
+        tables, state = _read_binary(path)
+    rows, names, columns = tables['farmers']
+    farmers = _build(FarmerRecord, names, columns, rows)
+    rows, names, columns = tables['products']
+    products = _build(ProductRecord, names, columns, rows)
+    return farmers, products, state
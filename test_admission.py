@@ -0,0 +1,148 @@
+import io
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from admission import AdmissionRejected, UploadAdmission
+
+MB = 1024 * 1024
+
+
+def hold(admission, farmer_id, cost, started, release, results):
+    # Runs on its own thread; keeps the slot (or its queue place) until released
+    try:
+        with admission.admit(farmer_id, cost):
+            started.set()
+            release.wait(5)
+        results.append('done')
+    except AdmissionRejected as e:
+        results.append(e.status)
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_limits():
+    admission = UploadAdmission(max_active=1, memory_budget=10 * MB, per_farmer=1, max_waiting=1, wait_timeout=5)
+    started, release, results = threading.Event(), threading.Event(), []
+    running = threading.Thread(target=hold, args=(admission, 1, MB, started, release, results))
+    queued = threading.Thread(target=hold, args=(admission, 2, MB, threading.Event(), release, results))
+    running.start()
+    assert started.wait(5)
+    queued.start()
+    wait_for(lambda: admission.waiting == 1)
+
+    with pytest.raises(AdmissionRejected) as per_farmer:
+        with admission.admit(1, MB):
+            pass
+    assert per_farmer.value.status == 429 and per_farmer.value.retry_after >= 1
+
+    with pytest.raises(AdmissionRejected) as busy:
+        admission.check_capacity()
+    assert busy.value.status == 503 and busy.value.retry_after >= 2
+    with pytest.raises(AdmissionRejected) as queue_full:
+        with admission.admit(3, MB):
+            pass
+    assert queue_full.value.status == 503
+
+    with pytest.raises(AdmissionRejected) as too_large:
+        with admission.admit(3, 11 * MB):
+            pass
+    assert too_large.value.status == 413 and too_large.value.retry_after is None
+
+    release.set()
+    running.join(5)
+    queued.join(5)
+    assert results == ['done', 'done']
+    assert admission.active == admission.memory_in_use == admission.waiting == 0
+
+
+def test_queue_timeout():
+    admission = UploadAdmission(max_active=1, memory_budget=10 * MB, max_waiting=4, wait_timeout=0.05)
+    started, release, results = threading.Event(), threading.Event(), []
+    running = threading.Thread(target=hold, args=(admission, 1, MB, started, release, results))
+    running.start()
+    assert started.wait(5)
+    with pytest.raises(AdmissionRejected) as timed_out:
+        with admission.admit(2, MB):
+            pass
+    assert timed_out.value.status == 503 and admission.waiting == 0
+    release.set()
+    running.join(5)
+
+
+def image(size):
+    from PIL import Image
+    buf = io.BytesIO()
+    Image.new('RGB', size, (120, 160, 60)).save(buf, 'PNG')
+    return buf.getvalue()
+
+
+def product_form(farmer_id, photo):
+    return {'product_name': 'Tomatoes', 'category': 'Vegetables', 'quantity': '20', 'unit': 'kg',
+            'harvest_date': '2026-10-01', 'farmer_id': str(farmer_id), 'farm_location': 'Pune',
+            'product_image': (io.BytesIO(photo), 'tomatoes.png')}
+
+
+def test_add_product_limits(monkeypatch, tmp_path):
+    monkeypatch.setenv('AGROLINK_LOG_LEVEL', 'CRITICAL')
+    for name in ('AGROLINK_SHARED_STATE', 'AGROLINK_SNAPSHOT'):
+        monkeypatch.delenv(name, raising=False)
+    for name, value in (('CONCURRENCY', '1'), ('MEMORY_MB', '1'), ('PER_FARMER', '1'),
+                        ('QUEUE', '1'), ('QUEUE_TIMEOUT', '5')):
+        monkeypatch.setenv(f'AGROLINK_UPLOAD_{name}', value)
+    import app as app_module
+    database = app_module.AgroLinkDatabase()
+    for name in ('Ravi Kumar', 'Meena Devi'):
+        database.add_farmer({'name': name})
+    app = app_module.create_app({'UPLOAD_FOLDER': str(tmp_path / 'uploads'),
+                                 'WATERMARKED_FOLDER': str(tmp_path / 'watermarked')}, database)
+
+    # Uploads stall in the watermarking step until released
+    started, release = threading.Event(), threading.Event()
+    add_watermark = app_module.add_watermark
+
+    def slow_watermark(*args):
+        started.set()
+        release.wait(5)
+        return add_watermark(*args)
+
+    monkeypatch.setattr(app_module, 'add_watermark', slow_watermark)
+    small, statuses = image((64, 64)), []
+
+    def upload(farmer_id):
+        statuses.append(app.test_client().post('/add_product', data=product_form(farmer_id, small)).status_code)
+
+    uploads = [threading.Thread(target=upload, args=(1,))]
+    uploads[0].start()
+    assert started.wait(5)
+    uploads.append(threading.Thread(target=upload, args=(2,)))
+    uploads[1].start()
+    admission = app.extensions['agrolink_upload_admission']
+    wait_for(lambda: admission.waiting == 1)
+
+    client = app.test_client()
+    per_farmer = client.post('/add_product', data=product_form(1, small))
+    assert per_farmer.status_code == 429 and int(per_farmer.headers['Retry-After']) >= 1
+    busy = client.post('/add_product', data=product_form(3, small))
+    assert busy.status_code == 503 and int(busy.headers['Retry-After']) >= 1
+    assert busy.get_json()['success'] is False
+
+    # 300x300 RGB decodes to more than the 1 MB budget, whatever the queue holds
+    too_large = client.post('/add_product', data=product_form(3, image((300, 300))))
+    assert too_large.status_code == 413 and 'Retry-After' not in too_large.headers
+
+    release.set()
+    for thread in uploads:
+        thread.join(10)
+    assert statuses == [200, 200]
+    assert database.get_product_count() == 2
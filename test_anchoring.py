@@ -0,0 +1,120 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from anchoring import (DEFAULT_ARTIFACT, ChainAnchor, inclusion_proof, leaf_hash, tree_levels,
+                       verify_proof)
+
+CHAIN_URL = os.environ.get('AGROLINK_CHAIN_URL', 'http://127.0.0.1:7545')
+PRODUCTS = 40
+
+
+def add_products(client, count):
+    for i in range(count):
+        response = client.post('/add_product', data={
+            'product_name': f'Basmati Rice {i}',
+            'category': 'Grains',
+            'quantity': '50',
+            'unit': 'kg',
+            'harvest_date': '2026-10-01',
+            'price_per_unit': '80',
+            'farmer_id': '1',
+            'farm_location': 'Karnal',
+        })
+        assert response.get_json()['success']
+
+
+def make_client(monkeypatch, chain=None):
+    monkeypatch.setenv('AGROLINK_ANCHOR_INTERVAL', '3600')
+    monkeypatch.setenv('AGROLINK_ADMIN_TOKEN', 'test-token')
+    monkeypatch.setenv('AGROLINK_LOG_LEVEL', 'WARNING')
+    monkeypatch.delenv('AGROLINK_CHAIN_URL', raising=False)  # the chain is passed in explicitly
+    import app as app_module
+    database = app_module.AgroLinkDatabase()
+    database.anchor.chain = chain
+    return app_module.create_app(database=database).test_client(), database
+
+
+def test_proofs_for_every_tree_shape():
+    for size in range(1, 34):
+        leaves = [bytes([size, i]) * 16 for i in range(size)]
+        levels = tree_levels(leaves)
+        root = levels[-1][0]
+        for index, leaf in enumerate(leaves):
+            proof = inclusion_proof(levels, index)
+            assert verify_proof(leaf, index, size, proof, root)
+            assert not verify_proof(b'\xff' * 32, index, size, proof, root)
+            assert not verify_proof(leaf, index, size, proof + [root], root)
+            if size > 1:
+                assert not verify_proof(leaf, (index + 1) % size, size, proof, root)
+
+
+def test_products_are_anchored_in_one_batch(monkeypatch):
+    client, database = make_client(monkeypatch)
+    add_products(client, PRODUCTS)
+    assert client.get('/api/products/1/proof').status_code == 202
+
+    headers = {'X-Admin-Token': 'test-token'}
+    batch = client.post('/admin/anchor', headers=headers).get_json()['batch']
+    assert batch['size'] == PRODUCTS
+    assert client.post('/admin/anchor', headers=headers).get_json()['batch'] is None
+
+    root = bytes.fromhex(batch['root'][2:])
+    for product_id in range(1, PRODUCTS + 1):
+        proof = client.get(f'/api/products/{product_id}/proof').get_json()
+        leaf = leaf_hash(database.get_product_by_id(product_id))
+        assert proof['leaf'] == f"0x{leaf.hex()}"
+        nodes = [bytes.fromhex(node[2:]) for node in proof['proof']]
+        assert verify_proof(leaf, proof['index'], batch['size'], nodes, root)
+
+    scan = client.get('/verify/QR000001').get_json()
+    assert scan['blockchain']['anchor']['root'] == batch['root']
+
+
+def local_chain():
+    """web3, the SupplyChain artifact and a funded account on a local node (Ganache), or skip"""
+    web3_module = pytest.importorskip('web3')
+    web3 = web3_module.Web3(web3_module.Web3.HTTPProvider(CHAIN_URL))
+    if not web3.is_connected():
+        pytest.skip(f"no local chain at {CHAIN_URL}")
+    artifact_path = os.environ.get('AGROLINK_CONTRACT_ARTIFACT', DEFAULT_ARTIFACT)
+    if not os.path.exists(artifact_path):
+        pytest.skip(f"compile SupplyChain.sol first (e.g. truffle compile); {artifact_path} is missing")
+    with open(artifact_path) as f:
+        artifact = json.load(f)
+    return web3, artifact, web3.eth.accounts[0]
+
+
+def test_anchor_on_local_chain(monkeypatch):
+    web3, artifact, account = local_chain()
+    factory = web3.eth.contract(abi=artifact['abi'], bytecode=artifact['bytecode'])
+    receipt = web3.eth.wait_for_transaction_receipt(factory.constructor().transact({'from': account}))
+    contract = web3.eth.contract(address=receipt['contractAddress'], abi=artifact['abi'])
+    chain = ChainAnchor(web3, contract, account)
+
+    client, database = make_client(monkeypatch, chain)
+    add_products(client, PRODUCTS)
+    batch = client.post('/admin/anchor', headers={'X-Admin-Token': 'test-token'}).get_json()['batch']
+    assert batch['tx_hash'] and batch['chain_batch_id'] == contract.functions.batchCounter().call()
+    stored_root, size, _ = contract.functions.batches(batch['chain_batch_id']).call()
+    assert f"0x{stored_root.hex()}" == batch['root'] and size == PRODUCTS
+
+    for product_id in range(1, PRODUCTS + 1):
+        assert client.get(f'/api/products/{product_id}/proof?onchain=1').get_json()['onchain_verified']
+    anchored, index = database.anchor.locate(1)
+    assert not chain.verify(anchored.chain_batch_id, b'\xff' * 32, index, anchored.proof(index))
+
+    # One anchoring transaction against one createProduct per product
+    anchor_gas = web3.eth.get_transaction_receipt(batch['tx_hash'])['gasUsed']
+    contract.functions.registerStakeholder('Farmer', 0).transact({'from': account})
+    tx_hash = contract.functions.createProduct('Basmati Rice', 'Karnal', 80).transact({'from': account})
+    product_gas = web3.eth.wait_for_transaction_receipt(tx_hash)['gasUsed']
+    assert anchor_gas * 10 < product_gas * PRODUCTS
+
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-v']))
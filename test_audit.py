@@ -0,0 +1,85 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import snapshot
+from audit import audit_database, run_audit
+from records import FarmerRecord, ProductRecord
+
+
+@pytest.fixture
+def zone(monkeypatch):
+    def set_zone(name):
+        monkeypatch.setenv('TZ', name)
+        time.tzset()
+    yield set_zone
+    monkeypatch.undo()
+    time.tzset()
+
+
+def make_catalog(count):
+    farmer = FarmerRecord(1, 'Rajesh Kumar', 'farmer@example.com', '', 'Karnal', '5.0', 'Rice', 1.7e9, 12848)
+    products = []
+    for i in range(1, count + 1):
+        added_at = 1.7e9 + i * 3600
+        products.append(ProductRecord(
+            i, f'Basmati Rice {i}', 'Grains', '50', 'kg', '2026-10-01', '80', 1, 'Karnal', '', farmer.name,
+            None, added_at, 12848 + i))
+    return [farmer], products
+
+
+def result(events):
+    return list(events)[-1]
+
+
+def load_database(monkeypatch):
+    monkeypatch.setenv('AGROLINK_LOG_LEVEL', 'WARNING')
+    for name in ('AGROLINK_SHARED_STATE', 'AGROLINK_ANCHOR_INTERVAL', 'AGROLINK_SNAPSHOT'):
+        monkeypatch.delenv(name, raising=False)
+    import app as app_module
+    return app_module.AgroLinkDatabase()
+
+
+def test_audit_passes_in_another_time_zone(zone, tmp_path):
+    zone('Asia/Kolkata')
+    farmers, products = make_catalog(50)
+    path = str(tmp_path / 'catalog.agsnap')
+    snapshot.write_snapshot(path, farmers, products, {}, 'binary')
+    assert result(run_audit(products, workers=1))['ok']
+
+    zone('UTC')
+    _, loaded, _ = snapshot.read_snapshot(path)
+    assert result(run_audit(loaded, workers=1))['ok']
+
+    products[20].hash_digest = b'\0' * 8
+    mismatch = result(run_audit(products, workers=1))['mismatch']
+    assert mismatch['kind'] == 'product_hash' and mismatch['product_id'] == 21
+
+
+def test_concurrent_inserts_keep_block_order(monkeypatch):
+    database = load_database(monkeypatch)
+    form = {'product_name': 'Basmati Rice', 'category': 'Grains', 'quantity': '50', 'unit': 'kg',
+            'harvest_date': '2026-10-01', 'farmer_id': 1, 'farm_location': 'Karnal'}
+
+    def insert():
+        for _ in range(300):
+            database.add_product(form)
+
+    # Switch threads as often as possible so unlocked id and block allocation would interleave
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        threads = [threading.Thread(target=insert) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+    assert database.get_product_count() == 2400
+    assert result(audit_database(database, workers=1))['ok']
@@ -0,0 +1,85 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from geo import INDEX_PRECISIONS, GeoIndex, resolve_location
+
+PLACES = {1: 'Pune', 2: 'Mumbai', 3: 'Karnal', 4: 'Chennai'}
+
+
+@pytest.fixture
+def index():
+    index = GeoIndex()
+    for item_id, place in PLACES.items():
+        lat, lon = resolve_location(place)[:2]
+        index.add(item_id, lat, lon, 'Grains' if item_id % 2 else 'Vegetables')
+    return index
+
+
+def test_radius_is_nearest_first(index):
+    lat, lon = resolve_location('Pune')[:2]
+    matches = index.within_radius(lat, lon, 200)
+    assert [item_id for _, item_id, _, _ in matches] == [1, 2]
+    assert matches[0][0] == pytest.approx(0, abs=1e-6) and 100 < matches[1][0] < 200
+    assert [m[1] for m in index.within_radius(lat, lon, 200, category='Vegetables')] == [2]
+    assert [m[1] for m in index.within_radius(lat, lon, 2000, limit=1)] == [1]
+
+
+def test_bbox(index):
+    assert {item_id for item_id, _, _ in index.within_bbox(17, 72, 20, 75)} == {1, 2}
+    assert {item_id for item_id, _, _ in index.within_bbox(-90, -180, 90, 180)} == set(PLACES)
+
+
+def test_covering_cells_stay_on_the_globe(index):
+    precision, cells = index._covering_cells(-90, -180, 1e6, 1e6)
+    assert precision == INDEX_PRECISIONS[0] and len(cells) <= 32 * 32
+    assert index._covering_cells(95, 0, 99, 1)[1] == set()
+
+
+@pytest.mark.parametrize('query', [
+    (float('nan'), 0, 10), (0, float('inf'), 10), (91, 0, 10), (0, -181, 10), (0, 0, 0), (0, 0, float('inf')),
+])
+def test_radius_rejects_bad_input(index, query):
+    with pytest.raises(ValueError):
+        index.within_radius(*query)
+
+
+@pytest.mark.parametrize('bbox', [(-90, -180, 1e6, 1e6), (float('nan'), 0, 1, 1), (10, 10, 0, 0)])
+def test_bbox_rejects_bad_input(index, bbox):
+    with pytest.raises(ValueError):
+        index.within_bbox(*bbox)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv('AGROLINK_LOG_LEVEL', 'CRITICAL')
+    for name in ('AGROLINK_SHARED_STATE', 'AGROLINK_SNAPSHOT'):
+        monkeypatch.delenv(name, raising=False)
+    import app as app_module
+    database = app_module.AgroLinkDatabase()
+    for place in PLACES.values():
+        database.add_product({'product_name': f'Rice from {place}', 'category': 'Grains', 'quantity': '10',
+                              'unit': 'kg', 'harvest_date': '2026-10-01', 'farmer_id': 1, 'farm_location': place})
+    return app_module.create_app(database=database).test_client()
+
+
+def test_nearby_endpoint(client):
+    response = client.get('/api/nearby?near=Pune&radius_km=200')
+    assert response.status_code == 200
+    assert [p['farm_location'] for p in response.get_json()['results']] == ['Pune', 'Mumbai']
+    response = client.get('/api/nearby?bbox=-90,-180,90,180')
+    assert response.get_json()['count'] == len(PLACES)
+
+
+@pytest.mark.parametrize('query', [
+    'bbox=-90,-180,1e6,1e6', 'bbox=nan,0,1,1', 'bbox=0,0,inf,1', 'bbox=10,10,0,0', 'bbox=1,2,3',
+    'lat=inf&lon=0', 'lat=nan&lon=0', 'lat=10&lon=200', 'lat=10&lon=10&radius_km=0',
+    'lat=10&lon=10&radius_km=nan', 'lat=10&lon=10&radius_km=inf', 'lat=10',
+])
+def test_nearby_rejects_bad_input(client, query):
+    response = client.get(f'/api/nearby?{query}')
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
@@ -0,0 +1,66 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import idempotency
+
+PRODUCT = {'product_name': 'Basmati Rice', 'category': 'Grains', 'quantity': '50', 'unit': 'kg',
+           'harvest_date': '2026-10-01', 'farmer_id': '1', 'farm_location': 'Karnal'}
+
+
+def test_failed_submission_is_not_replayed(monkeypatch):
+    monkeypatch.setenv('AGROLINK_LOG_LEVEL', 'CRITICAL')
+    monkeypatch.delenv('AGROLINK_SHARED_STATE', raising=False)
+    monkeypatch.delenv('AGROLINK_SNAPSHOT', raising=False)
+    import app as app_module
+    database = app_module.AgroLinkDatabase()
+    client = app_module.create_app(database=database).test_client()
+    add_product = database.add_product
+
+    def fail_once(product_data):
+        monkeypatch.setattr(database, 'add_product', add_product)
+        raise OSError('disk full')
+
+    monkeypatch.setattr(database, 'add_product', fail_once)
+    headers = {'Idempotency-Key': 'retry-after-failure'}
+    failed = client.post('/add_product', data=PRODUCT, headers=headers)
+    assert failed.status_code == 500
+
+    retried = client.post('/add_product', data=PRODUCT, headers=headers)
+    assert retried.status_code == 200 and retried.get_json()['success']
+    assert 'Idempotent-Replayed' not in retried.headers
+    assert database.get_product_count() == 1
+
+
+def test_running_keys_survive_eviction():
+    store = idempotency.IdempotencyStore(max_entries=2, wait=0)
+    assert store.begin('running', 'form')[0] == idempotency.NEW
+    for key in ('first', 'second'):
+        store.begin(key, 'form')
+        store.complete(key, idempotency.StoredResponse(200, [], b'{}'))
+    # The oldest finished keys make room; the key still running keeps its claim
+    assert store.begin('running', 'form')[0] == idempotency.IN_PROGRESS
+    assert store.begin('second', 'form')[0] == idempotency.REPLAY
+    assert store.begin('first', 'form')[0] == idempotency.NEW
+
+
+def test_register_retry_is_replayed(monkeypatch):
+    monkeypatch.setenv('AGROLINK_LOG_LEVEL', 'CRITICAL')
+    monkeypatch.delenv('AGROLINK_SHARED_STATE', raising=False)
+    monkeypatch.delenv('AGROLINK_SNAPSHOT', raising=False)
+    import app as app_module
+    database = app_module.AgroLinkDatabase()
+    client = app_module.create_app(database=database).test_client()
+    form = {'name': 'Asha Patil', 'email': 'asha@example.com', 'phone': '+91 90000 00000', 'address': 'Pune'}
+    headers = {'Idempotency-Key': 'register-once'}
+
+    first = client.post('/register', data=form, headers=headers)
+    retry = client.post('/register', data=form, headers=headers)
+    assert first.status_code == retry.status_code == 200
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert retry.get_json()['farmer_id'] == first.get_json()['farmer_id']
+    assert database.get_farmer_count() == 2
+
+    invalid = client.post('/register', data=dict(form, phone=''))
+    assert invalid.status_code == 400 and invalid.get_json()['message'] == 'Phone is required'
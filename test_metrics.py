@@ -0,0 +1,35 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from metrics import REQUEST_COUNT, REQUEST_ERRORS
+
+
+def value(metric, *labels):
+    return metric.labels(*labels).value
+
+
+@pytest.mark.parametrize('propagate', [False, True])
+def test_unhandled_exception_counts_one_error(monkeypatch, propagate):
+    monkeypatch.setenv('AGROLINK_LOG_LEVEL', 'WARNING')
+    monkeypatch.delenv('AGROLINK_SHARED_STATE', raising=False)
+    import app as app_module
+    application = app_module.create_app({'PROPAGATE_EXCEPTIONS': propagate}, database=app_module.AgroLinkDatabase())
+
+    @application.route('/boom')
+    def boom():
+        raise RuntimeError('boom')
+
+    errors = value(REQUEST_ERRORS, 'GET', '/boom')
+    requests = value(REQUEST_COUNT, 'GET', '/boom', '500')
+    client = application.test_client()
+    if propagate:
+        with pytest.raises(RuntimeError):
+            client.get('/boom')
+    else:
+        assert client.get('/boom').status_code == 500
+        assert value(REQUEST_COUNT, 'GET', '/boom', '500') == requests + 1
+    assert value(REQUEST_ERRORS, 'GET', '/boom') == errors + 1
@@ -0,0 +1,114 @@
+import io
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from photos import DEFAULT_MATCH_DISTANCE, HASH_BITS, PhotoIndex, hamming, perceptual_hash
+
+
+def field_photo(seed):
+    """A deterministic stand-in for a product photo: a gradient with a few shapes"""
+    from PIL import Image, ImageDraw
+    rng = random.Random(seed)
+    img = Image.linear_gradient('L').resize((320, 240)).rotate(rng.choice((0, 90, 180, 270)), expand=True)
+    img = Image.merge('RGB', (img, img.transpose(Image.FLIP_LEFT_RIGHT), Image.new('L', img.size, 90)))
+    draw = ImageDraw.Draw(img)
+    for _ in range(6):
+        x, y = rng.randrange(img.width - 60), rng.randrange(img.height - 60)
+        size = rng.randrange(20, 60)
+        colour = tuple(rng.randrange(256) for _ in range(3))
+        (draw.ellipse if rng.random() < 0.5 else draw.rectangle)((x, y, x + size, y + size), fill=colour)
+    return img
+
+
+def altered(img):
+    """The same photo rescaled, brightened and re-encoded as a JPEG"""
+    from PIL import Image, ImageEnhance
+    img = ImageEnhance.Brightness(img.resize((img.width * 3 // 4, img.height * 3 // 4))).enhance(1.1)
+    buf = io.BytesIO()
+    img.save(buf, 'JPEG', quality=70)
+    buf.seek(0)
+    return Image.open(buf)
+
+
+def brute_force(stored, fingerprint, max_distance):
+    matches = [(product_id, hamming(fingerprint, value)) for product_id, value in stored.items()]
+    return sorted((m for m in matches if m[1] <= max_distance), key=lambda m: (m[1], m[0]))
+
+
+@pytest.fixture
+def stored():
+    rng = random.Random(7)
+    return {product_id: rng.getrandbits(HASH_BITS) for product_id in range(1, 2001)}
+
+
+def test_altered_photo_is_a_near_duplicate(stored):
+    original = perceptual_hash(field_photo(1))
+    index = PhotoIndex()
+    for product_id, fingerprint in stored.items():
+        index.add(product_id, fingerprint)
+    index.add(0, original)
+
+    copy = perceptual_hash(altered(field_photo(1)))
+    assert copy != original and hamming(copy, original) <= DEFAULT_MATCH_DISTANCE // 2
+    assert index.near(copy) == [(0, hamming(copy, original))]
+    assert index.near(perceptual_hash(field_photo(2))) == []
+
+
+def test_banded_lookup_matches_a_scan(stored):
+    index = PhotoIndex()
+    for product_id, fingerprint in stored.items():
+        index.add(product_id, fingerprint)
+    rng = random.Random(11)
+    base = stored[1]
+    # Differences spread over every chunk are still found through one of them
+    for flips in (4, 8, DEFAULT_MATCH_DISTANCE, 19):
+        query = base
+        for bit in rng.sample(range(HASH_BITS), flips):
+            query ^= 1 << bit
+        for max_distance in (flips - 1, flips, 23):
+            # 23 bits is past MAX_INDEXED_RADIUS per chunk, so that query scans every hash
+            expected = brute_force(stored, query, max_distance)
+            assert index.near(query, max_distance) == expected
+            assert (1, flips) in expected or max_distance < flips
+
+
+@pytest.mark.parametrize('max_distance', [-1, HASH_BITS + 1])
+def test_near_rejects_bad_distance(max_distance):
+    with pytest.raises(ValueError):
+        PhotoIndex().near(0, max_distance)
+
+
+def jpeg(img):
+    buf = io.BytesIO()
+    img.save(buf, 'JPEG', quality=90)
+    return io.BytesIO(buf.getvalue())
+
+
+def test_add_product_flags_reused_photo(monkeypatch, tmp_path):
+    monkeypatch.setenv('AGROLINK_LOG_LEVEL', 'CRITICAL')
+    for name in ('AGROLINK_SHARED_STATE', 'AGROLINK_SNAPSHOT'):
+        monkeypatch.delenv(name, raising=False)
+    import app as app_module
+    database = app_module.AgroLinkDatabase()
+    database.add_farmer({'name': 'Meena Devi'})
+    client = app_module.create_app({'UPLOAD_FOLDER': str(tmp_path / 'uploads'),
+                                    'WATERMARKED_FOLDER': str(tmp_path / 'watermarked')}, database).test_client()
+
+    def upload(farmer_id, photo):
+        response = client.post('/add_product', data={
+            'product_name': 'Tomatoes', 'category': 'Vegetables', 'quantity': '20', 'unit': 'kg',
+            'harvest_date': '2026-10-01', 'farmer_id': str(farmer_id), 'farm_location': 'Pune',
+            'product_image': (photo, 'tomatoes.jpg')})
+        assert response.status_code == 200
+        return response.get_json()
+
+    first = upload(1, jpeg(field_photo(1)))
+    assert first['duplicate_photos'] == []
+    reused = upload(2, jpeg(altered(field_photo(1))))
+    assert [match['product_id'] for match in reused['duplicate_photos']] == [first['product_id']]
+    assert upload(2, jpeg(field_photo(2)))['duplicate_photos'] == []
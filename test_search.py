@@ -0,0 +1,113 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from search import ProductSearchIndex, _within_one_edit
+
+PRODUCTS = [
+    {'id': 1, 'product_name': 'Basmati Rice', 'category': 'Grains', 'unit': 'kg',
+     'farmer_name': 'Ravi Kumar', 'farm_location': 'Karnal', 'description': 'Aged long grain rice'},
+    {'id': 2, 'product_name': 'Brown Rice', 'category': 'Grains', 'unit': 'quintal',
+     'farmer_name': 'Meena Devi', 'farm_location': 'Pune'},
+    {'id': 3, 'product_name': 'Tomatoes', 'category': 'Vegetables', 'unit': 'kg',
+     'farmer_name': 'Ravi Kumar', 'farm_location': 'Pune', 'description': 'Fresh red tomatoes'},
+    {'id': 4, 'product_name': 'Potatoes', 'category': 'Vegetables', 'unit': 'kg',
+     'farmer_name': 'Meena Devi', 'farm_location': 'Nashik'},
+    {'id': 5, 'product_name': 'Wheat Flour', 'category': 'Grains', 'unit': 'kg',
+     'farmer_name': 'Ravi Kumar', 'farm_location': 'Karnal', 'description': 'Milled next to the rice mill'},
+]
+
+
+@pytest.fixture
+def index():
+    index = ProductSearchIndex()
+    for product in PRODUCTS:
+        index.add(product)
+    return index
+
+
+def ids(result):
+    return [product_id for product_id, _ in result[0]]
+
+
+def test_bm25_ranking(index):
+    ranked, total, _, corrections = index.search('rice')
+    assert total == 3 and corrections == {}
+    # Name matches outrank a description match; the extra mention lifts Basmati above Brown
+    assert [product_id for product_id, _ in ranked] == [1, 2, 5]
+    assert ranked[0][1] > ranked[1][1] > ranked[2][1] > 0
+    # Every term must match
+    assert ids(index.search('rice pune')) == [2]
+    assert index.search('rice nashik')[1] == 0
+
+
+def test_prefix_expansion(index):
+    ranked, total, _, corrections = index.search('ravi tom')
+    assert [product_id for product_id, _ in ranked] == [3] and total == 1
+    assert corrections == {'tom': ['tomatoes']}
+    assert set(ids(index.search('ravi kumar r'))) == {1, 5, 3}
+    # Only the last term is a prefix
+    assert index.search('tom ravi')[1] == 0
+
+
+@pytest.mark.parametrize('query, expected, correction', [
+    ('ryce', [1, 2, 5], ['rice']),          # substitution
+    ('tomatos', [3], ['tomatoes']),         # deletion
+    ('potatoess', [4], ['potatoes']),       # insertion
+    ('potaotes', [4], ['potatoes']),        # transposition
+])
+def test_typo_correction(index, query, expected, correction):
+    ranked, _, _, corrections = index.search(query)
+    assert [product_id for product_id, _ in ranked] == expected
+    assert corrections == {query: correction}
+
+
+def test_typo_correction_limits(index):
+    assert index.search('rxcx')[1] == 0
+    # Terms shorter than MIN_TYPO_LENGTH are not corrected
+    assert index.search('ric grains')[1] == 0
+
+
+@pytest.mark.parametrize('a, b, expected', [
+    ('rice', 'rice', True), ('rice', 'rise', True), ('rice', 'rcie', True), ('rice', 'irce', True),
+    ('rice', 'ricee', True), ('rice', 'ric', True), ('rice', 'rcei', False), ('rice', 'eicr', False),
+    ('rice', 'rxcx', False), ('rice', 'ricess', False), ('rice', 'rce', True), ('rice', 'xrice', True),
+])
+def test_within_one_edit(a, b, expected):
+    assert _within_one_edit(a, b) is expected
+    assert _within_one_edit(b, a) is expected
+
+
+def test_facets(index):
+    _, total, facets, _ = index.search('')
+    assert total == len(PRODUCTS)
+    assert facets == {'category': {'Grains': 3, 'Vegetables': 2}, 'unit': {'kg': 4, 'quintal': 1}}
+
+    ranked, total, facets, _ = index.search('rice', unit='kg')
+    assert [product_id for product_id, _ in ranked] == [1, 5] and total == 2
+    assert facets == {'category': {'Grains': 2}, 'unit': {'kg': 2}}
+    assert ids(index.search('ravi', category='Vegetables')) == [3]
+
+
+def test_pagination(index):
+    # Unranked results come newest first
+    assert ids(index.search('')) == [5, 4, 3, 2, 1]
+    pages = [index.search('', limit=2, offset=offset) for offset in (0, 2, 4, 6)]
+    assert [ids(page) for page in pages] == [[5, 4], [3, 2], [1], []]
+    assert {page[1] for page in pages} == {len(PRODUCTS)}
+
+
+def test_add_many_matches_add(index):
+    bulk = ProductSearchIndex()
+    bulk.add(PRODUCTS[3])
+    bulk.add_many([PRODUCTS[0], PRODUCTS[4]])
+    bulk.add_many([PRODUCTS[1], PRODUCTS[2]])
+    assert len(bulk) == len(index)
+    # The merged vocabulary stays sorted and without duplicates
+    assert bulk._vocabulary == index._vocabulary == sorted(set(index._vocabulary))
+    assert bulk._deletions == index._deletions
+    for query in ('rice', 'ryce', 'pot', 'ravi kumar', ''):
+        assert bulk.search(query) == index.search(query)
@@ -0,0 +1,72 @@
+import multiprocessing
+import os
+import sys
+import tempfile
+
+WORKERS = 4
+PRODUCTS_PER_WORKER = 25
+
+
+def worker(db_path, start, results):
+    # Each worker is a separate process with its own app and database, like gunicorn -w N
+    os.environ['AGROLINK_SHARED_STATE'] = db_path
+    os.environ.setdefault('AGROLINK_LOG_LEVEL', 'WARNING')
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app as app_module
+    client = app_module.app.test_client()
+
+    start.wait()
+    added = []
+    for i in range(PRODUCTS_PER_WORKER):
+        response = client.post('/add_product', data={
+            'product_name': f'Tomato {os.getpid()}-{i}',
+            'category': 'Vegetables',
+            'quantity': '10',
+            'unit': 'kg',
+            'harvest_date': '2026-10-01',
+            'farmer_id': '1',
+            'farm_location': 'Nashik',
+        }).get_json()
+        added.append((response['product_id'], response['block_number']))
+
+    results.put(added)
+    start.wait()  # every worker has finished writing
+    stats = client.get('/api/stats').get_json()
+    products = client.get('/api/products').get_json()['products']
+    results.put((stats, sorted(p['id'] for p in products)))
+
+
+def test_concurrent_workers():
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'agrolink.db')
+        start = context.Barrier(WORKERS)
+        results = context.Queue()
+        processes = [context.Process(target=worker, args=(db_path, start, results)) for _ in range(WORKERS)]
+        for process in processes:
+            process.start()
+        outputs = [results.get(timeout=300) for _ in range(2 * WORKERS)]
+        for process in processes:
+            process.join(timeout=60)
+            assert process.exitcode == 0
+
+    added = [item for output in outputs if isinstance(output, list) for item in output]
+    views = [output for output in outputs if isinstance(output, tuple)]
+    total = WORKERS * PRODUCTS_PER_WORKER
+
+    # Ids and blocks are allocated across processes without duplicates or gaps
+    assert sorted(product_id for product_id, _ in added) == list(range(1, total + 1))
+    blocks = [block for _, block in added]
+    assert len(set(blocks)) == total
+
+    # Every worker converges on the same farmers, products and latest block
+    for stats, product_ids in views:
+        assert product_ids == list(range(1, total + 1))
+        assert stats['farmer_count'] == 1
+        assert stats['product_count'] == total
+        assert stats['latest_block'] == max(blocks)
+
+
+if __name__ == '__main__':
+    test_concurrent_workers()
+    print(f"✅ {WORKERS} workers shared {WORKERS * PRODUCTS_PER_WORKER} products consistently")
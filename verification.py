@@ -0,0 +1,116 @@
+"""Hot-read cache for product verification scans.
+
+A QR scan resolves to one product and always produces the same answer until
+the product or its farmer changes. The first scan builds the JSON body, the
+HTML page and an ETag for that product. Later scans are a single dict lookup
+with no serialization. Entries are evicted oldest-first once the cache is
+full, and can be invalidated when a record changes. A size of 0 or less
+disables caching.
+"""
+import hashlib
+import json
+import threading
+from html import escape
+
+DEFAULT_MAX_ENTRIES = 100000
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="UTF-8">
+<meta name="viewport" content="width=device-width, initial-scale=1.0">
+<title>{title} - AgroLink Verification</title>
+<style>
+body {{ background: #0f0c29; color: white; font-family: 'Segoe UI', Tahoma, sans-serif; margin: 0; padding: 20px; }}
+.card {{ max-width: 480px; margin: 0 auto; background: rgba(255,255,255,0.06); border-radius: 16px; padding: 24px; border-left: 4px solid {accent}; }}
+h1 {{ color: #64d9ff; font-size: 1.5rem; margin: 0 0 8px; }}
+.status {{ color: {accent}; font-weight: 600; margin-bottom: 16px; }}
+dt {{ color: rgba(255,255,255,0.6); font-size: 0.85rem; margin-top: 10px; }}
+dd {{ margin: 2px 0 0; font-weight: 600; word-break: break-all; }}
+</style>
+</head>
+<body>
+<div class="card">
+<h1>{title}</h1>
+<div class="status">{status}</div>
+<dl>{rows}</dl>
+</div>
+</body>
+</html>
+"""
+
+
+def render_page(payload):
+    product = payload['product']
+    farmer = payload['farmer'] or {}
+    verified = payload['verified']
+    rows = [
+        ('QR Code', payload['qr_code']),
+        ('Farmer', farmer.get('name', product['farmer_name'])),
+        ('Category', product['category']),
+        ('Quantity', f"{product['quantity']} {product['unit']}"),
+        ('Harvest Date', product['harvest_date']),
+        ('Stage', (payload.get('custody') or {}).get('stage', '-')),
+        ('Holder', (payload.get('custody') or {}).get('holder', '-')),
+        ('Farm Location', product['farm_location']),
+        ('Recorded', product['added_date']),
+        ('Block', payload['blockchain']['block_number']),
+        ('Blockchain Hash', payload['blockchain']['hash']),
+    ]
+    return PAGE_TEMPLATE.format(
+        title=escape(product['product_name']),
+        status='✅ Verified on AgroLink' if verified else '⚠️ Not verified',
+        accent='#22c55e' if verified else '#ffc107',
+        rows=''.join(f"<dt>{escape(label)}</dt><dd>{escape(str(value))}</dd>" for label, value in rows)
+    ).encode()
+
+
+class VerificationEntry:
+    __slots__ = ('json_body', 'html_body', 'etag')
+
+    def __init__(self, payload):
+        self.json_body = json.dumps(payload, separators=(',', ':')).encode()
+        self.html_body = render_page(payload)
+        self.etag = hashlib.sha256(self.json_body).hexdigest()[:32]
+
+
+class VerificationCache:
+    def __init__(self, build, max_entries=DEFAULT_MAX_ENTRIES):
+        self._build = build  # qr_code -> payload dict, or None if unknown
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+        # Bumped by every invalidation, so a payload built before one is not cached
+        self._generation = 0
+
+    def get(self, qr_code):
+        entry = self._entries.get(qr_code)
+        if entry is not None:
+            return entry
+        generation = self._generation
+        payload = self._build(qr_code)
+        if payload is None:
+            return None
+        entry = VerificationEntry(payload)
+        if self.max_entries <= 0:
+            return entry
+        with self._lock:
+            if generation != self._generation:
+                return entry  # a record changed while building; the next scan rebuilds
+            # Dicts keep insertion order, so the first key is the oldest entry
+            while len(self._entries) >= self.max_entries:
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[qr_code] = entry
+        return entry
+
+    def invalidate(self, qr_code=None):
+        """Drop one entry, or every entry when ``qr_code`` is None"""
+        with self._lock:
+            self._generation += 1
+            if qr_code is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(qr_code, None)
+
+    def __len__(self):
+        return len(self._entries)